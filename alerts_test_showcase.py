@@ -1,11 +1,10 @@
 import polars as pl
-from geopy.geocoders import Nominatim
 import csp
-from time import sleep
 import os
 import openai
 from dotenv import load_dotenv
 
+from pipeline.geocode import BatchGeocoder, GeocodeCache, NominatimGeocoder
 from pipeline.pipeline import DatasetLoader
 
 dl = DatasetLoader()
@@ -30,18 +29,11 @@ model="gpt-3.5-turbo",
 expl = response.choices[0].message.content
 addresses = expl.split(",")
 aspiringdf=[]
-geolocator = Nominatim(user_agent="DEF")
-for address in addresses:
-    location = None
-    try:
-        location = geolocator.geocode(address+", NY")
-    except Exception as e:
-        location = None
-        sleep(.1)
-
+geocoder = BatchGeocoder(NominatimGeocoder(), GeocodeCache("geocode_cache.sqlite"))
+for address, location in geocoder.geocode_many(addresses).items():
     if location is not None:
-        print(location.address, location.latitude, location.longitude)
-        aspiringdf.append((location.latitude, location.longitude, address))
+        print(address, location[0], location[1])
+        aspiringdf.append((location[0], location[1], address))
 
 df = pl.DataFrame(aspiringdf, schema=["lat", "lon", "address"])
 print(df.head())
@@ -0,0 +1,64 @@
+"""
+Compare alert address extractors on the fixture alerts: throughput and recall / precision against hand labels.
+
+    python -m benchmarks.bench_extractors --extractors regex llm
+
+The llm extractor needs OPENAI_API_KEY and network access, it is skipped otherwise.
+"""
+import argparse
+import json
+import os
+import time
+
+from pipeline.extractors import EXTRACTORS, address_key
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "test_data", "mta_alerts.json")
+
+
+def score(extractor, alerts: list[dict]) -> dict:
+    """
+    Run the extractor over every alert once and compare its addresses with the labels.
+    """
+    found = expected = correct = 0
+    start = time.perf_counter()
+    extracted = [extractor.extract(alert["header_text"]) for alert in alerts]
+    seconds = time.perf_counter() - start
+
+    for alert, addresses in zip(alerts, extracted):
+        got = {address_key(address) for address in addresses}
+        want = {address_key(address) for address in alert["addresses"]}
+        found += len(got)
+        expected += len(want)
+        correct += len(got & want)
+    return {
+        "alerts_per_second": len(alerts) / seconds,
+        "recall": correct / expected if expected else 1.0,
+        "precision": correct / found if found else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--extractors", nargs="+", default=["regex", "llm"], choices=sorted(EXTRACTORS))
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--repeat", type=int, default=50, help="passes over the fixture for local extractors")
+    args = parser.parse_args()
+
+    with open(args.fixture) as f:
+        alerts = json.load(f)
+
+    print(f"{len(alerts)} alerts, {sum(len(alert['addresses']) for alert in alerts)} labelled addresses")
+    print(f"{'extractor':>10} {'alerts/s':>12} {'recall':>8} {'precision':>10}")
+    for name in args.extractors:
+        if name == "llm" and not os.environ.get("OPENAI_API_KEY"):
+            print(f"{name:>10} {'skipped, OPENAI_API_KEY is not set':>32}")
+            continue
+        extractor = EXTRACTORS[name]()
+        # remote extractors are scored on a single pass, local ones on the best of several
+        repeat = args.repeat if name != "llm" else 1
+        result = max((score(extractor, alerts) for _ in range(repeat)), key=lambda r: r["alerts_per_second"])
+        print(f"{name:>10} {result['alerts_per_second']:>12.0f} {result['recall']:>8.2%} {result['precision']:>10.2%}")
+
+
+if __name__ == "__main__":
+    main()
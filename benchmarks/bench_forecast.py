@@ -0,0 +1,53 @@
+"""
+Measure the demand forecast: training time over a trip history and the per-tick cost of the per-station targets.
+
+The trips are written to CSV and scanned through DatasetLoader.load_trips, like the monthly Citi Bike files.
+
+    python -m benchmarks.bench_forecast --trips 10000000 --stations 2200
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.bench_ingest import write_trips
+from benchmarks.synthetic import make_station_frame
+from pipeline.pipeline import DatasetLoader
+from rebalancing_algo.forecast import DemandForecast
+
+# Citi Bike trips in 2023
+TRIPS_PER_YEAR = 35_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trips", type=int, default=5_000_000)
+    parser.add_argument("--stations", type=int, default=2_200)
+    parser.add_argument("--ticks", type=int, default=1_000)
+    args = parser.parse_args()
+
+    stations = make_station_frame(args.stations)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trips.csv")
+        write_trips(path, args.trips)
+        loader = DatasetLoader(path)
+        loader.load_trips()
+        began = time.perf_counter()
+        forecast = DemandForecast.from_trips(loader.stream, stations=stations)
+        seconds = time.perf_counter() - began
+    print(f"trained on {args.trips:,} trips in {seconds:.1f}s, {len(forecast.station_ids)} stations")
+    print(f"a year ({TRIPS_PER_YEAR:,} trips) at that rate: {seconds * TRIPS_PER_YEAR / args.trips:.0f}s")
+
+    station_ids = stations["station_id"].to_list()
+    capacity = stations["capacity"].to_numpy()
+    moment = datetime(2024, 3, 4, 12)
+    began = time.perf_counter()
+    for tick in range(args.ticks):
+        forecast.targets(station_ids, capacity, moment + timedelta(seconds=10 * tick))
+    per_tick = (time.perf_counter() - began) / args.ticks
+    print(f"targets for {args.stations} stations: {per_tick * 1e3:.3f} ms per tick, {per_tick / args.stations * 1e9:.0f} ns per station")
+
+
+if __name__ == "__main__":
+    main()
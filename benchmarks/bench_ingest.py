@@ -0,0 +1,88 @@
+"""
+Compare collecting a trip history file whole with streaming it in bounded batches (DatasetLoader.iter_batches).
+
+Time and peak memory (RSS) of one pass over the file, each measurement in a fresh process.
+
+    python -m benchmarks.bench_ingest --trips 2000000 10000000 --format csv
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import polars as pl
+
+from benchmarks.synthetic import make_trip_frame
+from pipeline.ingest import iter_batches
+
+CHUNK = 1_000_000
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_trips(path: str, num_trips: int) -> None:
+    # written a chunk at a time, so the benchmark file can be larger than memory
+    with open(path, "w") as f:
+        for start in range(0, num_trips, CHUNK):
+            trips = make_trip_frame(min(CHUNK, num_trips - start), seed=start // CHUNK)
+            if path.endswith(".csv"):
+                f.write(trips.write_csv(include_header=start == 0))
+            else:
+                f.write(trips.write_ndjson())
+
+
+def measure(method: str, path: str, batch_size: int) -> dict:
+    """
+    Count the members' trips per start station in one pass, the whole file at once or batch by batch.
+    """
+    start = time.perf_counter()
+    if method == "collect":
+        trips = pl.read_csv(path) if path.endswith(".csv") else pl.read_ndjson(path)
+        rows = len(trips)
+        counts = trips.filter(pl.col("member_casual") == "member")["start_station_id"].value_counts()
+    else:
+        rows = 0
+        partial = []
+        for batch in iter_batches(path, batch_size):
+            rows += len(batch)
+            partial.append(batch.filter(pl.col("member_casual") == "member")["start_station_id"].value_counts())
+        counts = pl.concat(partial).group_by("start_station_id").agg(pl.col("count").sum())
+    return {"seconds": time.perf_counter() - start, "peak_mb": peak_rss_mb(), "rows": rows, "stations": len(counts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trips", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--child", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], args.batch_size)))
+        return
+
+    print(f"{'trips':>10} {'file MB':>8} {'method':>8} {'time (s)':>9} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for num_trips in args.trips:
+            path = os.path.join(directory, f"trips.{args.format}")
+            write_trips(path, num_trips)
+            size_mb = os.path.getsize(path) / 2**20
+            for method in ("collect", "stream"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_ingest", "--batch-size", str(args.batch_size), "--child", method, path],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{num_trips:>10} {size_mb:>8.0f} {method:>8} {result['seconds']:>9.2f} {result['peak_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compare the single-process greedy pass with the partitioned engine at several worker counts: wall time and plan quality.
+
+The partitioned engine tiles the stations and plans every tile, with its halo, in a worker process. The first plan of
+every worker count is not timed, so process start-up is left out.
+
+    python -m benchmarks.bench_partitioned --sizes 10000 100000 --processes 0 2 4
+"""
+import argparse
+
+from benchmarks.bench_rebalance import run_engine
+from benchmarks.synthetic import make_station_frame
+from rebalancing_algo.engines import GreedyEngine
+from rebalancing_algo.parallel import PartitionedEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 2, 4], help="0 plans the tiles in the calling thread")
+    parser.add_argument("--tile-km", type=float, default=4.0)
+    parser.add_argument("--halo-km", type=float, default=1.0)
+    parser.add_argument("--min-bikes", type=int, default=25)
+    parser.add_argument("--max-bikes", type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"{'stations':>9} {'engine':>16} {'seconds':>9} {'deficit':>8} {'filled':>8} {'moves':>7} {'km/bike':>8}")
+    for size in args.sizes:
+        df = make_station_frame(size)
+        engines = [("greedy", GreedyEngine())]
+        engines += [
+            (f"partitioned x{processes}", PartitionedEngine(tile_km=args.tile_km, halo_km=args.halo_km, processes=processes))
+            for processes in args.processes
+        ]
+        for label, engine in engines:
+            partitioned = isinstance(engine, PartitionedEngine)
+            if partitioned and engine.processes:
+                run_engine(df, engine, args.min_bikes, args.max_bikes, neighbors=False)
+            # the partitioned engine searches the neighbors of every tile itself
+            result = run_engine(df, engine, args.min_bikes, args.max_bikes, neighbors=not partitioned)
+            if partitioned:
+                engine.close()
+            print(
+                f"{size:>9} {label:>16} {result['seconds']:>9.3f} {result['deficit']:>8} {result['filled']:>8} "
+                f"{result['transfers']:>7} {result['km_per_bike']:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the records path and the Arrow IPC path from a polars frame into perspective.Table.update.
+
+Serialization time, update time and the extra peak memory (RSS) of one push, each measurement in a fresh process.
+
+    python -m benchmarks.bench_perspective_push --sizes 2000 20000 200000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from perspective import Table as PerspectiveTable
+
+from benchmarks.synthetic import make_station_frame
+from pipeline.arrow_ipc import ArrowIPCEncoder, to_records
+
+STATION_SCHEMA = {
+    "station_id": str,
+    "capacity": int,
+    "name": str,
+    "short_name": str,
+    "region_id": str,
+    "lon": float,
+    "lat": float,
+    "num_bikes_available": int,
+    "num_bikes_disabled": int,
+    "num_docks_disabled": int,
+    "num_ebikes_available": int,
+    "is_installed": bool,
+    "is_renting": bool,
+    "is_returning": bool,
+    "last_reported": datetime,
+}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(method: str, size: int) -> dict:
+    """
+    Push one frame with the given method and report its timings and peak memory above the setup baseline.
+    """
+    df = make_station_frame(size)
+    table = PerspectiveTable(STATION_SCHEMA, index="station_id")
+    encoder = ArrowIPCEncoder(table.schema())
+    encoder.encode(df.head(1))
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    payload = encoder.encode(df) if method == "arrow" else to_records(df)
+    serialize = time.perf_counter() - start
+    start = time.perf_counter()
+    table.update(payload)
+    update = time.perf_counter() - start
+    return {"serialize": serialize, "update": update, "peak_mb": peak_rss_mb() - baseline}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000, 20_000, 200_000])
+    parser.add_argument("--child", nargs=2, metavar=("METHOD", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], int(args.child[1]))))
+        return
+
+    print(f"{'stations':>9} {'method':>8} {'serialize (s)':>14} {'update (s)':>11} {'peak +MB':>9}")
+    for size in args.sizes:
+        for method in ("records", "arrow"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_perspective_push", "--child", method, str(size)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{size:>9} {method:>8} {result['serialize']:>14.4f} {result['update']:>11.4f} {result['peak_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare the greedy rebalancing pass with the min-cost flow engine: wall time and plan quality.
+
+    python -m benchmarks.bench_rebalance --sizes 2200 10000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_station_frame
+from rebalancing_algo.engines import GreedyEngine, MinCostFlowEngine
+from rebalancing_algo.graph import Graph
+
+
+def run_engine(df, engine, min_bikes: int, max_bikes: int, neighbors: bool = True) -> dict:
+    """
+    Rebalance a fresh graph with the given engine, neighbor search included in the timing.
+
+    neighbors=False skips the graph-wide neighbor search, for engines that find their own neighbors.
+    """
+    graph = Graph(top_k=8, metric="haversine", use_spatial_index=True)
+    graph._fill_nodes(df)
+    deficit_before = int(np.clip(min_bikes - graph.store.bikes, 0, None).sum())
+
+    start = time.perf_counter()
+    if neighbors:
+        graph.set_top_k_distances()
+    plan = engine.plan(graph, min_bikes, max_bikes)
+    seconds = time.perf_counter() - start
+
+    moved = sum(transfer.num_bikes for transfer in plan)
+    bike_km = sum(transfer.num_bikes * transfer.distance for transfer in plan)
+    return {
+        "seconds": seconds,
+        "deficit": deficit_before,
+        "filled": moved,
+        "unmet": deficit_before - moved,
+        "transfers": len(plan),
+        "bike_km": bike_km,
+        "km_per_bike": bike_km / moved if moved else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_200, 10_000])
+    parser.add_argument("--min-bikes", type=int, default=25)
+    parser.add_argument("--max-bikes", type=int, default=40)
+    parser.add_argument("--candidates", type=int, default=16, help="closest overstocked stations per understocked one")
+    args = parser.parse_args()
+
+    engines = [GreedyEngine(), MinCostFlowEngine(candidates=args.candidates)]
+    print(f"{'stations':>9} {'engine':>14} {'seconds':>9} {'deficit':>8} {'filled':>8} {'unmet':>8} {'moves':>7} {'bike-km':>9} {'km/bike':>8}")
+    for size in args.sizes:
+        df = make_station_frame(size)
+        for engine in engines:
+            result = run_engine(df, engine, args.min_bikes, args.max_bikes)
+            print(
+                f"{size:>9} {engine.name:>14} {result['seconds']:>9.3f} {result['deficit']:>8} {result['filled']:>8} "
+                f"{result['unmet']:>8} {result['transfers']:>7} {result['bike_km']:>9.1f} {result['km_per_bike']:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
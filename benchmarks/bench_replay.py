@@ -0,0 +1,54 @@
+"""
+Replay recorded station frames through the station pipeline offline and report its throughput and per-node latency.
+
+A synthetic history is recorded first unless --path points at an existing one (a SnapshotStore root such as
+history/, or a directory of station_status JSON payloads).
+
+    python -m benchmarks.bench_replay --stations 2200 --polls 600
+"""
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from benchmarks.synthetic import make_station_frame
+from main import run_replay
+from pipeline.snapshot_store import SnapshotStore
+
+
+def record(root: str, stations: int, polls: int, interval: int, churn: float) -> None:
+    rng = np.random.default_rng(0)
+    base = make_station_frame(stations)
+    bikes = base["num_bikes_available"].to_numpy().copy()
+    start = datetime(2024, 3, 1)
+    store = SnapshotStore(root)
+    for poll in range(polls):
+        changed = rng.random(stations) < churn
+        bikes[changed] = np.maximum(bikes[changed] + rng.integers(-2, 3, changed.sum()), 0)
+        store.append(base.with_columns(pl.Series("num_bikes_available", bikes.copy())), start + timedelta(seconds=poll * interval))
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", help="recorded history to replay instead of a synthetic one")
+    parser.add_argument("--stations", type=int, default=2_200)
+    parser.add_argument("--polls", type=int, default=600)
+    parser.add_argument("--interval", type=int, default=10, help="seconds between recorded polls")
+    parser.add_argument("--churn", type=float, default=0.03, help="fraction of stations whose count changes per poll")
+    args = parser.parse_args()
+
+    if args.path:
+        run_replay(args.path)
+        return
+    with tempfile.TemporaryDirectory() as root:
+        record(root, args.stations, args.polls, args.interval, args.churn)
+        report = run_replay(root)
+    ticks = report.filter(pl.col("node") == "process_data")["per_s"].item()
+    print(f"{ticks:.1f} ticks/s, {ticks * args.interval:.0f}x the real poll rate of one every {args.interval}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measure the snapshot store: bytes per day of history and the time to load it back for a backtest.
+
+    python -m benchmarks.bench_snapshot_store --stations 2200 --days 7 --interval 60
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from benchmarks.synthetic import make_station_frame
+from pipeline.snapshot_store import SnapshotStore, scan_snapshots
+
+
+def directory_size(root: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for directory, _, names in os.walk(root) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=2_200)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval", type=int, default=60, help="seconds between polls")
+    parser.add_argument("--churn", type=float, default=0.03, help="fraction of stations whose count changes per poll")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = make_station_frame(args.stations)
+    bikes = base["num_bikes_available"].to_numpy().copy()
+    polls = args.days * 86_400 // args.interval
+    start = datetime(2024, 3, 1)
+
+    with tempfile.TemporaryDirectory() as root:
+        store = SnapshotStore(root)
+        began = time.perf_counter()
+        for poll in range(polls):
+            changed = rng.random(args.stations) < args.churn
+            bikes[changed] = np.maximum(bikes[changed] + rng.integers(-2, 3, changed.sum()), 0)
+            store.append(base.with_columns(pl.Series("num_bikes_available", bikes.copy())), start + timedelta(seconds=poll * args.interval))
+        store.close()
+        write_seconds = time.perf_counter() - began
+
+        rows = polls * args.stations
+        per_day = directory_size(root) / args.days
+        print(f"{polls} polls of {args.stations} stations, {rows:,} rows, written in {write_seconds:.1f}s")
+        print(f"storage: {per_day / 1e6:.2f} MB/day ({per_day * args.days / rows:.2f} bytes/row)")
+
+        began = time.perf_counter()
+        history = scan_snapshots(root, start, start + timedelta(days=args.days)).collect()
+        print(f"load {args.days} day(s): {time.perf_counter() - began:.2f}s, {len(history):,} rows")
+
+        began = time.perf_counter()
+        hour = scan_snapshots(root, start + timedelta(days=1, hours=8), start + timedelta(days=1, hours=9)).collect()
+        print(f"load 1 hour: {time.perf_counter() - began:.3f}s, {len(hour):,} rows")
+
+
+if __name__ == "__main__":
+    main()
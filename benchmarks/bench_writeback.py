@@ -0,0 +1,63 @@
+"""
+Compare the per-station with_columns loop process_data used to run against Graph.write_back.
+
+    python -m benchmarks.bench_writeback --sizes 2000 20000 200000
+"""
+import argparse
+import time
+
+import polars as pl
+
+from benchmarks.synthetic import make_station_frame
+from rebalancing_algo.graph import Graph
+
+
+def loop_write_back(df: pl.DataFrame, graph: Graph, limit: int = None) -> pl.DataFrame:
+    """
+    The original write-back: one full-column pl.when pass per station in the graph.
+    """
+    modified_df = df.clone()
+    for count, (station_id, (num_bikes, _, _, _)) in enumerate(graph.nodes.items()):
+        if limit is not None and count >= limit:
+            break
+        modified_df = modified_df.with_columns(pl.when(pl.col("station_id") == station_id).then(num_bikes).otherwise(pl.col("num_bikes_available")).alias("num_bikes_available"))
+    return modified_df
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000, 20_000, 200_000])
+    parser.add_argument("--loop-sample", type=int, default=200, help="loop iterations timed before extrapolating to all stations")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'stations':>10} {'loop (s)':>12} {'write_back (s)':>15} {'speedup':>10}")
+    for size in args.sizes:
+        df = make_station_frame(size)
+        graph = Graph(top_k=8, use_spatial_index=True)
+        graph._fill_nodes(df)
+        graph.set_top_k_distances()
+        graph.rebalance_stations(25, 40)
+
+        # every loop iteration is a full pass over the frame, so time a sample and scale it to the whole network
+        sample = min(size, args.loop_sample)
+        loop_seconds = best_of(lambda: loop_write_back(df, graph, limit=sample), args.repeat) * size / sample
+        join_seconds = best_of(lambda: graph.write_back(df), args.repeat)
+
+        if size <= 2_000:
+            assert graph.write_back(df).equals(loop_write_back(df, graph))
+        estimate = "~" if sample < size else " "
+        print(f"{size:>10} {estimate}{loop_seconds:>11.3f} {join_seconds:>15.4f} {loop_seconds / join_seconds:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
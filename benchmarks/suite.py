@@ -0,0 +1,200 @@
+"""
+Benchmark suite for the pipeline and rebalancing hot paths, with machine-readable results for regression tracking.
+
+Every case runs on synthetic networks of each size and reports the best, median and mean of --repeat runs; the setup
+of a run (a fresh graph, restored bike counts) is not timed. Results are written as JSON, and --compare checks them
+against an earlier file, exiting with status 1 when a case got slower than the tolerance allows.
+
+    python -m benchmarks.suite --sizes 1000 10000 100000 --output results.json
+    python -m benchmarks.suite --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import polars as pl
+from perspective import Table as PerspectiveTable
+
+from benchmarks.bench_perspective_push import STATION_SCHEMA
+from benchmarks.synthetic import make_station_frame
+from pipeline.arrow_ipc import ArrowIPCEncoder
+from pipeline.pipeline import STATION_INFORMATION_COLUMNS, STATION_STATUS_COLUMNS, DatasetLoader
+from rebalancing_algo.graph import Graph
+from rebalancing_algo.proximity import with_alert_flags
+
+SIZES = [1_000, 10_000, 100_000]
+MIN_BIKES = 25
+MAX_BIKES = 40
+
+
+class RecordedFeedClient:
+    """
+    Stands in for FeedClient: answers every request with a recorded payload, as changed
+    """
+    def __init__(self, payloads: dict) -> None:
+        self.payloads = payloads
+
+    def get_json(self, url: str) -> tuple[dict, bool]:
+        return self.payloads[url], True
+
+
+def recorded_payloads(df: pl.DataFrame) -> dict:
+    """
+    GBFS station_information and station_status payloads of a synthetic station frame, as FeedClient parses them.
+    """
+    def feed(columns: list) -> dict:
+        return {"last_updated": 1_709_251_200, "ttl": 3_600, "data": {"stations": df.select(columns).to_dicts()}}
+
+    return {
+        "station_information.json": feed(STATION_INFORMATION_COLUMNS),
+        "station_status.json": feed(STATION_STATUS_COLUMNS),
+    }
+
+
+def filled_graph(df: pl.DataFrame) -> Graph:
+    graph = Graph(top_k=8, use_spatial_index=True)
+    graph._fill_nodes(df)
+    return graph
+
+
+def cases(df: pl.DataFrame) -> dict:
+    """
+    Case name -> (setup, run): setup() builds the state of one run outside the timing, run(state) is timed.
+    """
+    ranked = filled_graph(df)
+    ranked.set_top_k_distances()
+    observed = ranked.store.bikes.copy()
+    rebalanced = filled_graph(df)
+    rebalanced.set_top_k_distances()
+    rebalanced.rebalance_stations(MIN_BIKES, MAX_BIKES)
+
+    def restore_counts() -> Graph:
+        ranked.store.bikes[:] = observed
+        return ranked
+
+    table = PerspectiveTable(STATION_SCHEMA, index="station_id")
+    encoder = ArrowIPCEncoder(table.schema())
+    payload = encoder.encode(df)
+
+    loader = DatasetLoader(
+        client=RecordedFeedClient(recorded_payloads(df)),
+        station_information_url="station_information.json",
+        station_status_url="station_status.json",
+    )
+    # station information is served from the metadata cache after the first poll, as in the service
+    loader.get_stations()
+
+    return {
+        "fill_nodes": (lambda: Graph(top_k=8, use_spatial_index=True), lambda graph: graph._fill_nodes(df)),
+        "set_top_k_distances": (lambda: filled_graph(df), lambda graph: graph.set_top_k_distances()),
+        "rebalance_stations": (restore_counts, lambda graph: graph.rebalance_stations(MIN_BIKES, MAX_BIKES)),
+        "write_back": (lambda: rebalanced, lambda graph: with_alert_flags(graph.write_back(df))),
+        "perspective_encode": (lambda: encoder, lambda encoder: encoder.encode(df)),
+        "perspective_update": (lambda: table, lambda table: table.update(payload)),
+        "station_status_join": (lambda: loader, lambda loader: loader.get_station_status()),
+    }
+
+
+def run_case(setup, run, repeat: int) -> list[float]:
+    # one untimed run first, so lazy initialization and cold caches do not land in the timings
+    run(setup())
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float, min_delta: float) -> list[str]:
+    """
+    Cases whose best time is more than tolerance, and more than min_delta seconds, slower than in the baseline results.
+    """
+    previous = {(result["case"], result["stations"]): result["min_s"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["case"], result["stations"]))
+        if before is None:
+            continue
+        ratio = result["min_s"] / before if before > 0 else float("inf")
+        # sub-millisecond cases jitter by more than any sensible tolerance, so a slowdown must also be measurable
+        status = "REGRESSION" if ratio > 1 + tolerance and result["min_s"] - before > min_delta else "ok"
+        print(f"{result['case']:>22} {result['stations']:>9} {before:>10.4f} -> {result['min_s']:>10.4f} {ratio:>7.2f}x {status}")
+        if status != "ok":
+            regressions.append(f"{result['case']}@{result['stations']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--cases", nargs="+", help="run only these cases")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are written to")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to check against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown of the best time, as a fraction")
+    parser.add_argument("--min-delta", type=float, default=0.001, help="slowdowns below this many seconds are not regressions")
+    args = parser.parse_args()
+
+    # read before the results are written, --output may be the baseline file itself
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = []
+    print(f"{'case':>22} {'stations':>9} {'min (s)':>10} {'median (s)':>11} {'mean (s)':>10}")
+    for size in args.sizes:
+        df = make_station_frame(size)
+        for case, (setup, run) in cases(df).items():
+            if args.cases and case not in args.cases:
+                continue
+            timings = run_case(setup, run, args.repeat)
+            result = {
+                "case": case,
+                "stations": size,
+                "repeat": args.repeat,
+                "min_s": min(timings),
+                "median_s": statistics.median(timings),
+                "mean_s": statistics.fmean(timings),
+            }
+            results.append(result)
+            print(f"{case:>22} {size:>9} {result['min_s']:>10.4f} {result['median_s']:>11.4f} {result['mean_s']:>10.4f}")
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"Slower than {args.compare} by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+# rough bounding box of the Citi Bike service area
+NYC_LAT = (40.55, 40.90)
+NYC_LON = (-74.05, -73.85)
+
+
+def make_station_frame(num_stations: int, seed: int = 0) -> pl.DataFrame:
+    """
+    Generate a synthetic station frame with the same columns as DatasetLoader.get_station_status().
+
+    Args:
+        num_stations: int, number of stations to generate
+        seed: int, random seed so runs are reproducible
+
+    Returns:
+        pl.DataFrame: one row per station, station information joined with station status
+    """
+    rng = np.random.default_rng(seed)
+    capacity = rng.integers(15, 80, num_stations)
+    bikes = (capacity * rng.random(num_stations) ** 1.5).astype(np.int64)
+    disabled = rng.integers(0, 3, num_stations)
+    docks_disabled = rng.integers(0, 2, num_stations)
+    station_ids = [f"{seed:02d}-{i:07d}" for i in range(num_stations)]
+    return pl.DataFrame({
+        "station_id": station_ids,
+        "capacity": capacity,
+        "name": [f"Station {i}" for i in range(num_stations)],
+        "short_name": [f"{i:05d}.{seed:02d}" for i in range(num_stations)],
+        "region_id": [str(71 + i % 3) for i in range(num_stations)],
+        "lon": NYC_LON[0] + rng.random(num_stations) * (NYC_LON[1] - NYC_LON[0]),
+        "lat": NYC_LAT[0] + rng.random(num_stations) * (NYC_LAT[1] - NYC_LAT[0]),
+        "num_bikes_available": bikes,
+        "num_bikes_disabled": disabled,
+        "num_docks_available": np.maximum(capacity - bikes - disabled - docks_disabled, 0),
+        "num_docks_disabled": docks_disabled,
+        "num_ebikes_available": (bikes * rng.random(num_stations) * 0.3).astype(np.int64),
+        "is_installed": np.ones(num_stations, dtype=np.int64),
+        "is_renting": np.ones(num_stations, dtype=np.int64),
+        "is_returning": np.ones(num_stations, dtype=np.int64),
+        "last_reported": np.full(num_stations, int(datetime(2024, 3, 1).timestamp()), dtype=np.int64),
+    })
+
+
+def make_trip_frame(num_trips: int, num_stations: int = 2_200, seed: int = 0) -> pl.DataFrame:
+    """
+    Generate a synthetic Citi Bike trip history with the columns of the public monthly trip files.
+
+    Like in the real files stations are named by short_name, those of make_station_frame(num_stations).
+
+    Args:
+        num_trips: int, number of trips to generate
+        num_stations: int, number of distinct start and end stations
+        seed: int, random seed so runs are reproducible
+
+    Returns:
+        pl.DataFrame: one row per trip
+    """
+    rng = np.random.default_rng(seed)
+    started_at = int(datetime(2024, 3, 1).timestamp()) + np.sort(rng.integers(0, 31 * 86_400, num_trips))
+    ended_at = started_at + rng.integers(60, 3_600, num_trips)
+    return pl.DataFrame({
+        "ride_id": [f"{seed:02d}{i:014X}" for i in range(num_trips)],
+        "rideable_type": np.where(rng.random(num_trips) < 0.4, "electric_bike", "classic_bike"),
+        "started_at": pl.Series(started_at * 1_000).cast(pl.Datetime("ms")),
+        "ended_at": pl.Series(ended_at * 1_000).cast(pl.Datetime("ms")),
+        "start_station_id": [f"{i:05d}.00" for i in rng.integers(0, num_stations, num_trips)],
+        "end_station_id": [f"{i:05d}.00" for i in rng.integers(0, num_stations, num_trips)],
+        "start_lat": NYC_LAT[0] + rng.random(num_trips) * (NYC_LAT[1] - NYC_LAT[0]),
+        "start_lng": NYC_LON[0] + rng.random(num_trips) * (NYC_LON[1] - NYC_LON[0]),
+        "member_casual": np.where(rng.random(num_trips) < 0.75, "member", "casual"),
+    })
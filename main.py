@@ -1,25 +1,50 @@
+import argparse
 import asyncio
 import logging
 import os.path
 import threading
-import pyarrow as pa
+import time
+from typing import Optional, Union
 from dotenv import load_dotenv
 
 import csp
 from csp import ts
+from csp.profiler import Profiler
 from datetime import timedelta, datetime
+from pipeline.async_fetch import FeedAdapterManager
+from pipeline.extractors import EXTRACTORS
+from pipeline.frame_diff import FrameDelta, FrameDiffer, apply_delta
+from pipeline.gbfs import MultiSystemLoader
+from pipeline.metrics import NODE_ROWS, NODE_SECONDS, QUEUE_LAG, REGISTRY
+from pipeline.geocode import BatchGeocoder, GeocodeCache, NominatimGeocoder
 from pipeline.pipeline import DatasetLoader
-from rebalancing_algo.graph import Graph
+from pipeline.replay import replay_report, replay_status
+from pipeline.snapshot_store import SnapshotStore
+from pipeline.table_writer import TableWriter
+from rebalancing_algo.forecast import DemandForecast
+from rebalancing_algo.parallel import PartitionedEngine, PartitionedRebalancer
+from rebalancing_algo.proximity import stations_near_alerts, with_alert_flags
 import polars as pl
 
 
 import uvicorn
 from fastapi import FastAPI, WebSocket
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from perspective import PerspectiveManager, PerspectiveStarletteHandler
 from perspective import Table as PerspectiveTable
 from starlette.staticfiles import StaticFiles
 
+# stations this close to a geocoded service alert are flagged in mod_data
+ALERT_RADIUS_KM = 0.5
+
+# rebalancing band of every station when no demand forecast has been trained
+MIN_BIKES = 25
+MAX_BIKES = 40
+
+# an unbounded replay covers whatever was recorded, the engine stops once the recording runs out
+REPLAY_START = datetime(1970, 1, 1)
+REPLAY_END = datetime(2200, 1, 1)
 
 
 def make_perspective_app(manager: PerspectiveManager):
@@ -30,12 +55,13 @@ def make_perspective_app(manager: PerspectiveManager):
         manager (PerspectiveManager): PerspectiveManager instance (hosts the tables)
 
     Returns:
-        app: returns the FastAPI back
+        app: returns the FastAPI back, the loop running the perspective callbacks is app.state.perspective_loop
     """
+    psp_loop = asyncio.new_event_loop()
 
     def perspective_thread(manager):
         # This thread runs the perspective processing callback
-        psp_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(psp_loop)
         manager.set_loop_callback(psp_loop.call_soon_threadsafe)
         psp_loop.run_forever()
 
@@ -49,8 +75,15 @@ def make_perspective_app(manager: PerspectiveManager):
         except Exception:
             ...
 
+    async def metrics_handler():
+        # Prometheus text format: per-node wall time and rows, fetch, Perspective update and queue lag histograms
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
     app = FastAPI()
+    app.state.perspective_loop = psp_loop
     app.add_api_websocket_route("/websocket", websocket_handler)
+    # registered before the static mount, which would otherwise answer every path
+    app.add_api_route("/metrics", metrics_handler, methods=["GET"])
     app.mount(
         "/",
         StaticFiles(
@@ -72,130 +105,248 @@ def make_perspective_app(manager: PerspectiveManager):
     return app
 
     
+def poll_data(feeds: FeedAdapterManager, ds_loader: Union[DatasetLoader, MultiSystemLoader], interval: timedelta) -> ts[pl.DataFrame]:
+    # fetched on the feed thread pool; an unchanged feed (304 or same last_updated) does not tick
+    return feeds.subscribe(pl.DataFrame, "station_status", lambda: ds_loader.get_station_status(only_changed=True), interval)
+
+@csp.node
+def push_data_to_perspective_table(data: ts[pl.DataFrame], writer: TableWriter):
+    if csp.ticked(data):
+        # only queued here; encoding and table.update run in batches on the perspective loop
+        # one series per table, the push nodes of data, mod_data and alerts_table are timed apart
+        label = f"push_data_to_perspective_table:{writer.name}"
+        with NODE_SECONDS.time(label):
+            NODE_ROWS.observe(len(data), label)
+            writer.upsert(data)
+
+
 @csp.node
-def poll_data(interval: timedelta) -> ts[pl.DataFrame]:
-    with csp.alarms():
-        a_poll = csp.alarm(bool)
+def store_snapshots(data: ts[pl.DataFrame], root: str, max_days: int):
+    with csp.state():
+        s_store = SnapshotStore(root, max_days=max_days)
 
-    with csp.start():
-        csp.schedule_alarm(a_poll, timedelta(), True)
-        ds_loader = DatasetLoader()
+    with csp.stop():
+        s_store.close()
 
-    if csp.ticked(a_poll):
-        status = ds_loader.get_station_status()
+    if csp.ticked(data):
+        # every polled frame is kept for backtesting, stamped with the engine time it arrived at
+        with NODE_SECONDS.time("store_snapshots"):
+            s_store.append(data, csp.now())
 
-        csp.schedule_alarm(a_poll, interval, True)
-        return status
 
 @csp.node
-def push_data_to_perspective_table(data: ts[pl.DataFrame], table: PerspectiveTable):
+def diff_frames(data: ts[pl.DataFrame], name: str) -> csp.Outputs(upserts=ts[pl.DataFrame], removed=ts[list]):
+    with csp.state():
+        s_differ = FrameDiffer(index="station_id")
+
     if csp.ticked(data):
-        # table_data = data.to_arrow()
-        # stream = pa.BufferOutputStream()
-        # writer = pa.RecordBatchStreamWriter(stream, table_data.schema)
-        # writer.write_table(table_data)
-        # writer.close()
-        # table.update(stream.getvalue().to_pybytes())
-        table.update(data.to_pandas().to_dict(orient="records"))
-
-
-@csp.node()
-def mta_alerts(table: PerspectiveTable, timedelta: timedelta = timedelta(seconds=500)):
-    with csp.alarms():
-        a_poll = csp.alarm(bool)
-
-    with csp.start():
-        csp.schedule_alarm(a_poll, timedelta, True)
-        ds_loader = DatasetLoader()
-    
-    if csp.ticked(a_poll):
-        # csp.print("HEY I TICKED")
-        json = ds_loader.get_mta_alarms()
-
-        all_text = ""
-        for alert in json:
-            all_text += alert.alert.header_text.translation[0].text
-
-        client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-        # q =  "Southbound BxM1 stops on Lexington Ave at E 96th St and E 86th St will be closed"
-        response = client.chat.completions.create(
-        messages=[{
-                "role": "system",
-                "content": "Give just all addresses as a comma separated list based off of the user message.  Give just the location if additional information is missing do not add. Make sure to return a comma  separated list of addresses. Make sure to return the address in the same language as the user message."},
-            {"role": "user", "content": all_text}],
-        model="gpt-3.5-turbo",
-        )
-
-        # print(q)
-        expl = response.choices[0].message.content
-        addresses = expl.split(",")
-        aspiringdf=[]
-        # print(expl)
-        # print(addresses)
-        geolocator = Nominatim(user_agent="DEF")
-        for address in addresses:
-            location = None
-            try:
-                location = geolocator.geocode(address+", NY")
-            except Exception as e:
-                location = None
-                sleep(.1)
-
-            if location is not None:
-                print(location.latitude, location.longitude)
-                aspiringdf.append((location.latitude, location.longitude, address))
-            else: 
-                print("No location found")
-
-        
-
-        df = pl.DataFrame(aspiringdf, schema=["lat", "lon", "address"])
-        print(df.head())
-        table.update(df.to_pandas().to_dict(orient="records"))
-    
+        with NODE_SECONDS.time(f"diff_frames:{name}"):
+            delta = s_differ.diff(data)
+        NODE_ROWS.observe(len(data), f"diff_frames:{name}")
+        if not delta.upserts.is_empty():
+            csp.output(upserts=delta.upserts)
+        if delta.removed:
+            csp.output(removed=delta.removed)
+
+
+@csp.node
+def remove_rows_from_perspective_table(removed: ts[list], writer: TableWriter):
+    if csp.ticked(removed):
+        writer.remove(removed)
+
+
+def mta_alerts(feeds: FeedAdapterManager, ds_loader: DatasetLoader, interval: timedelta = timedelta(seconds=500)) -> ts[FrameDelta]:
+    # the alerts download, address extraction and geocoding all run on the feed thread pool, and only for alerts that
+    # are new or changed since the last poll
+    return feeds.subscribe(FrameDelta, "mta_alerts", ds_loader.get_mta_alert_updates, interval)
+
 
-        
-    # if csp.ticked(table):
-    #     alerts = table.get_mta_alarms()
-    #     print(alerts)
-        
 @csp.node
-def process_data(df: ts[pl.DataFrame]) -> ts[pl.DataFrame]:
+def split_delta(delta: ts[FrameDelta]) -> csp.Outputs(upserts=ts[pl.DataFrame], removed=ts[list]):
+    if csp.ticked(delta):
+        QUEUE_LAG.handled("mta_alerts")
+        if not delta.upserts.is_empty():
+            csp.output(upserts=delta.upserts)
+        if delta.removed:
+            csp.output(removed=delta.removed)
+
+
+@csp.node
+def process_data(df: ts[pl.DataFrame], alerts: ts[pl.DataFrame], forecast: object, processes: int, engine: object) -> ts[pl.DataFrame]:
+    with csp.state():
+        # long-lived graph per system: station geometry and neighbor lists survive across ticks, only bike counts are
+        # refreshed; with several systems each one is rebalanced in its own worker process, and with a partition
+        # engine the full recomputes of a system are planned tile by tile
+        s_rebalancer = PartitionedRebalancer(top_k=8, use_spatial_index=True, processes=processes, engine=engine)
+
+    with csp.stop():
+        s_rebalancer.close()
+
     if csp.ticked(df):
+        QUEUE_LAG.handled("station_status")
+
+    if csp.ticked(df, alerts) and csp.valid(df):
         if isinstance(df, pl.DataFrame):
-            graph = Graph(top_k=8)  
-            graph._fill_nodes(df)  
-            graph.set_top_k_distances()
-            graph.rebalance_stations(25, 40)
+            started = time.perf_counter()
+            NODE_ROWS.observe(len(df), "process_data")
+            # per-station bands from the learnt demand when a forecast was trained, they only move on the hour
+            if forecast is not None:
+                min_bikes, max_bikes = forecast.targets(df["station_id"].to_list(), df["capacity"].fill_null(0).to_numpy(), csp.now())
+            else:
+                min_bikes, max_bikes = MIN_BIKES, MAX_BIKES
 
-            modified_df = df.clone()
+            # only the neighborhoods of stations whose counts changed since the last poll are replanned
+            rebalanced = s_rebalancer.rebalance(df, min_bikes, max_bikes)
 
+            # stations within ALERT_RADIUS_KM of a live service alert are flagged, through the graph's grid index
+            flags = stations_near_alerts(s_rebalancer.graph, alerts, ALERT_RADIUS_KM) if csp.valid(alerts) else None
 
-            # This loop iterates over each station in the graph. For each station, it updates the 'capacity' column in the DataFrame 'modified_df'.
-            # It sets the 'capacity' to 'num_bikes' where the 'station_id' matches, otherwise it retains the original 'capacity'.
-            for station_id, (num_bikes, _, _, _) in graph.nodes.items():
-                modified_df = modified_df.with_columns(pl.when(pl.col("station_id") == station_id).then(num_bikes).otherwise(pl.col("num_bikes_available")).alias("num_bikes_available"))
-            return modified_df
+            # one hash lookup on station_id instead of a full-column pass per station
+            result = with_alert_flags(rebalanced, flags)
+            NODE_SECONDS.observe(time.perf_counter() - started, "process_data")
+            return result
 
-@csp.graph        
-def main_graph(table: PerspectiveTable, mod_table: PerspectiveTable, alert_table: PerspectiveTable, interval: timedelta = timedelta(seconds=10)):
-    data = poll_data(interval)
-    modified_df = process_data(data)
-    # mta_alerts = mta_alerts(alert_table)
 
-    # data.vstack(modified_df)
-    push_data_to_perspective_table(data, table)
-    push_data_to_perspective_table(modified_df, mod_table)
-    # mta_alerts = mta_alerts(alert_table)
+@csp.node
+def alert_locations(delta: ts[FrameDelta]) -> ts[pl.DataFrame]:
+    with csp.state():
+        s_locations = None
 
-    # csp.print("data", data)
-    # csp.print("graph", modified_df)
+    if csp.ticked(delta):
+        s_locations = apply_delta(s_locations, delta, index="id")
+        return s_locations
 
-def run_app(manager: PerspectiveManager):
-    """Connect to csp to perspective and load data
+def load_forecast(path: Optional[str]) -> Optional[DemandForecast]:
+    """Load the demand forecast process_data sets the rebalancing bounds from
 
     Args:
-        manager (PerspectiveManager): PerspectiveManager instance (hosts the tables)
+        path (str): file written by --train-forecast, the fixed MIN_BIKES/MAX_BIKES band is used if None
+
+    Returns:
+        DemandForecast: the forecast, or None if no path is given
+    """
+    if path is None:
+        logging.info(f"No demand forecast configured, every station is rebalanced to {MIN_BIKES}-{MAX_BIKES} bikes")
+        return None
+    forecast = DemandForecast.load(path)
+    logging.critical(f"Rebalancing targets from the demand forecast {os.path.abspath(path)} ({len(forecast.station_ids)} stations)")
+    return forecast
+
+
+def partition_engine(tile_km: Optional[float], processes: int) -> Optional[PartitionedEngine]:
+    """Engine planning the full rebalancing recomputes of a system in square tiles, in parallel
+
+    Args:
+        tile_km (float): side of the tiles, every system is planned in one greedy pass if None
+        processes (int): worker processes the systems are spread over; each system's tiles are planned in its worker
+            then, otherwise over one process per core
+
+    Returns:
+        PartitionedEngine: the engine, or None if no tile size is given
+    """
+    if tile_km is None:
+        return None
+    logging.critical(f"Planning full rebalancing recomputes in {tile_km} km tiles")
+    return PartitionedEngine(tile_km=tile_km, processes=0 if processes else None)
+
+
+def train_forecast(path: str, output: str) -> DemandForecast:
+    """Learn the demand forecast from history and save it for process_data
+
+    Args:
+        path (str): trip history CSV files (a path or a glob), or a snapshot history directory recorded with --history
+        output (str): file the forecast is written to, see load_forecast
+
+    Returns:
+        DemandForecast: the trained forecast, also written to output
+    """
+    ds_loader = DatasetLoader(path)
+    if os.path.isdir(path):
+        ds_loader.load_snapshots()
+        forecast = DemandForecast.from_snapshots(ds_loader.stream)
+    else:
+        # trip files name stations by short_name, the live feed by station_id
+        ds_loader.load_trips()
+        forecast = DemandForecast.from_trips(ds_loader.stream, stations=ds_loader.get_stations())
+    forecast.save(output)
+    return forecast
+
+
+@csp.graph
+def station_graph(
+    data: ts[pl.DataFrame],
+    alerts: ts[pl.DataFrame],
+    writer: TableWriter,
+    mod_writer: TableWriter,
+    processes: int = 0,
+    forecast: object = None,
+    engine: object = None,
+):
+    modified_df = process_data(data, alerts, forecast, processes, engine)
+
+    # both tables are indexed by station_id, so only inserted, changed and removed rows are sent each tick
+    data_delta = diff_frames(data, writer.name)
+    modified_delta = diff_frames(modified_df, mod_writer.name)
+    push_data_to_perspective_table(data_delta.upserts, writer)
+    remove_rows_from_perspective_table(data_delta.removed, writer)
+    push_data_to_perspective_table(modified_delta.upserts, mod_writer)
+    remove_rows_from_perspective_table(modified_delta.removed, mod_writer)
+
+
+@csp.graph        
+def main_graph(
+    writer: TableWriter,
+    mod_writer: TableWriter,
+    alert_writer: TableWriter,
+    interval: timedelta = timedelta(seconds=10),
+    gbfs_urls: list = None,
+    history_dir: str = None,
+    history_days: int = None,
+    geocode_cache: str = None,
+    forecast: object = None,
+    partition_km: float = None,
+):
+    # every feed is fetched concurrently off the engine thread and ticks when it arrives, so a slow endpoint never
+    # stalls process_data or the perspective pushes
+    feeds = FeedAdapterManager(max_workers=4, timeout=30.0)
+    # alert addresses are extracted locally unless ALERT_EXTRACTOR=llm selects the OpenAI backend
+    extractor = EXTRACTORS[os.environ.get("ALERT_EXTRACTOR", "regex")]()
+    # with a cache file geocoded alert addresses survive restarts, recurring alerts never reach Nominatim twice
+    ds_loader = DatasetLoader(
+        geocoder=BatchGeocoder(NominatimGeocoder(), GeocodeCache(geocode_cache or ":memory:")),
+        extractor=extractor,
+    )
+
+    # several systems are polled together into one system-tagged frame and rebalanced in up to one process per core
+    if gbfs_urls:
+        stations = MultiSystemLoader.from_gbfs(gbfs_urls, client=ds_loader.client)
+        processes = min(len(stations.loaders), os.cpu_count() or 1) if len(stations.loaders) > 1 else 0
+    else:
+        stations, processes = ds_loader, 0
+
+    data = poll_data(feeds, stations, interval)
+    alerts = mta_alerts(feeds, ds_loader)
+    # every polled frame is kept for backtesting and replay when a history directory is configured
+    if history_dir:
+        store_snapshots(data, history_dir, history_days)
+    station_graph(data, alert_locations(alerts), writer, mod_writer, processes, forecast, partition_engine(partition_km, processes))
+
+    alerts_delta = split_delta(alerts)
+    push_data_to_perspective_table(alerts_delta.upserts, alert_writer)
+    remove_rows_from_perspective_table(alerts_delta.removed, alert_writer)
+
+
+@csp.graph
+def replay_graph(path: str, writer: TableWriter, mod_writer: TableWriter, forecast: object = None, partition_km: float = None):
+    # recorded frames stand in for poll_data, there is no network and no alerts feed
+    station_graph(replay_status(path), csp.null_ts(pl.DataFrame), writer, mod_writer, 0, forecast, partition_engine(partition_km, 0))
+
+
+def make_tables():
+    """Create the station, modified station and alerts tables
+
+    Returns:
+        (PerspectiveTable, PerspectiveTable, PerspectiveTable): data, mod_data and alerts_table
     """
     table = PerspectiveTable(
         {
@@ -214,6 +365,7 @@ def run_app(manager: PerspectiveManager):
             "is_renting": bool,
             "is_returning": bool,
             "last_reported": datetime,
+            "system_id": str,
         },
         index="station_id",
     )
@@ -235,35 +387,137 @@ def run_app(manager: PerspectiveManager):
             "is_renting": bool,
             "is_returning": bool,
             "last_reported": datetime,
+            "system_id": str,
+            "alerts_nearby": int,
+            "nearest_alert_km": float,
         },
         index="station_id",
     )
 
     table3 = PerspectiveTable(
         {
+            "id": str,
+            "alert_id": str,
             "lat": float,
             "lon": float,
             "address": str,
         },
-        index="address",
+        index="id",
     )
+    return table, table2, table3
+
+
+def run_app(
+    manager: PerspectiveManager,
+    gbfs_urls: Optional[list] = None,
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+    history_dir: Optional[str] = None,
+    history_days: Optional[int] = None,
+    geocode_cache: Optional[str] = None,
+    forecast_path: Optional[str] = None,
+    partition_km: Optional[float] = None,
+):
+    """Connect to csp to perspective and load data
+
+    Args:
+        manager (PerspectiveManager): PerspectiveManager instance (hosts the tables)
+        gbfs_urls (list): gbfs.json of every bike share system to poll, Citi Bike only if None
+        loop (asyncio.AbstractEventLoop): loop running the perspective callbacks, table updates are applied on it
+            in batches; applied on the csp thread if None
+        history_dir (str): directory every polled station frame is recorded to, partitioned by day; nothing is
+            recorded if None
+        history_days (int): days of history kept in history_dir, all of them if None
+        geocode_cache (str): SQLite file caching geocoded alert addresses across restarts, in memory if None
+        forecast_path (str): demand forecast setting the rebalancing targets, see load_forecast
+        partition_km (float): side of the tiles full rebalancing recomputes are planned in, see partition_engine
+    """
+    table, table2, table3 = make_tables()
 
     # host these tables
     manager.host_table("data", table)
     manager.host_table("mod_data", table2)
     manager.host_table("alerts_table", table3)
 
-    
-    return csp.run_on_thread(main_graph, table, table2, table3,timedelta(seconds=60), realtime=True)
+    # csp only queues the updates, a slow websocket client or a large update never holds up the engine
+    schedule = loop.call_soon_threadsafe if loop is not None else None
+    writers = [TableWriter(t, name, schedule) for t, name in ((table, "data"), (table2, "mod_data"), (table3, "alerts_table"))]
+    return csp.run_on_thread(main_graph, *writers, timedelta(seconds=60), gbfs_urls, history_dir, history_days, geocode_cache, load_forecast(forecast_path), partition_km, realtime=True)
+
+
+# nodes whose latency a replay reports
+REPLAY_NODES = ["process_data", "diff_frames", "push_data_to_perspective_table", "remove_rows_from_perspective_table"]
+
+
+def run_replay(
+    path: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    forecast_path: Optional[str] = None,
+    partition_km: Optional[float] = None,
+) -> pl.DataFrame:
+    """Replay recorded station frames through the station pipeline as fast as the engine runs, and profile it
+
+    Args:
+        path (str): SnapshotStore root, or a directory of recorded station_status JSON payloads
+        start (datetime): first recorded time replayed, the beginning of the recording if None
+        end (datetime): first recorded time not replayed, the end of the recording if None
+        forecast_path (str): demand forecast setting the rebalancing targets, see load_forecast
+        partition_km (float): side of the tiles full rebalancing recomputes are planned in, see partition_engine
+
+    Returns:
+        pl.DataFrame: replay_report of the process_data, diff and perspective push nodes
+    """
+    table, table2, _ = make_tables()
+    began = time.perf_counter()
+    with Profiler() as profiler:
+        # historical mode: engine time jumps from one recorded poll to the next, with no waiting in between; without a
+        # perspective loop the writers apply every update as it is queued
+        csp.run(replay_graph, path, TableWriter(table, "data"), TableWriter(table2, "mod_data"), load_forecast(forecast_path), partition_km, starttime=start or REPLAY_START, endtime=end or REPLAY_END, realtime=False)
+    wall_seconds = time.perf_counter() - began
+
+    info = profiler.results()
+    ticks = info.node_stats.get("process_data", {}).get("executions", 0)
+    logging.critical(
+        f"Replayed {ticks} snapshots in {wall_seconds:.2f}s: {ticks / wall_seconds:.1f} ticks/s, "
+        f"{info.cycle_count} engine cycles, {table2.size()} stations"
+    )
+    report = replay_report(info, wall_seconds, REPLAY_NODES)
+    with pl.Config(tbl_rows=-1, tbl_hide_dataframe_shape=True):
+        logging.critical(f"Per-node latency:\n{report}")
+    return report
 
 
 def main():
-    # csp.run(main_graph, None, timedelta(seconds=60), realtime=True)
+    # settings in .env apply to the flags below as well
     load_dotenv()
+    parser = argparse.ArgumentParser(description="Citi Bike rebalancing service")
+    parser.add_argument("--replay", metavar="PATH", help="replay recorded snapshots from PATH offline and report throughput")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="first recorded time replayed (UTC)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="first recorded time not replayed (UTC)")
+    parser.add_argument("--gbfs", metavar="URL", action="append", help="gbfs.json of a bike share system to poll, repeat for several systems")
+    parser.add_argument("--train-forecast", metavar="PATH", help="learn per-station rebalancing targets from trip CSVs or a snapshot history")
+    parser.add_argument("--forecast", metavar="PATH", default=os.environ.get("DEMAND_FORECAST"), help="demand forecast setting the rebalancing targets (env DEMAND_FORECAST), written by --train-forecast")
+    parser.add_argument("--history", metavar="DIR", default=os.environ.get("HISTORY_DIR"), help="record every polled station frame under DIR (env HISTORY_DIR), off by default")
+    parser.add_argument("--history-days", metavar="N", type=int, default=os.environ.get("HISTORY_DAYS"), help="days of recorded history kept (env HISTORY_DAYS), all by default")
+    parser.add_argument("--geocode-cache", metavar="PATH", default=os.environ.get("GEOCODE_CACHE"), help="SQLite file caching geocoded alert addresses (env GEOCODE_CACHE), in memory by default")
+    parser.add_argument("--partition-km", metavar="KM", type=float, default=os.environ.get("PARTITION_KM"), help="plan full rebalancing recomputes in parallel over square tiles of KM (env PARTITION_KM), one greedy pass per system by default")
+    args = parser.parse_args()
+    if args.train_forecast:
+        if not args.forecast:
+            parser.error("--train-forecast needs --forecast PATH (or DEMAND_FORECAST) to write the forecast to")
+        began = time.perf_counter()
+        forecast = train_forecast(args.train_forecast, args.forecast)
+        logging.critical(f"Trained a forecast for {len(forecast.station_ids)} stations in {time.perf_counter() - began:.1f}s")
+        return
+    if args.replay:
+        run_replay(args.replay, args.start, args.end, args.forecast, args.partition_km)
+        return
+
+    # csp.run(main_graph, None, timedelta(seconds=60), realtime=True)
     perspective_manager = PerspectiveManager()
 
     app = make_perspective_app(perspective_manager)
-    run_app(perspective_manager)
+    run_app(perspective_manager, args.gbfs, app.state.perspective_loop, args.history, args.history_days, args.geocode_cache, args.forecast, args.partition_km)
     # logging.critical("Listening on http://localhost:8080")
     uvicorn.run(app, host="0.0.0.0", port=8080)
 
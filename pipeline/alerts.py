@@ -0,0 +1,125 @@
+import hashlib
+import logging
+from typing import Iterable, Optional
+
+import polars as pl
+
+from pipeline.extractors import AddressExtractor, RegexAddressExtractor
+from pipeline.frame_diff import FrameDelta
+from pipeline.geocode import BatchGeocoder, normalize_address
+
+logger = logging.getLogger(__name__)
+
+ALERT_LOCATION_SCHEMA = {
+    "id": pl.String,
+    "alert_id": pl.String,
+    "lat": pl.Float64,
+    "lon": pl.Float64,
+    "address": pl.String,
+}
+
+
+def alert_header(entity) -> str:
+    """
+    Header text of a GTFS-realtime alert entity, empty if it has none.
+    """
+    translations = entity.alert.header_text.translation
+    return translations[0].text if translations else ""
+
+
+def header_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class AlertLocator:
+    """
+    Turns successive MTA alert feeds into incremental updates of the geocoded alert locations
+
+    Alerts are tracked by GTFS-realtime entity id and a hash of their header text, so only new or reworded alerts
+    reach the extractor and the geocoder. Extraction results are cached per header hash for as long as an alert with
+    that text is live. Each location row is indexed by "<alert_id>|<address>", so the rows of an alert that
+    disappears or changes can be removed from the alerts table.
+    """
+    def __init__(self, geocoder: BatchGeocoder, extractor: Optional[AddressExtractor] = None) -> None:
+        """
+        Args:
+            geocoder: BatchGeocoder resolving the extracted addresses
+            extractor: AddressExtractor returning the addresses mentioned in one alert's text, the local
+                RegexAddressExtractor by default
+        """
+        self.geocoder = geocoder
+        self.extractor = extractor if extractor is not None else RegexAddressExtractor()
+        # alert_id -> (header hash, row ids pushed for it)
+        self._alerts = {}
+        # header hash -> extracted addresses
+        self._extractions = {}
+        self.pending = False
+
+    def _extract(self, text: str) -> Optional[list[str]]:
+        try:
+            return self.extractor.extract(text)
+        except Exception as e:
+            logger.warning(f"Address extraction failed: {e}")
+            return None
+
+    def update(self, entities: Iterable) -> FrameDelta:
+        """
+        Args:
+            entities: the entities of the current alerts FeedMessage
+
+        Returns:
+            FrameDelta: location rows of new or changed alerts, and the row ids of alerts that changed or disappeared
+        """
+        current = {}
+        for entity in entities:
+            if entity.is_deleted or not entity.HasField("alert"):
+                continue
+            text = alert_header(entity)
+            current[entity.id] = (header_hash(text), text)
+
+        removed = []
+        for alert_id in list(self._alerts):
+            digest, row_ids = self._alerts[alert_id]
+            if alert_id not in current or current[alert_id][0] != digest:
+                removed.extend(row_ids)
+                del self._alerts[alert_id]
+
+        # alerts whose extraction or geocoding fails are left untracked, so they are retried on the next update
+        self.pending = False
+        fresh = {}
+        for alert_id, (digest, text) in current.items():
+            if alert_id in self._alerts:
+                continue
+            addresses = self._extractions.get(digest)
+            if addresses is None:
+                addresses = self._extract(text)
+                if addresses is None:
+                    self.pending = True
+                    continue
+                self._extractions[digest] = addresses
+            fresh[alert_id] = (digest, addresses)
+
+        live = {digest for digest, _ in current.values()}
+        self._extractions = {digest: addresses for digest, addresses in self._extractions.items() if digest in live}
+
+        locations = self.geocoder.geocode_many(address for _, addresses in fresh.values() for address in addresses)
+        rows = []
+        for alert_id, (digest, addresses) in fresh.items():
+            addresses = [address for address in dict.fromkeys(address.strip() for address in addresses) if normalize_address(address)]
+            if any(address not in locations for address in addresses):
+                # a failed request is not a confirmed miss; none of the alert's rows are pushed until all resolve, so
+                # an alert that disappears meanwhile leaves nothing behind in the table
+                self.pending = True
+                continue
+            alert_rows = [
+                (f"{alert_id}|{address}", alert_id, locations[address][0], locations[address][1], address)
+                for address in addresses
+                if locations[address] is not None
+            ]
+            rows.extend(alert_rows)
+            self._alerts[alert_id] = (digest, [row[0] for row in alert_rows])
+
+        # a changed alert's rows are removed and re-added in the same delta, keep only the removal of rows that are gone
+        upserted = {row[0] for row in rows}
+        removed = [row_id for row_id in removed if row_id not in upserted]
+        return FrameDelta(pl.DataFrame(rows, schema=ALERT_LOCATION_SCHEMA, orient="row"), removed)
@@ -0,0 +1,77 @@
+from datetime import date, datetime
+
+import polars as pl
+import pyarrow as pa
+
+# perspective column types (as reported by Table.schema()) and the arrow type each one is loaded from
+PERSPECTIVE_ARROW_TYPES = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp("ms"),
+    date: pa.date32(),
+}
+
+
+def _cast_column(column: pa.ChunkedArray, target: pa.DataType) -> pa.ChunkedArray:
+    """
+    Cast one column to the type perspective expects for it.
+    """
+    if pa.types.is_timestamp(target) and pa.types.is_integer(column.type):
+        # GBFS timestamps (e.g. last_reported) are epoch seconds, like the records path interprets them
+        return column.cast(pa.int64()).cast(pa.timestamp("s")).cast(target)
+    if pa.types.is_timestamp(target) and pa.types.is_timestamp(column.type) and column.type.tz is not None:
+        return column.cast(pa.timestamp(column.type.unit)).cast(target)
+    return column.cast(target)
+
+
+class ArrowIPCEncoder:
+    """
+    Serializes polars frames into Arrow IPC stream bytes that perspective.Table.update loads without per-row Python objects
+
+    Perspective does not coerce arrow types on load (a mismatch aborts the process), so every frame is cast to the
+    table's schema first. The cast plan is cached per incoming arrow schema, which is the same on every tick.
+    """
+    def __init__(self, table_schema: dict) -> None:
+        """
+        Args:
+            table_schema: dict, column name -> python type, as returned by perspective.Table.schema()
+        """
+        self.table_schema = {name: PERSPECTIVE_ARROW_TYPES[kind] for name, kind in table_schema.items()}
+        self._schema_cache = {}
+
+    def _target_schema(self, schema: pa.Schema) -> pa.Schema:
+        """
+        Arrow schema the table accepts for frames with the given schema: table columns only, in perspective's types.
+        """
+        target = self._schema_cache.get(schema)
+        if target is None:
+            target = pa.schema([(name, self.table_schema[name]) for name in schema.names if name in self.table_schema])
+            self._schema_cache[schema] = target
+        return target
+
+    def encode(self, dataframe: pl.DataFrame) -> bytes:
+        """
+        Args:
+            dataframe: pl.DataFrame, rows to push, columns the table does not have are dropped
+
+        Returns:
+            bytes: an Arrow IPC stream accepted by perspective.Table.update
+        """
+        table = dataframe.to_arrow()
+        target = self._target_schema(table.schema)
+        columns = [_cast_column(table.column(field.name), field.type) for field in target]
+        table = pa.Table.from_arrays(columns, schema=target)
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, target) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def to_records(dataframe: pl.DataFrame) -> list[dict]:
+    """
+    Row-by-row fallback payload for perspective.Table.update.
+    """
+    return dataframe.to_pandas().to_dict(orient="records")
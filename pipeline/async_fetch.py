@@ -0,0 +1,203 @@
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Callable, Optional
+
+import csp
+from csp import ts
+from csp.impl.adaptermanager import AdapterManagerImpl
+from csp.impl.pushadapter import PushInputAdapter
+from csp.impl.wiring import py_push_adapter_def
+
+from pipeline.metrics import POLL_SECONDS, QUEUE_LAG
+
+logger = logging.getLogger(__name__)
+
+# a fetch returns the value to tick, or None when there is nothing new
+Fetch = Callable[[], Optional[Any]]
+
+
+class _Job:
+    __slots__ = ("name", "fetch", "interval", "callback", "in_flight", "started_at", "timed_out")
+
+    def __init__(self, name: str, fetch: Fetch, interval: float, callback: Callable[[Any], None]) -> None:
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.callback = callback
+        self.in_flight = False
+        self.started_at = 0.0
+        self.timed_out = False
+
+
+class FeedScheduler:
+    """
+    Runs blocking feed fetches concurrently on a thread pool, each on its own interval
+
+    A feed never has more than one fetch running: a poll that comes due while the last fetch is still running is
+    skipped, so fetches of one loader never race each other. A fetch that runs past timeout is logged, and its result
+    is still delivered: it is the newest one, and delta feeds (alerts, changed stations) have already recorded it as
+    sent. The feed is polled again on its normal cadence once the call returns.
+    """
+    def __init__(self, max_workers: int = 4, timeout: float = 30.0) -> None:
+        """
+        Args:
+            max_workers: int, number of fetches that can run at the same time
+            timeout: float, seconds after which a running fetch is reported as stuck
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._jobs = {}
+        self._queue = []
+        self._lock = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._running = False
+
+    def add(self, name: str, fetch: Fetch, interval: float, callback: Callable[[Any], None]) -> None:
+        """
+        Args:
+            name: str, unique name of the feed
+            fetch: Fetch, blocking call returning the value to deliver, or None
+            interval: float, seconds between the start of two polls
+            callback: called from a worker thread with every non-None result
+        """
+        with self._lock:
+            self._jobs[name] = _Job(name, fetch, interval, callback)
+            heapq.heappush(self._queue, (time.monotonic(), name))
+            self._lock.notify()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="feed-fetch")
+        self._thread = threading.Thread(target=self._run, name="feed-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._running = False
+            self._lock.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            # running fetches are left to finish on their own, their results are dropped
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _run(self) -> None:
+        with self._lock:
+            while self._running:
+                now = time.monotonic()
+                if not self._queue:
+                    self._lock.wait()
+                    continue
+                due, name = self._queue[0]
+                if due > now:
+                    self._lock.wait(due - now)
+                    continue
+                heapq.heappop(self._queue)
+                job = self._jobs.get(name)
+                if job is None:
+                    continue
+                next_due = due + job.interval
+                if next_due <= now:
+                    # fell behind (e.g. after a long fetch), do not try to catch up on missed polls
+                    next_due = now + job.interval
+                heapq.heappush(self._queue, (next_due, name))
+
+                if job.in_flight:
+                    # the call cannot be cancelled, a second one would race it on the same loader
+                    if now - job.started_at >= self.timeout and not job.timed_out:
+                        job.timed_out = True
+                        logger.warning(f"Fetch of {name} timed out after {self.timeout:.0f}s, skipping polls until it returns")
+                    continue
+                job.in_flight = True
+                job.started_at = now
+                job.timed_out = False
+                self._executor.submit(self._fetch, job)
+
+    def _fetch(self, job: _Job) -> None:
+        start = time.perf_counter()
+        try:
+            result = job.fetch()
+        except Exception as e:
+            logger.warning(f"Fetch of {job.name} failed: {e}")
+            result = None
+        POLL_SECONDS.observe(time.perf_counter() - start, job.name)
+
+        with self._lock:
+            job.in_flight = False
+            if not self._running:
+                return
+            if job.timed_out:
+                logger.warning(f"Fetch of {job.name} finished after its {self.timeout:.0f}s timeout")
+
+        if result is not None:
+            # the consuming node calls QUEUE_LAG.handled(name) to measure how long the value waited for the engine
+            QUEUE_LAG.pushed(job.name)
+            job.callback(result)
+
+
+class FeedAdapterManager:
+    """
+    csp adapter manager delivering feed fetches as realtime ticks
+
+    The fetches run on a FeedScheduler thread pool, so a slow endpoint delays only its own edge while the rest of
+    the graph keeps ticking.
+    """
+    def __init__(self, max_workers: int = 4, timeout: float = 30.0) -> None:
+        """
+        Args:
+            max_workers: int, number of fetches that can run at the same time
+            timeout: float, seconds after which a running fetch is reported as stuck
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def subscribe(self, typ: type, name: str, fetch: Fetch, interval: timedelta) -> ts["T"]:
+        """
+        Args:
+            typ: type of the values fetch returns
+            name: str, unique name of the feed
+            fetch: Fetch, blocking call returning the value to tick, or None to skip the tick
+            interval: timedelta, time between two polls
+
+        Returns:
+            ts[typ]: ticks with every fetched value as soon as it arrives
+        """
+        return _feed_adapter(self, typ, name, fetch, interval, push_mode=csp.PushMode.NON_COLLAPSING)
+
+    def _create(self, engine, memo):
+        return _FeedAdapterManagerImpl(engine, self)
+
+
+class _FeedAdapterManagerImpl(AdapterManagerImpl):
+    def __init__(self, engine, rep: FeedAdapterManager):
+        super().__init__(engine)
+        self._scheduler = FeedScheduler(max_workers=rep.max_workers, timeout=rep.timeout)
+
+    def start(self, starttime, endtime):
+        self._scheduler.start()
+
+    def stop(self):
+        self._scheduler.stop()
+
+    def process_next_sim_timeslice(self, now):
+        return None
+
+
+class _FeedAdapterImpl(PushInputAdapter):
+    def __init__(self, manager_impl: _FeedAdapterManagerImpl, typ: type, feed: str, fetch: Fetch, interval: timedelta):
+        manager_impl._scheduler.add(feed, fetch, interval.total_seconds(), self.push_tick)
+
+
+_feed_adapter = py_push_adapter_def(
+    "feed_adapter", _FeedAdapterImpl, ts["T"], FeedAdapterManager, typ="T", feed=str, fetch=object, interval=timedelta
+)
@@ -0,0 +1,145 @@
+import os
+import re
+
+from pipeline.geocode import normalize_address
+
+EXTRACTION_PROMPT = "Give just all addresses as a comma separated list based off of the user message.  Give just the location if additional information is missing do not add. Make sure to return a comma  separated list of addresses. Make sure to return the address in the same language as the user message."
+
+STREET_SUFFIXES = [
+    "St", "Street", "Ave", "Avenue", "Av", "Rd", "Road", "Blvd", "Boulevard", "Pkwy", "Parkway", "Pl", "Place",
+    "Dr", "Drive", "Ln", "Lane", "Ct", "Court", "Ter", "Terrace", "Hwy", "Highway", "Expwy", "Expressway", "Tpke",
+    "Turnpike", "Concourse", "Sq", "Square", "Plaza", "Way", "Loop", "Walk", "Oval", "Slip",
+]
+
+# streets whose name has no suffix, or does not follow the "<Name> <Suffix>" pattern
+NAMED_STREETS = [
+    "Avenue of the Americas", "Broadway", "Bowery", "Park Row", "Fashion Ave", "Central Park West",
+    "Central Park South", "Adam Clayton Powell Jr Blvd", "Frederick Douglass Blvd", "Malcolm X Blvd",
+]
+
+_WORD = r"(?:[A-Z][\w'-]*|\d+(?:st|nd|rd|th)?)"
+_STREET = re.compile(
+    r"(?:"
+    + "|".join(re.escape(name) for name in NAMED_STREETS)
+    + r"|(?:Avenue|Ave)\s[A-Z](?![\w'-])"
+    + rf"|{_WORD}(?:[ -]{_WORD}){{0,3}}?\s(?:{'|'.join(STREET_SUFFIXES)})(?![\w'-])"
+    + r")"
+)
+
+_TOKEN = r"§(\d+)§"
+_STOPS = r"(?:\s(?:bus\s)?stops?)?"
+# "<A> stop between <B> and <C>", "<A> from <B> to <C>"
+_ALONG_BETWEEN = re.compile(rf"{_TOKEN}{_STOPS}\s(?:between\s{_TOKEN}\sand|from\s{_TOKEN}\sto)\s{_TOKEN}")
+# "between <B> and <C> along <A>"
+_BETWEEN_ALONG = re.compile(rf"between\s{_TOKEN}\sand\s{_TOKEN}\s(?:along|on|via)\s(?:the\s)?{_TOKEN}")
+# "<A> at <B> and <C>", "<A> and <B>", "<A> near <B>", "<A> & <B>", "<A>/<B>"
+_CROSSING = re.compile(rf"{_TOKEN}((?:\s?(?:at|near|and|&|/)\s?{_TOKEN})+)")
+
+
+def address_key(address: str) -> str:
+    """
+    Comparison key for extracted addresses: normalized, with the streets of an intersection in a fixed order.
+    """
+    return " & ".join(sorted(normalize_address(street) for street in re.split(r"\s(?:&|and|at)\s", address)))
+
+
+class AddressExtractor:
+    """
+    Finds the street addresses and intersections an alert mentions, so AlertLocator can swap backends
+    """
+    name = "base"
+
+    def extract(self, text: str) -> list[str]:
+        """
+        Args:
+            text: str, the header text of one alert
+
+        Returns:
+            list[str]: addresses in the order they appear, intersections written as "<street> & <cross street>"
+        """
+        raise NotImplementedError
+
+    def __call__(self, text: str) -> list[str]:
+        return self.extract(text)
+
+
+class RegexAddressExtractor(AddressExtractor):
+    """
+    Local extractor: street names are found with a gazetteer of NYC suffixes and named streets, then paired into
+    intersections from the phrases MTA alerts use ("on <A> at <B> and <C>", "<A> stop between <B> and <C>",
+    "<A> from <B> to <C>", "between <B> and <C> along <A>")
+
+    Runs in microseconds per alert and needs no network.
+    """
+    name = "regex"
+
+    def extract(self, text: str) -> list[str]:
+        streets = []
+
+        def tokenize(match: re.Match) -> str:
+            streets.append(match.group(0))
+            return f"§{len(streets) - 1}§"
+
+        skeleton = _STREET.sub(tokenize, text)
+        # address -> position of its first street in the text, to return them in reading order
+        addresses = {}
+        paired = set()
+
+        def crossing(street: int, cross: int) -> None:
+            addresses.setdefault(f"{streets[street]} & {streets[cross]}", min(street, cross))
+            paired.update((street, cross))
+
+        for pattern, anchor_group in ((_ALONG_BETWEEN, 0), (_BETWEEN_ALONG, 2)):
+            for match in pattern.finditer(skeleton):
+                groups = [int(group) for group in match.groups() if group is not None]
+                anchor = groups.pop(anchor_group)
+                for cross in groups:
+                    crossing(anchor, cross)
+            skeleton = pattern.sub("¤", skeleton)
+
+        for match in _CROSSING.finditer(skeleton):
+            anchor = int(match.group(1))
+            for cross in re.findall(_TOKEN, match.group(2)):
+                crossing(anchor, int(cross))
+
+        # streets that are not part of an intersection are kept on their own
+        for position, street in enumerate(streets):
+            if position not in paired:
+                addresses.setdefault(street, position)
+        return sorted(addresses, key=addresses.get)
+
+
+class LLMAddressExtractor(AddressExtractor):
+    """
+    Remote extractor asking the OpenAI chat API for the addresses, the original pipeline's approach
+
+    Needs network access, the openai package and OPENAI_API_KEY; expect seconds of latency per call.
+    """
+    name = "llm"
+
+    def __init__(self, model: str = "gpt-3.5-turbo", timeout: float = 30.0) -> None:
+        """
+        Args:
+            model: str, chat completion model
+            timeout: float, seconds before a request is abandoned
+        """
+        import openai
+
+        self.model = model
+        self._client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"], timeout=timeout)
+
+    def extract(self, text: str) -> list[str]:
+        response = self._client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": EXTRACTION_PROMPT},
+                {"role": "user", "content": text},
+            ],
+            model=self.model,
+        )
+        return [address.strip() for address in response.choices[0].message.content.split(",") if address.strip()]
+
+
+EXTRACTORS = {
+    RegexAddressExtractor.name: RegexAddressExtractor,
+    LLMAddressExtractor.name: LLMAddressExtractor,
+}
@@ -0,0 +1,124 @@
+import logging
+import time
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+import httpx
+
+from pipeline.metrics import FETCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def feed_name(url: str) -> str:
+    """
+    Short name of a feed URL for metric labels, e.g. station_status for .../en/station_status.json.
+    """
+    return unquote(urlparse(url).path).rstrip("/").rsplit("/", 1)[-1].removesuffix(".json")
+
+
+class FeedClient:
+    """
+    Pooled, persistent HTTP client for GBFS feeds
+
+    One keep-alive connection pool (HTTP/2 when the h2 package is installed) is shared by every feed. Responses are
+    cached per URL with their ETag / Last-Modified validators, requests inside a feed's GBFS ttl are answered from the
+    cache, and later ones are sent as conditional requests so an unchanged feed costs a 304 and no parsing.
+    """
+    def __init__(self, http2: bool = True, timeout: float = 10.0, max_connections: int = 10) -> None:
+        """
+        Args:
+            http2: bool, negotiate HTTP/2 when possible
+            timeout: float, seconds before a request is abandoned
+            max_connections: int, size of the connection pool
+        """
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        try:
+            self._client = httpx.Client(http2=http2, timeout=timeout, limits=limits)
+        except ImportError:
+            logger.info("h2 is not installed, feeds are fetched over HTTP/1.1 keep-alive")
+            self._client = httpx.Client(timeout=timeout, limits=limits)
+
+        # url -> (payload, etag, last_modified, last_updated, expires_at)
+        self._cache = {}
+
+    def close(self) -> None:
+        self._client.close()
+
+    def __enter__(self) -> "FeedClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _conditional_get(self, url: str) -> Optional[httpx.Response]:
+        """
+        GET url with the cached validators, returns None when the server answered 304 Not Modified.
+        """
+        headers = {}
+        cached = self._cache.get(url)
+        if cached is not None:
+            _, etag, last_modified, _, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        with FETCH_SECONDS.time(feed_name(url)):
+            response = self._client.get(url, headers=headers)
+        if response.status_code == httpx.codes.NOT_MODIFIED and cached is not None:
+            return None
+        response.raise_for_status()
+        return response
+
+    def get_json(self, url: str) -> tuple[dict, bool]:
+        """
+        Fetch a GBFS JSON feed.
+
+        Args:
+            url: str, feed URL
+
+        Returns:
+            tuple[dict, bool]: the feed payload, and whether it changed since the previous call for this URL
+        """
+        now = time.time()
+        cached = self._cache.get(url)
+        if cached is not None and now < cached[4]:
+            return cached[0], False
+
+        response = self._conditional_get(url)
+        if response is None:
+            payload, etag, last_modified, last_updated, _ = cached
+            ttl = payload.get("ttl", 0) if isinstance(payload, dict) else 0
+            self._cache[url] = (payload, etag, last_modified, last_updated, now + ttl)
+            return payload, False
+
+        payload = response.json()
+        last_updated = payload.get("last_updated") if isinstance(payload, dict) else None
+        ttl = payload.get("ttl", 0) if isinstance(payload, dict) else 0
+        # the feed will not be regenerated before last_updated + ttl, but never trust it for longer than ttl from now
+        expires_at = now + ttl if last_updated is None else min(now + ttl, last_updated + ttl)
+        self._cache[url] = (
+            payload,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            last_updated,
+            expires_at,
+        )
+        changed = cached is None or last_updated is None or last_updated != cached[3]
+        return payload, changed
+
+    def get_bytes(self, url: str) -> tuple[bytes, bool]:
+        """
+        Fetch a binary feed (e.g. GTFS-realtime protobuf) with conditional requests.
+
+        Returns:
+            tuple[bytes, bool]: the response body, and whether it changed since the previous call for this URL
+        """
+        cached = self._cache.get(url)
+        response = self._conditional_get(url)
+        if response is None:
+            return cached[0], False
+        body = response.content
+        self._cache[url] = (body, response.headers.get("ETag"), response.headers.get("Last-Modified"), None, 0.0)
+        return body, cached is None or cached[0] != body
@@ -0,0 +1,78 @@
+from typing import NamedTuple, Optional
+
+import polars as pl
+
+
+class FrameDelta(NamedTuple):
+    """
+    Rows to push to an indexed table: inserted or changed rows, and index values of rows that disappeared
+    """
+    upserts: pl.DataFrame
+    removed: list
+
+
+def apply_delta(frame: pl.DataFrame, delta: FrameDelta, index: str) -> pl.DataFrame:
+    """
+    Apply a FrameDelta to the full frame it was computed against, the inverse of FrameDiffer.diff.
+
+    Args:
+        frame: pl.DataFrame, the previous full snapshot, or None for an empty one
+        delta: FrameDelta, rows to upsert and index values to remove
+        index: str, column that identifies a row
+
+    Returns:
+        pl.DataFrame: the updated snapshot, upserted rows at the end
+    """
+    if frame is None:
+        return delta.upserts
+    dropped = pl.DataFrame({index: delta.removed + delta.upserts[index].to_list()}, schema={index: frame.schema[index]})
+    return pl.concat([frame.join(dropped, on=index, how="anti", maintain_order="left"), delta.upserts.select(frame.columns)])
+
+
+class FrameDiffer:
+    """
+    Keeps the last pushed snapshot of an indexed frame and turns every new snapshot into a FrameDelta
+
+    Rows are compared through a 64-bit hash of the whole row, so the snapshot kept between ticks is just the index
+    column and one hash column.
+    """
+    def __init__(self, index: str = "station_id") -> None:
+        """
+        Args:
+            index: str, column that identifies a row, the index of the perspective table being fed
+        """
+        self.index = index
+        self._last: Optional[pl.DataFrame] = None
+        self._last_columns = None
+
+    def reset(self) -> None:
+        """
+        Forget the last snapshot, so the next frame is emitted in full.
+        """
+        self._last = None
+        self._last_columns = None
+
+    def diff(self, frame: pl.DataFrame) -> FrameDelta:
+        """
+        Args:
+            frame: pl.DataFrame, the full snapshot of this tick
+
+        Returns:
+            FrameDelta: rows of frame that are new or differ from the last snapshot, and the index values of rows
+            that were in the last snapshot but are missing from this one
+        """
+        hashes = pl.DataFrame({self.index: frame[self.index], "_row_hash": frame.hash_rows()})
+        if self._last is None:
+            delta = FrameDelta(frame, [])
+        elif self._last_columns != frame.schema:
+            # row hashes of different schemas are not comparable, every row is resent but vanished rows still go
+            last = self._last.with_columns(pl.col(self.index).cast(hashes.schema[self.index]))
+            delta = FrameDelta(frame, last.join(hashes, on=self.index, how="anti")[self.index].to_list())
+        else:
+            changed = hashes.join(self._last, on=[self.index, "_row_hash"], how="anti")
+            removed = self._last.join(hashes, on=self.index, how="anti")[self.index].to_list()
+            delta = FrameDelta(frame.join(changed.select(self.index), on=self.index, how="semi"), removed)
+
+        self._last = hashes
+        self._last_columns = frame.schema
+        return delta
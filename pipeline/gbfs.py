@@ -0,0 +1,130 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlparse
+
+import polars as pl
+
+from pipeline.feed_client import FeedClient
+
+logger = logging.getLogger(__name__)
+
+CITIBIKE_GBFS = "https://gbfs.lyft.com/gbfs/2.3/bkn/gbfs.json"
+
+# column tagging every row of a multi-system frame with the system it was polled from
+SYSTEM_ID = "system_id"
+
+
+def discover_feeds(client: FeedClient, url: str, language: str = "en") -> dict[str, str]:
+    """
+    Read the feed URLs a GBFS system publishes in its gbfs.json auto-discovery file.
+
+    Args:
+        client: FeedClient to fetch gbfs.json with
+        url: str, the system's gbfs.json
+        language: str, feed language to pick from a GBFS 1.x/2.x file, the first one published if it is missing
+
+    Returns:
+        dict[str, str]: feed name (station_information, station_status, ...) -> URL
+    """
+    payload, _ = client.get_json(url)
+    data = payload["data"]
+    if "feeds" not in data:
+        # GBFS 1.x/2.x nest the feeds under a language, 3.0 lists them directly
+        data = data[language] if language in data else next(iter(data.values()))
+    return {feed["name"]: feed["url"] for feed in data["feeds"]}
+
+
+def system_id_of(client: FeedClient, feeds: dict[str, str], url: str) -> str:
+    """
+    system_id from the system_information feed, or the system's directory in the gbfs.json URL when it has none.
+    """
+    if "system_information" in feeds:
+        try:
+            payload, _ = client.get_json(feeds["system_information"])
+            return str(payload["data"]["system_id"])
+        except Exception as e:
+            logger.warning(f"Failed to read system_information of {url}: {e}")
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    return parts[-2] if len(parts) > 1 else urlparse(url).netloc
+
+
+class MultiSystemLoader:
+    """
+    Polls the station status of several GBFS systems concurrently and merges them into one system-tagged frame
+
+    Every system has its own DatasetLoader, and a poll fetches all of them at the same time on a thread pool, so it
+    takes as long as the slowest system rather than the sum of all of them. A system whose feed is unchanged or
+    failed contributes its previous frame.
+
+    GBFS station ids are only unique within a system, so with more than one system every station_id is prefixed with
+    "<system_id>:" before the frames are stacked.
+    """
+    def __init__(self, loaders: dict, max_workers: Optional[int] = None) -> None:
+        """
+        Args:
+            loaders: dict, system_id -> DatasetLoader of that system
+            max_workers: int, systems fetched at the same time, all of them by default
+        """
+        self.loaders = loaders
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max(len(loaders), 1), thread_name_prefix="gbfs-system")
+        self._frames = {}
+
+    @classmethod
+    def from_gbfs(cls, urls: list[str], client: Optional[FeedClient] = None, language: str = "en", **kwargs) -> "MultiSystemLoader":
+        """
+        Args:
+            urls: list[str], gbfs.json of every system
+            client: FeedClient shared by all systems, a new pooled client by default
+            language: str, feed language, see discover_feeds
+            kwargs: passed on to every DatasetLoader.from_gbfs
+
+        Returns:
+            MultiSystemLoader: one loader per system, keyed by system_id
+        """
+        from pipeline.pipeline import DatasetLoader
+
+        client = client if client is not None else FeedClient()
+        loaders = {}
+        for url in urls:
+            loader = DatasetLoader.from_gbfs(url, client=client, language=language, **kwargs)
+            if loader.system_id in loaders:
+                raise ValueError(f"Systems {url} and {loaders[loader.system_id].gbfs_url} share system_id {loader.system_id!r}")
+            loaders[loader.system_id] = loader
+        return cls(loaders)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fetch(self, system_id: str) -> Optional[pl.DataFrame]:
+        try:
+            return self.loaders[system_id].get_station_status(only_changed=True)
+        except Exception as e:
+            logger.warning(f"Failed to poll station status of {system_id}: {e}")
+            return None
+
+    def get_station_status(self, only_changed: bool = False) -> Optional[pl.DataFrame]:
+        """
+        Fetch the station status of every system and stack them, with a system_id column.
+
+        Args:
+            only_changed: bool, return None when no system's feed changed since the last poll
+
+        Returns:
+            pl.DataFrame: the get_station_status() frames of all systems, in the order of loaders
+        """
+        futures = {system_id: self._executor.submit(self._fetch, system_id) for system_id in self.loaders}
+        changed = False
+        for system_id, future in futures.items():
+            frame = future.result()
+            if frame is not None:
+                frame = frame.with_columns(pl.lit(system_id, dtype=pl.String).alias(SYSTEM_ID))
+                if len(self.loaders) > 1:
+                    # the frame is keyed by station_id downstream (Perspective tables, FrameDiffer, the alerts graph)
+                    frame = frame.with_columns((pl.col(SYSTEM_ID) + ":" + pl.col("station_id").cast(pl.String)).alias("station_id"))
+                self._frames[system_id] = frame
+                changed = True
+        if (only_changed and not changed) or not self._frames:
+            return None
+        frames = [self._frames[system_id] for system_id in self.loaders if system_id in self._frames]
+        return pl.concat(frames, how="vertical_relaxed")
@@ -0,0 +1,233 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+Location = tuple[float, float]
+
+_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "av": "ave",
+    "boulevard": "blvd",
+    "road": "rd",
+    "place": "pl",
+    "parkway": "pkwy",
+    "east": "e",
+    "west": "w",
+    "north": "n",
+    "south": "s",
+}
+
+
+def normalize_address(address: str) -> str:
+    """
+    Cache key for an address: lowercase, punctuation removed, whitespace collapsed and common street words abbreviated,
+    so "W. 4th Street" and "w 4th st" share an entry.
+    """
+    words = re.sub(r"[^\w\s/&-]", " ", address.lower()).split()
+    return " ".join(_ABBREVIATIONS.get(word, word) for word in words)
+
+
+class NominatimGeocoder:
+    """
+    Geocoder backed by the public Nominatim API
+    """
+    def __init__(self, user_agent: str = "DEF", suffix: str = ", NY", timeout: float = 10.0) -> None:
+        """
+        Args:
+            user_agent: str, user agent Nominatim requires
+            suffix: str, appended to every query to keep results in the city
+            timeout: float, seconds before a request is abandoned
+        """
+        from geopy.geocoders import Nominatim
+
+        self.suffix = suffix
+        self._geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
+
+    def geocode(self, address: str) -> Optional[Location]:
+        location = self._geolocator.geocode(address + self.suffix)
+        return None if location is None else (location.latitude, location.longitude)
+
+
+class StubGeocoder:
+    """
+    Offline geocoder answering from a fixed address -> (lat, lon) table, for tests and local runs
+    """
+    def __init__(self, locations: dict[str, Location]) -> None:
+        self.locations = {normalize_address(address): location for address, location in locations.items()}
+        self.calls = 0
+
+    def geocode(self, address: str) -> Optional[Location]:
+        self.calls += 1
+        return self.locations.get(normalize_address(address))
+
+
+class GeocodeCache:
+    """
+    Persistent geocode results keyed by normalized address, in SQLite
+
+    Addresses the geocoder could not resolve are cached too (negative caching) for a shorter negative_ttl. When the
+    cache grows past max_entries the least recently used entries are evicted.
+    """
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_entries: int = 10_000,
+        ttl: float = 30 * 86400,
+        negative_ttl: float = 86400,
+    ) -> None:
+        """
+        Args:
+            path: str, SQLite database file, in memory by default
+            max_entries: int, entries kept before the least recently used are evicted
+            ttl: float, seconds a resolved address is trusted
+            negative_ttl: float, seconds an unresolvable address is not retried
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            "key TEXT PRIMARY KEY, lat REAL, lon REAL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS geocodes_accessed_at ON geocodes (accessed_at)")
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+    def lookup(self, addresses: Iterable[str]) -> dict[str, Optional[Location]]:
+        """
+        Args:
+            addresses: normalized addresses
+
+        Returns:
+            dict: the cached addresses mapped to their location, or to None when cached as unresolvable.
+            Expired and unknown addresses are left out.
+        """
+        keys = list(set(addresses))
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, lat, lon, stored_at FROM geocodes WHERE key IN ({placeholders})", keys
+            ).fetchall()
+            hits = {}
+            for key, lat, lon, stored_at in rows:
+                ttl = self.ttl if lat is not None else self.negative_ttl
+                if now - stored_at < ttl:
+                    hits[key] = None if lat is None else (lat, lon)
+            if hits:
+                self._db.executemany("UPDATE geocodes SET accessed_at = ? WHERE key = ?", [(now, key) for key in hits])
+                self._db.commit()
+        return hits
+
+    def store(self, results: dict[str, Optional[Location]]) -> None:
+        """
+        Args:
+            results: normalized address -> location, or None for an address the geocoder could not resolve
+        """
+        if not results:
+            return
+        now = time.time()
+        rows = [
+            (key, None, None, now, now) if location is None else (key, location[0], location[1], now, now)
+            for key, location in results.items()
+        ]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute(
+                "DELETE FROM geocodes WHERE key IN "
+                "(SELECT key FROM geocodes ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class BatchGeocoder:
+    """
+    Resolves batches of addresses through a GeocodeCache, geocoding only the misses
+
+    Misses are deduplicated and geocoded concurrently on a small thread pool, while a shared rate limiter keeps the
+    requests at least min_interval apart (Nominatim's usage policy allows one per second). Failed requests are not
+    cached and left out of the result, so callers can tell them from confirmed misses and retry them on the next batch.
+    """
+    def __init__(
+        self,
+        geocoder,
+        cache: Optional[GeocodeCache] = None,
+        min_interval: float = 1.0,
+        max_workers: int = 2,
+    ) -> None:
+        """
+        Args:
+            geocoder: object with a geocode(address) -> Optional[(lat, lon)] method, e.g. NominatimGeocoder or StubGeocoder
+            cache: GeocodeCache, an in-memory one by default
+            min_interval: float, minimum seconds between the start of two geocoder requests
+            max_workers: int, number of geocoder requests in flight at the same time
+        """
+        self.geocoder = geocoder
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.min_interval = min_interval
+        self.max_workers = max_workers
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+
+    def _wait_for_slot(self) -> None:
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self.min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def _geocode(self, address: str) -> tuple[Optional[Location], bool]:
+        self._wait_for_slot()
+        try:
+            return self.geocoder.geocode(address), True
+        except Exception as e:
+            logger.warning(f"Failed to geocode {address}: {e}")
+            return None, False
+
+    def geocode_many(self, addresses: Iterable[str]) -> dict[str, Optional[Location]]:
+        """
+        Args:
+            addresses: raw addresses, duplicates and empty strings are allowed
+
+        Returns:
+            dict: every non-empty input address mapped to its (lat, lon), or None if the geocoder found nothing; addresses
+                whose request failed are missing
+        """
+        by_key = {}
+        for address in addresses:
+            address = address.strip()
+            key = normalize_address(address)
+            if key:
+                by_key.setdefault(key, []).append(address)
+
+        resolved = self.cache.lookup(by_key)
+        misses = [key for key in by_key if key not in resolved]
+        if misses:
+            queries = [by_key[key][0] for key in misses]
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(misses))) as executor:
+                results = list(executor.map(self._geocode, queries))
+            fetched = {key: location for key, (location, ok) in zip(misses, results) if ok}
+            self.cache.store(fetched)
+            resolved.update(fetched)
+
+        return {address: resolved[key] for key, raw in by_key.items() if key in resolved for address in raw}
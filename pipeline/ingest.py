@@ -0,0 +1,155 @@
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+
+import csp
+import polars as pl
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+from csp import ts
+from csp.impl.pulladapter import PullInputAdapter
+from csp.impl.wiring import py_pull_adapter_def
+
+# applied to every batch before it is yielded; returning None or an empty frame drops the batch
+BatchTransform = Callable[[pl.DataFrame], Optional[pl.DataFrame]]
+
+JSON_SUFFIXES = (".ndjson", ".jsonl", ".json")
+
+
+def is_json_array(path: str) -> bool:
+    """
+    Whether the first non-whitespace character of the file at path opens a JSON array.
+    """
+    with open(path, "rb") as f:
+        while chunk := f.read(4096):
+            stripped = chunk.lstrip()
+            if stripped:
+                return stripped.startswith(b"[")
+    return False
+
+
+def is_ndjson(path: str) -> bool:
+    """
+    Whether path is read as NDJSON: a .ndjson, .jsonl or .json file, unless it holds a JSON array document.
+    """
+    return path.lower().endswith(JSON_SUFFIXES) and not is_json_array(path)
+
+
+def _arrow_schema(schema: dict) -> pa.Schema:
+    return pl.DataFrame(schema=schema).to_arrow().schema
+
+
+def _open(path: str, block_size: int, schema: Optional[dict]):
+    if path.lower().endswith(JSON_SUFFIXES) and is_json_array(path):
+        # an array document cannot be parsed incrementally, it is read whole and handed out in record batches
+        return pl.read_json(path, schema_overrides=schema).to_arrow().to_batches()
+    if is_ndjson(path):
+        parse_options = pa_json.ParseOptions(explicit_schema=_arrow_schema(schema)) if schema else None
+        return pa_json.open_json(path, read_options=pa_json.ReadOptions(block_size=block_size), parse_options=parse_options)
+    convert_options = pa_csv.ConvertOptions(column_types=_arrow_schema(schema)) if schema else None
+    return pa_csv.open_csv(path, read_options=pa_csv.ReadOptions(block_size=block_size), convert_options=convert_options)
+
+
+def iter_batches(
+    path: str,
+    batch_size: int = 100_000,
+    transform: Optional[BatchTransform] = None,
+    schema: Optional[dict] = None,
+    block_size: int = 4 << 20,
+) -> Iterator[pl.DataFrame]:
+    """
+    Stream a local CSV or NDJSON file as frames of batch_size rows.
+
+    The file is parsed block by block with pyarrow's streaming readers, so memory holds one block_size block and
+    one batch at a time, however large the file is. Column types are inferred from the first block; pass schema
+    for columns whose first values are missing or misleading. A .json file holding a JSON array is the exception:
+    it is parsed whole before the first batch.
+
+    Args:
+        path: str, CSV file, or JSON file when it ends in .ndjson, .jsonl or .json, see is_ndjson
+        batch_size: int, rows per yielded frame, only the last one can be shorter
+        transform: BatchTransform applied to each batch, e.g. a filter or a projection
+        schema: dict, column name -> polars dtype overriding the inferred types
+        block_size: int, bytes parsed at a time
+
+    Yields:
+        pl.DataFrame: the next batch, after transform
+    """
+    remainder = None
+    pending = []
+    pending_rows = 0
+
+    def emit(frame: pl.DataFrame) -> Optional[pl.DataFrame]:
+        if transform is not None:
+            frame = transform(frame)
+        return frame if frame is not None and not frame.is_empty() else None
+
+    def take() -> pl.DataFrame:
+        frames = [] if remainder is None else [remainder]
+        if pending:
+            frames.append(pl.from_arrow(pa.Table.from_batches(pending)))
+        return pl.concat(frames) if len(frames) > 1 else frames[0]
+
+    for record_batch in _open(path, block_size, schema):
+        if record_batch.num_rows == 0:
+            continue
+        pending.append(record_batch)
+        pending_rows += record_batch.num_rows
+        if pending_rows < batch_size:
+            continue
+
+        frame = take()
+        full = len(frame) - len(frame) % batch_size
+        for offset in range(0, full, batch_size):
+            batch = emit(frame.slice(offset, batch_size))
+            if batch is not None:
+                yield batch
+        # rows short of a full batch wait for the next blocks
+        remainder = frame.slice(full) if full < len(frame) else None
+        pending = []
+        pending_rows = 0 if remainder is None else len(remainder)
+
+    if pending_rows:
+        batch = emit(take())
+        if batch is not None:
+            yield batch
+
+
+class _BatchAdapterImpl(PullInputAdapter):
+    def __init__(self, path: str, batch_size: int, transform: Optional[BatchTransform]):
+        self._path = path
+        self._batch_size = batch_size
+        self._transform = transform
+        self._batches = iter(())
+        super().__init__()
+
+    def start(self, start_time: datetime, end_time: datetime):
+        self._batches = iter_batches(self._path, self._batch_size, self._transform)
+        super().start(start_time, end_time)
+
+    def next(self):
+        batch = next(self._batches, None)
+        return None if batch is None else (self._start_time, batch)
+
+
+_batch_adapter = py_pull_adapter_def(
+    "file_batches", _BatchAdapterImpl, ts[pl.DataFrame], path=str, batch_size=int, transform=object
+)
+
+
+def file_batches(path: str, batch_size: int = 100_000, transform: Optional[BatchTransform] = None) -> ts[pl.DataFrame]:
+    """
+    csp edge ticking every batch of iter_batches, one engine cycle per batch at the start time.
+
+    A batch is only read once the engine asks for it, so a slow consumer holds back the reader instead of letting
+    batches queue up. Run the graph with realtime=False.
+
+    Args:
+        path: str, CSV or NDJSON file
+        batch_size: int, rows per tick
+        transform: BatchTransform applied to each batch before it ticks
+
+    Returns:
+        ts[pl.DataFrame]: the batches, in file order
+    """
+    return _batch_adapter(path, batch_size, transform, push_mode=csp.PushMode.NON_COLLAPSING)
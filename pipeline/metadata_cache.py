@@ -0,0 +1,134 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+# a loader fetches a fresh frame and returns it with its GBFS ttl in seconds
+Loader = Callable[[], tuple[pl.DataFrame, float]]
+
+
+class _Entry:
+    __slots__ = ("frame", "expires_at", "refreshing")
+
+    def __init__(self, frame: pl.DataFrame, expires_at: float) -> None:
+        self.frame = frame
+        self.expires_at = expires_at
+        self.refreshing = False
+
+
+class MetadataCache:
+    """
+    Cache for slowly changing feed metadata (station_information, vehicle_types) with a TTL per entry
+
+    Expired entries keep being served while a background worker refreshes them, so a poll never waits on the network
+    once a frame is available. A refresh returning an equal frame keeps the cached one, so callers can tell new
+    metadata by identity. With a snapshot_dir every changed frame is also written to Parquet, and a cold start serves
+    the snapshot (refreshing it in the background) instead of blocking on the first fetch.
+    """
+    def __init__(self, snapshot_dir: Optional[str] = None, retry_after: float = 30.0) -> None:
+        """
+        Args:
+            snapshot_dir: optional directory for the on-disk Parquet snapshots
+            retry_after: float, seconds before a failed background refresh is retried
+        """
+        self.snapshot_dir = snapshot_dir
+        self.retry_after = retry_after
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metadata-refresh")
+
+    def _snapshot_path(self, key: str) -> Optional[str]:
+        return os.path.join(self.snapshot_dir, f"{key}.parquet") if self.snapshot_dir else None
+
+    def _write_snapshot(self, key: str, frame: pl.DataFrame) -> None:
+        path = self._snapshot_path(key)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            frame.write_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write metadata snapshot {path}: {e}")
+
+    def _read_snapshot(self, key: str) -> Optional[pl.DataFrame]:
+        path = self._snapshot_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            return pl.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Failed to read metadata snapshot {path}: {e}")
+            return None
+
+    def _store(self, key: str, frame: pl.DataFrame, ttl: float) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+        unchanged = entry is not None and entry.frame.equals(frame)
+        with self._lock:
+            self._entries[key] = _Entry(entry.frame if unchanged else frame, time.monotonic() + ttl)
+        if not unchanged:
+            self._write_snapshot(key, frame)
+
+    def _refresh(self, key: str, loader: Loader) -> None:
+        try:
+            frame, ttl = loader()
+            self._store(key, frame, ttl)
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {e}")
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.expires_at = time.monotonic() + self.retry_after
+                    entry.refreshing = False
+
+    def _schedule_refresh(self, key: str, entry: _Entry, loader: Loader) -> None:
+        # called with the lock held
+        if not entry.refreshing:
+            entry.refreshing = True
+            self._executor.submit(self._refresh, key, loader)
+
+    def get(self, key: str, loader: Loader) -> pl.DataFrame:
+        """
+        Args:
+            key: str, name of the cached feed, also the snapshot file name
+            loader: Loader, fetches a fresh frame and its ttl, only ever called synchronously on a cold cache
+
+        Returns:
+            pl.DataFrame: the cached frame, possibly stale while a background refresh is running
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() >= entry.expires_at:
+                    self._schedule_refresh(key, entry, loader)
+                return entry.frame
+
+        snapshot = self._read_snapshot(key)
+        if snapshot is not None:
+            with self._lock:
+                entry = self._entries.setdefault(key, _Entry(snapshot, 0.0))
+                self._schedule_refresh(key, entry, loader)
+                return entry.frame
+
+        frame, ttl = loader()
+        self._store(key, frame, ttl)
+        return frame
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def close(self, wait: bool = False) -> None:
+        """
+        Args:
+            wait: bool, block until a running background refresh has finished
+        """
+        self._executor.shutdown(wait=wait)
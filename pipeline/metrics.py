@@ -0,0 +1,148 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator
+
+# seconds, from sub-millisecond node executions to feed fetches that run into their timeout
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with fixed buckets, one series per combination of label values
+
+    An observation is a bisect over the bucket bounds and two additions under a lock, cheap enough for every tick of
+    every node. Counts are kept per bucket and only made cumulative when rendered.
+    """
+    def __init__(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS, labelnames: tuple = ()) -> None:
+        """
+        Args:
+            name: str, metric name
+            documentation: str, HELP text
+            buckets: tuple, increasing upper bounds, +Inf is added
+            labelnames: tuple, names of the labels every observation gives values for
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series = {}
+
+    def observe(self, value: float, *labels) -> None:
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels) -> Iterator[None]:
+        """
+        Observe the wall time of the with block, in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series is not None else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series, key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The histograms served on /metrics
+    """
+    def __init__(self) -> None:
+        self._metrics = {}
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS, labelnames: tuple = ()) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, documentation, buckets, labelnames)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """
+        Every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+NODE_SECONDS = REGISTRY.histogram("csp_node_seconds", "Wall time of one csp node execution.", labelnames=("node",))
+NODE_ROWS = REGISTRY.histogram("csp_node_rows", "Rows of the frame a csp node handled in one execution.", ROW_BUCKETS, ("node",))
+FETCH_SECONDS = REGISTRY.histogram("http_fetch_seconds", "Latency of one HTTP feed request, 304s included.", labelnames=("feed",))
+POLL_SECONDS = REGISTRY.histogram("feed_poll_seconds", "Wall time of one feed poll on the fetch pool, parsing and joins included.", labelnames=("feed",))
+QUEUE_LAG_SECONDS = REGISTRY.histogram("feed_queue_lag_seconds", "Time a polled value waited between being pushed and a node handling it.", labelnames=("feed",))
+PERSPECTIVE_UPDATE_SECONDS = REGISTRY.histogram("perspective_update_seconds", "Wall time of one batch of Perspective table updates and removes.", labelnames=("table",))
+WRITER_PENDING_ROWS = REGISTRY.histogram("perspective_writer_pending_rows", "Rows queued for a Perspective table after each queued change.", ROW_BUCKETS, ("table",))
+WRITER_COALESCED_ROWS = REGISTRY.histogram("perspective_writer_coalesced_rows", "Queued rows merged into a later change of the same index.", ROW_BUCKETS, ("table",))
+WRITER_BATCH_ROWS = REGISTRY.histogram("perspective_writer_batch_rows", "Rows of one batch applied to a Perspective table.", ROW_BUCKETS, ("table",))
+WRITER_QUEUE_SECONDS = REGISTRY.histogram("perspective_writer_queue_seconds", "Time the oldest change of a batch waited for the Perspective loop.", labelnames=("table",))
+
+
+class QueueLag:
+    """
+    Matches values pushed into the csp engine with the tick that handles them, to measure how long they queued
+
+    The feed thread marks every push and the consuming node calls handled(); pushes are matched in order. The marks of
+    a feed nobody measures are capped at maxlen.
+    """
+    def __init__(self, histogram: Histogram = QUEUE_LAG_SECONDS, maxlen: int = 1024) -> None:
+        self.histogram = histogram
+        self._pushed = {}
+        self._maxlen = maxlen
+        self._lock = threading.Lock()
+
+    def pushed(self, feed: str) -> None:
+        with self._lock:
+            marks = self._pushed.get(feed)
+            if marks is None:
+                marks = self._pushed[feed] = deque(maxlen=self._maxlen)
+            marks.append(time.monotonic())
+
+    def handled(self, feed: str) -> None:
+        with self._lock:
+            marks = self._pushed.get(feed)
+            pushed_at = marks.popleft() if marks else None
+        if pushed_at is not None:
+            self.histogram.observe(time.monotonic() - pushed_at, feed)
+
+
+QUEUE_LAG = QueueLag()
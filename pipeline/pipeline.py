@@ -1,14 +1,26 @@
+import os
 import polars as pl
-import httpx
 
-from typing import List, Optional
-from functools import lru_cache
+from datetime import datetime
+from typing import Iterator, List, Optional, Union
 import logging
+import threading
+import warnings
 
-import requests
+import httpx
 
 from google.transit import gtfs_realtime_pb2
 
+from pipeline.alerts import AlertLocator
+from pipeline.extractors import AddressExtractor
+from pipeline.feed_client import FeedClient
+from pipeline.frame_diff import FrameDelta
+from pipeline.gbfs import discover_feeds, system_id_of
+from pipeline.geocode import BatchGeocoder, NominatimGeocoder
+from pipeline.ingest import BatchTransform, is_ndjson, iter_batches
+from pipeline.metadata_cache import MetadataCache
+from pipeline.snapshot_store import scan_snapshots
+
 
 CITIBIKE_STATION_INFORMATION = (
     "https://gbfs.lyft.com/gbfs/2.3/bkn/en/station_information.json"
@@ -16,15 +28,86 @@ CITIBIKE_STATION_INFORMATION = (
 CITIBIKE_STATION_STATUS = "https://gbfs.lyft.com/gbfs/2.3/bkn/en/station_status.json"
 CITIBIKE_VEHICLE_TYPE = "https://gbfs.lyft.com/gbfs/2.3/bkn/en/vehicle_types.json"
 
+STATION_INFORMATION_COLUMNS = ["station_id", "capacity", "name", "short_name", "region_id", "lon", "lat"]
+STATION_STATUS_COLUMNS = ["station_id", "num_bikes_available", "num_bikes_disabled", "num_docks_available", "num_docks_disabled", "num_ebikes_available", "is_installed", "is_renting", "is_returning", "last_reported"]
+
 MTA_ALERTS = 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fall-alerts'
 
+SUMMARY_STATISTICS = ["count", "null_count", "mean", "std", "min", "max"]
+
+
+def summarize_lazy(frame: pl.LazyFrame) -> pl.DataFrame:
+    """
+    DataFrame.describe() of a lazy frame, computed as a single aggregation on the streaming engine.
+
+    Every statistic is accumulated in one pass over the data and nothing but the result is held in memory. The
+    quantiles describe() adds need the whole column and are left out.
+
+    Args:
+        frame: pl.LazyFrame to summarize, e.g. a scan of a large file
+
+    Returns:
+        pl.DataFrame: a statistic column with the SUMMARY_STATISTICS, then one column per input column, Float64 for
+        numeric and boolean columns and String for the others
+    """
+    schema = frame.collect_schema()
+    exprs = []
+    numeric = {}
+    for position, (name, dtype) in enumerate(schema.items()):
+        column = pl.col(name)
+        numeric[name] = dtype.is_numeric() or dtype == pl.Boolean
+        orderable = numeric[name] or dtype.is_temporal() or dtype == pl.String
+        value = column.cast(pl.Float64) if numeric[name] else column
+        stats = [
+            column.count(),
+            column.null_count(),
+            value.mean() if numeric[name] else pl.lit(None),
+            value.std() if numeric[name] else pl.lit(None),
+            value.min() if orderable else pl.lit(None),
+            value.max() if orderable else pl.lit(None),
+        ]
+        exprs.extend(stat.alias(f"{position}:{statistic}") for stat, statistic in zip(stats, SUMMARY_STATISTICS))
+
+    row = frame.select(exprs).collect(engine="streaming").row(0)
+    width = len(SUMMARY_STATISTICS)
+    columns = {"statistic": SUMMARY_STATISTICS}
+    for position, name in enumerate(schema.names()):
+        values = row[position * width:(position + 1) * width]
+        if numeric[name]:
+            columns[name] = pl.Series(name, values, dtype=pl.Float64)
+        else:
+            columns[name] = pl.Series(name, [None if value is None else str(value) for value in values], dtype=pl.String)
+    return pl.DataFrame(columns)
+
+
 class DatasetLoader:
-    def __init__(self, file_path: str = ""):
+    def __init__(
+        self,
+        file_path: str = "",
+        client: Optional[FeedClient] = None,
+        station_information_url: str = CITIBIKE_STATION_INFORMATION,
+        station_status_url: str = CITIBIKE_STATION_STATUS,
+        vehicle_types_url: str = CITIBIKE_VEHICLE_TYPE,
+        metadata_cache: Optional[MetadataCache] = None,
+        snapshot_dir: Optional[str] = None,
+        geocoder: Optional[BatchGeocoder] = None,
+        extractor: Optional[AddressExtractor] = None,
+        system_id: str = "bkn",
+    ):
         """
         Initialize the DatasetLoader with a path to the dataset.
 
         Args:
             file_path: Path to the dataset file (can be a local path or a URL)
+            client: FeedClient shared by the GBFS feeds, a new pooled client by default
+            station_information_url: GBFS station_information feed
+            station_status_url: GBFS station_status feed
+            vehicle_types_url: GBFS vehicle_types feed
+            metadata_cache: MetadataCache for station_information and vehicle_types, a new one by default
+            snapshot_dir: directory for the metadata cache's Parquet snapshots, used when no cache is given
+            geocoder: BatchGeocoder for the MTA alert addresses, Nominatim with an in-memory cache by default
+            extractor: AddressExtractor finding the addresses in MTA alerts, the local regex extractor by default
+            system_id: GBFS system the feeds belong to, Citi Bike by default
         """
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -32,13 +115,104 @@ class DatasetLoader:
         self.dataframe = pl.DataFrame()
         self.stream = None
 
-    def load_data_csv(self, batch_size: int = 1024):
+        self.station_information_url = station_information_url
+        self.station_status_url = station_status_url
+        self.vehicle_types_url = vehicle_types_url
+        self.system_id = system_id
+        self.gbfs_url = None
+        # last joined frame, and the parsed status and station information it was joined from
+        self._station_status = None
+        self._status = None
+        self._joined_stations = None
+
+        # the network pieces are built on first use of a feed method, loading local files opens no HTTP client,
+        # cache worker or geocoder
+        self._lazy_lock = threading.Lock()
+        self._client = client
+        self._metadata = metadata_cache
+        self._snapshot_dir = snapshot_dir
+        self._geocoder = geocoder
+        self._extractor = extractor
+        self._alerts = None
+
+    @property
+    def client(self) -> FeedClient:
+        with self._lazy_lock:
+            if self._client is None:
+                self._client = FeedClient()
+            return self._client
+
+    @property
+    def metadata(self) -> MetadataCache:
+        with self._lazy_lock:
+            if self._metadata is None:
+                self._metadata = MetadataCache(snapshot_dir=self._snapshot_dir)
+            return self._metadata
+
+    @property
+    def geocoder(self) -> BatchGeocoder:
+        with self._lazy_lock:
+            if self._geocoder is None:
+                self._geocoder = BatchGeocoder(NominatimGeocoder())
+            return self._geocoder
+
+    @property
+    def alerts(self) -> AlertLocator:
+        geocoder = self.geocoder
+        with self._lazy_lock:
+            if self._alerts is None:
+                self._alerts = AlertLocator(geocoder, self._extractor)
+            return self._alerts
+
+    @classmethod
+    def from_gbfs(cls, gbfs_url: str, client: Optional[FeedClient] = None, language: str = "en", system_id: Optional[str] = None, **kwargs) -> "DatasetLoader":
         """
-        Load data from the file_path using Polars.
+        Loader for the system whose feeds a gbfs.json auto-discovery file lists, instead of the hardcoded Citi Bike URLs.
+
+        Args:
+            gbfs_url: the system's gbfs.json
+            client: FeedClient for the discovery and the feeds, a new pooled client by default
+            language: feed language, see pipeline.gbfs.discover_feeds
+            system_id: name of the system, read from its system_information feed by default
+            kwargs: other DatasetLoader arguments
+
+        Returns:
+            DatasetLoader: polling the discovered station_information, station_status and vehicle_types feeds
+        """
+        client = client if client is not None else FeedClient()
+        feeds = discover_feeds(client, gbfs_url, language)
+        missing = [name for name in ("station_information", "station_status") if name not in feeds]
+        if missing:
+            raise ValueError(f"{gbfs_url} does not list the {', '.join(missing)} feeds")
+        system_id = system_id if system_id is not None else system_id_of(client, feeds, gbfs_url)
+        if kwargs.get("snapshot_dir"):
+            # metadata snapshots are named by feed, systems sharing a directory would overwrite each other's
+            kwargs["snapshot_dir"] = os.path.join(kwargs["snapshot_dir"], system_id)
+        loader = cls(
+            client=client,
+            station_information_url=feeds["station_information"],
+            station_status_url=feeds["station_status"],
+            vehicle_types_url=feeds.get("vehicle_types", ""),
+            system_id=system_id,
+            **kwargs,
+        )
+        loader.gbfs_url = gbfs_url
+        return loader
+
+    def load_data_csv(self, n_rows: int = 1024, batch_size: Optional[int] = None):
         """
+        Lazily scan the first n_rows rows of file_path, a preview; use iter_batches to stream the whole file.
+
+        Args:
+            n_rows: int, rows scanned
+            batch_size: int, deprecated name of n_rows, it never split the file into batches
+        """
+        if batch_size is not None:
+            warnings.warn("load_data_csv(batch_size=) is deprecated, use n_rows", DeprecationWarning, stacklevel=2)
+            n_rows = batch_size
         try:
             self.logger.info(f"File path: {self.file_path}")
-            self.stream = pl.scan_csv(self.file_path, n_rows=batch_size)
+            self.stream = pl.scan_csv(self.file_path, n_rows=n_rows)
             self.logger.info("Data loaded successfully.")
         except Exception as e:
             self.logger.error(f"Failed to load data: {e}")
@@ -46,29 +220,97 @@ class DatasetLoader:
     def load_data_json(self):
         """
         Load data from the file_path using Polars.
+
+        NDJSON files (see pipeline.ingest.is_ndjson) are scanned lazily; a JSON array document has to be parsed whole.
         """
         try:
-            self.stream = pl.read_json(self.file_path)
+            if is_ndjson(self.file_path):
+                self.stream = pl.scan_ndjson(self.file_path)
+            else:
+                self.stream = pl.read_json(self.file_path).lazy()
             self.logger.info("Data loaded successfully.")
         except Exception as e:
             self.logger.error(f"Failed to load data: {e}")
 
+    def load_trips(self):
+        """
+        Lazily scan trip history CSV files at file_path, a path or a glob such as "trips/2024*-citibike-tripdata.csv".
+
+        Station ids are kept as strings, times are parsed; nothing is read until the stream is collected.
+        """
+        try:
+            self.stream = pl.scan_csv(
+                self.file_path,
+                schema_overrides={"start_station_id": pl.String, "end_station_id": pl.String},
+                try_parse_dates=True,
+            )
+            self.logger.info(f"Trips in {self.file_path} scanned successfully.")
+        except Exception as e:
+            self.logger.error(f"Failed to load trips: {e}")
+
+    def iter_batches(
+        self,
+        batch_size: int = 100_000,
+        transform: Optional[BatchTransform] = None,
+        schema: Optional[dict] = None,
+    ) -> Iterator[pl.DataFrame]:
+        """
+        Stream file_path, a local CSV or JSON trip history, as frames of at most batch_size rows.
+
+        Peak memory stays bounded by one parsed block and one batch whatever the file size; see
+        pipeline.ingest.iter_batches, and pipeline.ingest.file_batches to feed the batches to a csp graph.
+
+        Args:
+            batch_size: rows per frame
+            transform: applied to each batch, batches it turns into None or an empty frame are skipped
+            schema: column name -> polars dtype overriding the types inferred from the first block
+        """
+        return iter_batches(self.file_path, batch_size, transform, schema)
+
+    def load_snapshots(self, start: Optional[datetime] = None, end: Optional[datetime] = None, root: Optional[str] = None):
+        """
+        Lazily scan the station snapshots a SnapshotStore recorded in [start, end), for backtesting.
+
+        Only the daily partitions in the range are read and the time filter is pushed down into the Parquet scan;
+        call finalize_data() to collect them.
+
+        Args:
+            start: first snapshot time included, unbounded if None
+            end: first snapshot time excluded, unbounded if None
+            root: directory written by the SnapshotStore, file_path by default
+        """
+        root = root if root is not None else self.file_path
+        try:
+            self.stream = scan_snapshots(root, start, end)
+            self.logger.info(f"Snapshots in {root} scanned successfully.")
+        except Exception as e:
+            self.logger.error(f"Failed to load snapshots: {e}")
+
     def finalize_data(self):
         """
         Finalize the data streaming and collect the DataFrame.
         """
         if self.stream is not None:
             try:
-                self.dataframe = self.stream.collect()
+                # the streaming engine keeps peak memory near the size of the result rather than of the input
+                self.dataframe = self.stream.collect(engine="streaming")
                 self.logger.info("Data loaded successfully.")
             except Exception as e:
                 self.logger.error(f"Failed to load data: {e}")
         else:
             self.logger.error("Data stream is None, cannot finalize data.")
 
+    def _loaded(self) -> Optional[Union[pl.DataFrame, pl.LazyFrame]]:
+        # the collected frame once finalize_data() ran, the lazy stream before that
+        if self.dataframe is not None and self.dataframe.width:
+            return self.dataframe
+        return self.stream
+
     def check_fields(self, required_fields: List[str]) -> bool:
         """
-        Check if the required fields exist in the dataframe.
+        Check if the required fields exist in the dataframe, or in the stream before it is collected.
+
+        On a stream only the schema is resolved (a file's header and first rows), no data is read.
 
         Args:
             required_fields: A list of fields that are expected in the dataframe
@@ -76,11 +318,12 @@ class DatasetLoader:
         Returns: 
             True if all fields exist, False otherwise
         """
-        if self.dataframe is None:
-            print("Data not loaded. Call finalize_data() first.")
+        data = self._loaded()
+        if data is None:
+            print("Data not loaded. Call a load_* method first.")
             return False
         
-        existing_fields = self.dataframe.columns
+        existing_fields = data.collect_schema().names()
         missing_fields = [field for field in required_fields if field not in existing_fields]
 
         if missing_fields:
@@ -94,46 +337,103 @@ class DatasetLoader:
         """
         Generate a summary of the dataframe, including basic statistics for numeric columns.
 
+        Before finalize_data() the stream is summarized instead, in one streaming pass (see summarize_lazy).
+
         Returns: 
             A DataFrame with the summary statistics, or None if the data is not loaded.
         """
-        if self.dataframe is None:
-            print("Data not loaded. Call finalize_data() first.")
+        data = self._loaded()
+        if data is None:
+            print("Data not loaded. Call a load_* method first.")
             return None
-        
-        return self.dataframe.describe()
+
+        if isinstance(data, pl.LazyFrame):
+            return summarize_lazy(data)
+        return data.describe()
     
-    @lru_cache
+    def _fetch_stations(self) -> tuple[pl.DataFrame, float]:
+        dat, _ = self.client.get_json(self.station_information_url)
+        return pl.DataFrame(dat['data']['stations'], schema=STATION_INFORMATION_COLUMNS), dat.get('ttl', 0)
+
     def get_stations(self):
-        dat = httpx.get(CITIBIKE_STATION_INFORMATION).json()
-        return pl.DataFrame(dat['data']['stations'], schema=["station_id", "capacity", "name", "short_name", "region_id", "lon", "lat"])
+        """
+        Station information, served from the metadata cache and refreshed in the background once its GBFS ttl expires.
+        """
+        return self.metadata.get("station_information", self._fetch_stations)
 
+    def _fetch_vehicle_types(self) -> tuple[pl.DataFrame, float]:
+        dat, _ = self.client.get_json(self.vehicle_types_url)
+        return pl.DataFrame(dat['data']['vehicle_types'], schema=["vehicle_type_id", "form_factor", "propulsion_type", "max_range_meters"]), dat.get('ttl', 0)
 
-    @lru_cache
     def get_vehicle_types(self):
-        dat = httpx.get(CITIBIKE_VEHICLE_TYPE).json()
-        return pl.DataFrame(dat['data']['vehicle_types'], schema=["vehicle_type_id", "form_factor", "propulsion_type", "max_range_meters"])
-    
+        """
+        Vehicle types, served from the metadata cache and refreshed in the background once their GBFS ttl expires.
+        """
+        return self.metadata.get("vehicle_types", self._fetch_vehicle_types)
 
+    def get_station_status(self, only_changed: bool = False) -> Optional[pl.DataFrame]:
+        """
+        Fetch station status joined with station information.
 
-    def get_station_status(self):
-        records = httpx.get(CITIBIKE_STATION_STATUS).json()["data"]["stations"]
-        status = pl.DataFrame(records, schema=["station_id", "num_bikes_available", "num_bikes_disabled", "num_docks_available", "num_docks_disabled", "num_ebikes_available", "is_installed", "is_renting", "is_returning", "last_reported"])
+        The feed is requested conditionally; when neither it nor the cached station information has changed since
+        the last poll the parse and join are skipped and the previous frame is returned (or None with
+        only_changed=True). Refreshed station information alone is joined with the previously parsed status.
+
+        Args:
+            only_changed: bool, return None instead of the previous frame when nothing has changed
+        """
+        payload, changed = self.client.get_json(self.station_status_url)
+        # the metadata cache hands out a new frame only when station information changed
         stations = self.get_stations()
+        if not changed and self._station_status is not None:
+            if stations is self._joined_stations:
+                return None if only_changed else self._station_status
+            status = self._status
+        else:
+            status = pl.DataFrame(payload["data"]["stations"], schema=STATION_STATUS_COLUMNS)
+
         df = stations.join(status, on="station_id", how="inner")
+        self._station_status, self._status, self._joined_stations = df, status, stations
         return df
 
-    def get_mta_alarms(self): 
-        url = "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fall-alerts"
-        # Make a GET request to the MTA endpoint
-        response = requests.get(url)
-
-        # Check if the request was successful
-        if response.status_code == 200:
-            # Initialize a FeedMessage
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
-            
-            return feed.entity
-        else:
-            print(f"Failed to retrieve data: {response.status_code}")
+    def get_mta_alarms(self, only_changed: bool = False):
+        """
+        Fetch the MTA service alerts GTFS-realtime feed.
+
+        Args:
+            only_changed: bool, return None when the feed has not changed since the last call
+
+        Returns:
+            The alert entities of the feed, or None if it could not be retrieved
+        """
+        try:
+            body, changed = self.client.get_bytes(MTA_ALERTS)
+        except httpx.HTTPError as e:
+            self.logger.warning(f"Failed to retrieve MTA alerts: {e}")
+            return None
+        if only_changed and not changed:
+            return None
+
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(body)
+        return feed.entity
+
+    def get_mta_alert_updates(self) -> Optional[FrameDelta]:
+        """
+        Incremental update of the geocoded MTA alert locations.
+
+        Only alerts that are new or whose header changed since the last call go through address extraction and
+        geocoding. This makes blocking network calls and is meant to run off the csp engine thread.
+
+        Returns:
+            FrameDelta of alerts_table rows to upsert and row ids to remove, or None if nothing changed
+        """
+        # alerts whose extraction failed are retried even if the feed itself has not changed
+        entities = self.get_mta_alarms(only_changed=not self.alerts.pending)
+        if entities is None:
+            return None
+
+        delta = self.alerts.update(entities)
+        if delta.upserts.is_empty() and not delta.removed:
+            return None
+        return delta
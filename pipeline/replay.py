@@ -0,0 +1,125 @@
+import glob
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional
+
+import polars as pl
+
+from csp import ts
+from csp.impl.pulladapter import PullInputAdapter
+from csp.impl.wiring import py_pull_adapter_def
+
+from pipeline.pipeline import STATION_INFORMATION_COLUMNS, STATION_STATUS_COLUMNS
+from pipeline.snapshot_store import iter_snapshots
+
+logger = logging.getLogger(__name__)
+
+STATION_INFORMATION_FILE = "station_information.json"
+
+
+def _utc(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def iter_status_json(
+    directory: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> Iterator[tuple[datetime, pl.DataFrame]]:
+    """
+    Replay a directory of recorded GBFS station_status.json payloads, in file name order.
+
+    Each payload is timed by its last_updated field. If the directory also holds a station_information.json, the
+    statuses are joined with it the way DatasetLoader.get_station_status does.
+
+    Args:
+        directory: str, directory of station_status payloads
+        start: datetime, first payload time included, unbounded if None
+        end: datetime, first payload time excluded, unbounded if None
+
+    Yields:
+        (datetime, pl.DataFrame): the payload time and its station frame
+    """
+    stations = None
+    information_path = os.path.join(directory, STATION_INFORMATION_FILE)
+    if os.path.exists(information_path):
+        with open(information_path) as f:
+            stations = pl.DataFrame(json.load(f)["data"]["stations"], schema=STATION_INFORMATION_COLUMNS)
+
+    previous = None
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        if os.path.basename(path) == STATION_INFORMATION_FILE:
+            continue
+        with open(path) as f:
+            payload = json.load(f)
+        moment = _utc(payload["last_updated"])
+        if (start is not None and moment < start) or (end is not None and moment >= end):
+            continue
+        if previous is not None and moment <= previous:
+            # an unchanged feed recorded twice, or a file out of order: csp ticks must move forward
+            logger.warning(f"Skipping {path}, last_updated {moment} is not after {previous}")
+            continue
+        previous = moment
+
+        status = pl.DataFrame(payload["data"]["stations"], schema=STATION_STATUS_COLUMNS)
+        yield moment, status if stations is None else stations.join(status, on="station_id", how="inner")
+
+
+def iter_recorded_status(
+    path: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> Iterator[tuple[datetime, pl.DataFrame]]:
+    """
+    Replay recorded station frames: a SnapshotStore root when it holds Parquet partitions, otherwise a directory of
+    station_status JSON payloads.
+    """
+    if glob.glob(os.path.join(path, "date=*")):
+        return iter_snapshots(path, start, end)
+    return iter_status_json(path, start, end)
+
+
+class _ReplayAdapterImpl(PullInputAdapter):
+    def __init__(self, path: str):
+        self._path = path
+        self._snapshots = iter(())
+        super().__init__()
+
+    def start(self, start_time: datetime, end_time: datetime):
+        self._snapshots = iter_recorded_status(self._path, start_time, end_time)
+        super().start(start_time, end_time)
+
+    def next(self):
+        return next(self._snapshots, None)
+
+
+# ticks every recorded frame at the time it was polled, read lazily as the engine asks for the next one
+replay_status = py_pull_adapter_def("replay_status", _ReplayAdapterImpl, ts[pl.DataFrame], path=str)
+
+
+def replay_report(info, wall_seconds: float, nodes: Optional[Iterable[str]] = None) -> pl.DataFrame:
+    """
+    Per-node throughput and latency of a replay run.
+
+    Args:
+        info: csp.profiler.ProfilerInfo of the run
+        wall_seconds: float, wall clock duration of the run
+        nodes: names of the nodes to report, all profiled nodes by default
+
+    Returns:
+        pl.DataFrame: one row per node with its executions, executions per second and average and max latency in
+        milliseconds, sorted by total time
+    """
+    stats = info.node_stats
+    names = [name for name in (nodes if nodes is not None else stats) if name in stats]
+    report = pl.DataFrame(
+        {
+            "node": names,
+            "executions": [stats[name]["executions"] for name in names],
+            "total_s": [stats[name]["total_time"] for name in names],
+            "max_ms": [stats[name]["max_time"] * 1e3 for name in names],
+        },
+        schema={"node": pl.String, "executions": pl.Int64, "total_s": pl.Float64, "max_ms": pl.Float64},
+    )
+    return report.with_columns(
+        (pl.col("executions") / wall_seconds).alias("per_s"),
+        (pl.col("total_s") * 1e3 / pl.col("executions")).alias("avg_ms"),
+    ).select("node", "executions", "per_s", "avg_ms", "max_ms", "total_s").sort("total_s", descending=True)
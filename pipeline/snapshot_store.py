@@ -0,0 +1,199 @@
+import logging
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TIME = "snapshot_time"
+
+
+def _utc_naive(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def partition_dir(root: str, moment: datetime) -> str:
+    """
+    Hive-style daily partition of a snapshot time, e.g. <root>/date=2024-03-01.
+    """
+    return os.path.join(root, f"date={moment:%Y-%m-%d}")
+
+
+class SnapshotStore:
+    """
+    Append-only history of polled station frames, as Parquet files partitioned by UTC day
+
+    Snapshots are buffered and written flush_every at a time, one file per flush, with the rows sorted by station_id
+    and time. Every column is dictionary encoded, so in that order a station's static columns and its unchanged
+    counts between polls collapse into run-length encoded runs, and only the changes of a count take space.
+    snapshot_time is stored with DELTA_BINARY_PACKED instead, it increases by the poll interval within each run.
+    With max_days, the partitions of days that fell out of the retention window are deleted as new days are written.
+    """
+    def __init__(self, root: str, flush_every: int = 60, compression: str = "zstd", max_days: Optional[int] = None) -> None:
+        """
+        Args:
+            root: str, directory holding the date=YYYY-MM-DD partitions
+            flush_every: int, snapshots buffered in memory before they are written
+            compression: str, Parquet compression codec applied on top of the encodings
+            max_days: int, days of history kept, counting the day last written; everything is kept if None
+        """
+        self.root = root
+        self.flush_every = flush_every
+        self.compression = compression
+        self.max_days = max_days
+        self._buffer = []
+
+    def append(self, frame: pl.DataFrame, snapshot_time: Optional[datetime] = None) -> None:
+        """
+        Args:
+            frame: pl.DataFrame, one get_station_status() snapshot
+            snapshot_time: datetime, when it was polled, now by default
+        """
+        moment = _utc_naive(snapshot_time if snapshot_time is not None else datetime.now(timezone.utc))
+        if self._buffer and partition_dir(self.root, moment) != partition_dir(self.root, self._buffer[0][0]):
+            self.flush()
+        self._buffer.append((moment, frame))
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def _encode(self, frame: pl.DataFrame) -> pa.Table:
+        table = frame.sort("station_id", SNAPSHOT_TIME).to_arrow()
+        # polars writes large strings, plain strings are enough and keep the files readable by any Parquet reader
+        return table.cast(pa.schema([
+            pa.field(field.name, pa.string() if pa.types.is_large_string(field.type) else field.type)
+            for field in table.schema
+        ]))
+
+    def flush(self) -> Optional[str]:
+        """
+        Write the buffered snapshots to a new file in their day's partition.
+
+        Returns:
+            str: path of the written file, or None if nothing was buffered
+        """
+        if not self._buffer:
+            return None
+        first = self._buffer[0][0]
+        frame = pl.concat(
+            [frame.with_columns(pl.lit(moment).cast(pl.Datetime("ms")).alias(SNAPSHOT_TIME)) for moment, frame in self._buffer],
+            how="diagonal_relaxed",
+        )
+        table = self._encode(frame)
+
+        directory = partition_dir(self.root, first)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{first:%Y%m%dT%H%M%S%f}.parquet")
+        tmp_path = f"{path}.tmp"
+        pq.write_table(
+            table,
+            tmp_path,
+            compression=self.compression,
+            use_dictionary=[name for name in table.column_names if name != SNAPSHOT_TIME],
+            column_encoding={SNAPSHOT_TIME: "DELTA_BINARY_PACKED"},
+        )
+        os.replace(tmp_path, path)
+        self._buffer = []
+        if self.max_days is not None:
+            self.prune(first.date())
+        return path
+
+    def prune(self, today: date) -> list[str]:
+        """
+        Delete the partitions of days before the max_days ending with today.
+
+        Returns:
+            list[str]: the deleted partition directories
+        """
+        cutoff = today - timedelta(days=self.max_days - 1)
+        deleted = []
+        for directory in sorted(os.listdir(self.root)):
+            day = _partition_date(directory)
+            if day is not None and day < cutoff:
+                shutil.rmtree(os.path.join(self.root, directory))
+                deleted.append(os.path.join(self.root, directory))
+        return deleted
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush snapshots to {self.root}: {e}")
+
+
+def scan_snapshots(root: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pl.LazyFrame:
+    """
+    Lazily scan the stored snapshots polled in [start, end).
+
+    Partitions outside the range are pruned on the date directory and row groups on snapshot_time statistics, so
+    only the files of the requested days are read.
+
+    Args:
+        root: str, directory written by a SnapshotStore
+        start: datetime, first snapshot time included, unbounded if None
+        end: datetime, first snapshot time excluded, unbounded if None
+
+    Returns:
+        pl.LazyFrame: the snapshots, with a snapshot_time column
+    """
+    scan = pl.scan_parquet(
+        os.path.join(root, "**", "*.parquet"),
+        hive_partitioning=True,
+        hive_schema={"date": pl.Date},
+    )
+    if start is not None:
+        start = _utc_naive(start)
+        scan = scan.filter((pl.col("date") >= start.date()) & (pl.col(SNAPSHOT_TIME) >= start))
+    if end is not None:
+        end = _utc_naive(end)
+        scan = scan.filter((pl.col("date") <= end.date()) & (pl.col(SNAPSHOT_TIME) < end))
+    return scan.drop("date")
+
+
+def _partition_date(directory: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(directory.removeprefix("date="))
+    except ValueError:
+        return None
+
+
+def iter_snapshots(
+    root: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> Iterator[tuple[datetime, pl.DataFrame]]:
+    """
+    Replay the stored snapshots polled in [start, end) one at a time, in polling order.
+
+    Files are read one after the other, so memory holds a single flush of snapshots however long the history is.
+
+    Args:
+        root: str, directory written by a SnapshotStore
+        start: datetime, first snapshot time included, unbounded if None
+        end: datetime, first snapshot time excluded, unbounded if None
+
+    Yields:
+        (datetime, pl.DataFrame): the snapshot time and the frame as it was polled, without the snapshot_time column
+    """
+    start = _utc_naive(start) if start is not None else None
+    end = _utc_naive(end) if end is not None else None
+    for directory in sorted(os.listdir(root)):
+        day = _partition_date(directory)
+        if day is None or (start is not None and day < start.date()) or (end is not None and day > end.date()):
+            continue
+        # part files are named after their first snapshot time, so name order is polling order
+        for name in sorted(os.listdir(os.path.join(root, directory))):
+            if not name.endswith(".parquet"):
+                continue
+            frame = pl.read_parquet(os.path.join(root, directory, name))
+            if start is not None:
+                frame = frame.filter(pl.col(SNAPSHOT_TIME) >= start)
+            if end is not None:
+                frame = frame.filter(pl.col(SNAPSHOT_TIME) < end)
+            # the sort is stable, so rows stay in station_id order within each snapshot
+            for snapshot in frame.sort(SNAPSHOT_TIME, maintain_order=True).partition_by(SNAPSHOT_TIME, maintain_order=True):
+                yield snapshot[SNAPSHOT_TIME][0], snapshot.drop(SNAPSHOT_TIME)
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import polars as pl
+import pyarrow as pa
+
+from pipeline.arrow_ipc import ArrowIPCEncoder, to_records
+from pipeline.metrics import (
+    PERSPECTIVE_UPDATE_SECONDS,
+    WRITER_BATCH_ROWS,
+    WRITER_COALESCED_ROWS,
+    WRITER_PENDING_ROWS,
+    WRITER_QUEUE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# hands a callback to the thread that owns the Perspective tables, e.g. loop.call_soon_threadsafe
+Schedule = Callable[[Callable[[], None]], object]
+
+
+class TableWriter:
+    """
+    Bounded, coalescing queue of updates for one Perspective table, applied in batches on the Perspective loop
+
+    upsert() and remove() only queue the change and return, so a slow websocket client or a large update delays the
+    loop rather than the csp engine. Changes queued before the loop gets to them are merged by index, the last one
+    winning, and applied as one removal and one Arrow IPC update. Merging bounds the queue to the table's rows: once
+    the queued frames hold more than max_pending_rows rows they are compacted to one row per index.
+    """
+    def __init__(self, table, name: str, schedule: Optional[Schedule] = None, max_pending_rows: int = 100_000) -> None:
+        """
+        Args:
+            table: perspective.Table to write to
+            name: str, the name the table is hosted under, for the metrics
+            schedule: Schedule running a callback on the Perspective loop; without one every change is applied at once
+            max_pending_rows: int, queued rows above which the queue is compacted to one row per index
+        """
+        self.table = table
+        self.name = name
+        self.index = table.get_index()
+        self.schedule = schedule
+        self.max_pending_rows = max_pending_rows
+        self._encoder = ArrowIPCEncoder(table.schema())
+        self._lock = threading.Lock()
+        self._frames = []
+        self._pending_rows = 0
+        self._removed = set()
+        self._since = None
+        self._scheduled = False
+
+    @property
+    def pending_rows(self) -> int:
+        with self._lock:
+            return self._pending_rows + len(self._removed)
+
+    def upsert(self, frame: pl.DataFrame) -> None:
+        """
+        Queue rows to insert or update, keyed by the table's index.
+        """
+        if frame.is_empty():
+            return
+        with self._lock:
+            if self._removed:
+                self._removed.difference_update(frame[self.index].to_list())
+            self._frames.append(frame)
+            self._pending_rows += len(frame)
+            if self._pending_rows > self.max_pending_rows:
+                self._compact()
+            schedule = self._queued()
+        if schedule:
+            self._dispatch()
+
+    def remove(self, ids: list) -> None:
+        """
+        Queue rows to remove by index; queued updates of those rows are dropped.
+        """
+        if not ids:
+            return
+        with self._lock:
+            if self._frames:
+                dropped = pl.Series(ids, dtype=self._frames[0].schema[self.index])
+                self._frames = [frame.filter(~pl.col(self.index).is_in(dropped.implode())) for frame in self._frames]
+                self._pending_rows = sum(len(frame) for frame in self._frames)
+            self._removed.update(ids)
+            schedule = self._queued()
+        if schedule:
+            self._dispatch()
+
+    def _compact(self) -> None:
+        before = self._pending_rows
+        frame = pl.concat(self._frames, how="diagonal_relaxed").unique(subset=self.index, keep="last", maintain_order=True)
+        self._frames = [frame]
+        self._pending_rows = len(frame)
+        WRITER_COALESCED_ROWS.observe(before - len(frame), self.name)
+
+    def _queued(self) -> bool:
+        # called under the lock, True when no flush is scheduled for the changes queued so far
+        WRITER_PENDING_ROWS.observe(self._pending_rows + len(self._removed), self.name)
+        if self._since is None:
+            self._since = time.perf_counter()
+        if self._scheduled:
+            return False
+        self._scheduled = True
+        return True
+
+    def _dispatch(self) -> None:
+        if self.schedule is None:
+            self.flush()
+        else:
+            self.schedule(self.flush)
+
+    def _take(self) -> tuple[Optional[pl.DataFrame], list, Optional[float]]:
+        with self._lock:
+            if len(self._frames) > 1:
+                self._compact()
+            frame = self._frames[0] if self._frames else None
+            removed = list(self._removed)
+            since = self._since
+            self._frames = []
+            self._pending_rows = 0
+            self._removed = set()
+            self._since = None
+            # changes queued from here on schedule the next flush, which runs after this one on the loop
+            self._scheduled = False
+        return frame, removed, since
+
+    def flush(self) -> None:
+        """
+        Apply every queued change as one batch. Runs on the Perspective loop, or on the caller's thread without one.
+        """
+        frame, removed, since = self._take()
+        if since is None:
+            return
+        WRITER_QUEUE_SECONDS.observe(time.perf_counter() - since, self.name)
+        try:
+            with PERSPECTIVE_UPDATE_SECONDS.time(self.name):
+                if removed:
+                    self.table.remove(removed)
+                if frame is not None:
+                    WRITER_BATCH_ROWS.observe(len(frame), self.name)
+                    self.table.update(self._payload(frame))
+        except Exception as e:
+            # an exception would otherwise only reach the loop's default handler
+            logger.error(f"Failed to apply a batch to the {self.name} table: {e}")
+
+    def _payload(self, frame: pl.DataFrame):
+        # Arrow IPC is the supported transport; the records path is only a fallback for frames that fail to cast
+        try:
+            return self._encoder.encode(frame)
+        except (pa.ArrowException, KeyError) as e:
+            logger.warning(f"Arrow IPC push failed, falling back to records: {e}")
+            return to_records(frame)
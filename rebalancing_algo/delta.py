@@ -0,0 +1,51 @@
+from typing import NamedTuple
+
+import polars as pl
+
+STATUS_COLUMNS = ["station_id", "num_bikes_available", "lat", "lon"]
+
+
+class StationStatusDiff(NamedTuple):
+    """
+    Difference between two consecutive station status frames
+    """
+    changed: pl.DataFrame
+    added: list
+    removed: list
+    moved: list
+
+    @property
+    def geometry_changed(self) -> bool:
+        return bool(self.added or self.removed or self.moved)
+
+
+def diff_station_status(previous: pl.DataFrame, current: pl.DataFrame) -> StationStatusDiff:
+    """
+    Compare two get_station_status() frames in one vectorized join on station_id.
+
+    Args:
+        previous: pl.DataFrame, the status frame of the previous tick
+        current: pl.DataFrame, the status frame of this tick
+
+    Returns:
+        StationStatusDiff: stations whose bike count changed (station_id and the new num_bikes_available), plus the
+        ids of stations that were added, removed or moved
+    """
+    joined = current.select(STATUS_COLUMNS).with_columns(pl.lit(True).alias("_in_current")).join(
+        previous.select(STATUS_COLUMNS).with_columns(pl.lit(True).alias("_in_previous")),
+        on="station_id",
+        how="full",
+        coalesce=True,
+        suffix="_previous",
+    )
+    in_both = pl.col("_in_current").is_not_null() & pl.col("_in_previous").is_not_null()
+
+    added = joined.filter(pl.col("_in_previous").is_null())["station_id"].to_list()
+    removed = joined.filter(pl.col("_in_current").is_null())["station_id"].to_list()
+    moved = joined.filter(
+        in_both & ((pl.col("lat") != pl.col("lat_previous")) | (pl.col("lon") != pl.col("lon_previous")))
+    )["station_id"].to_list()
+    changed = joined.filter(
+        in_both & (pl.col("num_bikes_available") != pl.col("num_bikes_available_previous"))
+    ).select("station_id", "num_bikes_available")
+    return StationStatusDiff(changed, added, removed, moved)
@@ -0,0 +1,243 @@
+from heapq import heappop, heappush
+from typing import NamedTuple
+
+import numpy as np
+
+from rebalancing_algo.spatial import SpatialIndex
+
+# distances are rounded to integer multiples of this resolution (about 10 m) before solving, in the graph metric's
+# units; coarser costs mean fewer distinct shortest-path lengths and so fewer solver phases
+DEFAULT_RESOLUTION = {
+    "l1": 1e-4,
+    "haversine": 0.01,
+}
+
+
+class Transfer(NamedTuple):
+    """
+    One move of a transfer plan: num_bikes taken from the source station and dropped at the target station
+    """
+    source: object
+    target: object
+    num_bikes: int
+    distance: float
+
+
+def station_bounds(bound, size: int) -> np.ndarray:
+    """
+    A bound given for every station at once (int) or per station (array aligned with the node store), as an array.
+    """
+    return np.broadcast_to(np.asarray(bound, dtype=np.int64), (size,))
+
+
+class RebalancingEngine:
+    """
+    Plans bike transfers for a Graph without applying them, so Graph.rebalance_stations can swap strategies
+    """
+    name = "base"
+
+    def plan(self, graph, min_bikes, max_bikes) -> list[Transfer]:
+        """
+        Args:
+            graph: Graph, stations to rebalance
+            min_bikes: int, the minimum number of bikes that each station should have, or an array with one bound
+                per station of graph.store
+            max_bikes: int, the maximum number of bikes that each station should have, or an array like min_bikes
+
+        Returns:
+            list[Transfer]: transfers that move surplus bikes (above max_bikes) to stations below min_bikes
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Release the worker processes the engine holds, if any.
+        """
+
+
+class GreedyEngine(RebalancingEngine):
+    """
+    The original pass: each understocked station, in node order, drains its closest overstocked top-k neighbors
+    """
+    name = "greedy"
+
+    def plan(self, graph, min_bikes, max_bikes) -> list[Transfer]:
+        store = graph.store
+        bikes = store.bikes.copy()
+        min_bikes = station_bounds(min_bikes, len(bikes))
+        max_bikes = station_bounds(max_bikes, len(bikes))
+        understocked = np.flatnonzero(bikes < min_bikes)
+        overstocked = {store.ids[position] for position in np.flatnonzero(bikes > max_bikes)}
+
+        transfers = []
+        for under_position in understocked:
+            under_id = store.ids[under_position]
+            if under_id not in graph.top_k_neighbors:
+                graph.set_top_k_neighbors(under_id)
+            for distance, over_id in graph.top_k_neighbors[under_id]:
+                if over_id in overstocked:
+                    over_position = store.index[over_id]
+                    needed = int(min_bikes[under_position]) - int(bikes[under_position])
+                    available = int(bikes[over_position]) - int(max_bikes[over_position])
+                    transfer_amount = min(needed, available)
+
+                    if transfer_amount > 0:
+                        bikes[over_position] -= transfer_amount
+                        bikes[under_position] += transfer_amount
+                        transfers.append(Transfer(over_id, under_id, transfer_amount, distance))
+                    if bikes[under_position] >= min_bikes[under_position]:
+                        break
+        return transfers
+
+
+class MinCostFlowEngine(RebalancingEngine):
+    """
+    Optimal plan over a sparse surplus -> deficit graph: the most deficit bikes filled, then the least total bike-distance
+
+    Every understocked station is connected to its `candidates` closest overstocked stations, and the resulting
+    transportation problem is solved as a min-cost max-flow. The plan is optimal for distances rounded to `resolution`.
+    """
+    name = "min_cost_flow"
+
+    def __init__(self, candidates: int = 16, resolution: float = None) -> None:
+        """
+        Args:
+            candidates: int, number of closest overstocked stations each understocked station may draw from
+            resolution: float, distance rounding step in the graph metric's units, about 10 m by default
+        """
+        self.candidates = candidates
+        self.resolution = resolution
+
+    def plan(self, graph, min_bikes, max_bikes) -> list[Transfer]:
+        store = graph.store
+        bikes = store.bikes
+        min_bikes = station_bounds(min_bikes, len(bikes))
+        max_bikes = station_bounds(max_bikes, len(bikes))
+        surplus = np.flatnonzero(bikes > max_bikes)
+        deficit = np.flatnonzero(bikes < min_bikes)
+        if len(surplus) == 0 or len(deficit) == 0:
+            return []
+
+        resolution = self.resolution if self.resolution is not None else DEFAULT_RESOLUTION[graph.metric]
+        surplus_index = SpatialIndex(range(len(surplus)), store.lat[surplus], store.lon[surplus], metric=graph.metric)
+        neighbors = surplus_index.query_points(store.lat[deficit], store.lon[deficit], self.candidates)
+
+        # node 0 is the source, node 1 the sink, then one node per surplus station and one per deficit station
+        source, sink = 0, 1
+        first_deficit = 2 + len(surplus)
+        edges = [(source, 2 + i, int(bikes[position] - max_bikes[position]), 0) for i, position in enumerate(surplus)]
+        edges += [(first_deficit + j, sink, int(min_bikes[position] - bikes[position]), 0) for j, position in enumerate(deficit)]
+        routes = []
+        for j, candidates in enumerate(neighbors):
+            for distance, i in candidates:
+                routes.append((i, j, distance))
+                edges.append((2 + i, first_deficit + j, int(min_bikes[deficit[j]] - bikes[deficit[j]]), int(round(distance / resolution))))
+
+        flows = min_cost_flow(first_deficit + len(deficit), edges, source, sink)
+        route_flows = flows[len(surplus) + len(deficit):]
+        return [
+            Transfer(store.ids[surplus[i]], store.ids[deficit[j]], flow, distance)
+            for (i, j, distance), flow in zip(routes, route_flows)
+            if flow > 0
+        ]
+
+
+def min_cost_flow(num_nodes: int, edges: list, source: int, sink: int) -> list[int]:
+    """
+    Min-cost max-flow with non-negative integer costs (primal-dual: Dijkstra on reduced costs, then a blocking flow
+    over the zero reduced cost edges, so every shortest-path length is augmented in a single phase).
+
+    Args:
+        num_nodes: int, number of nodes, numbered 0..num_nodes - 1
+        edges: list of (from, to, capacity, cost) tuples
+        source: int, source node
+        sink: int, sink node
+
+    Returns:
+        list[int]: the flow on every edge, aligned with edges
+    """
+    adjacency = [[] for _ in range(num_nodes)]
+    to, capacity, cost = [], [], []
+    for u, v, edge_capacity, edge_cost in edges:
+        adjacency[u].append(len(to))
+        to.append(v)
+        capacity.append(edge_capacity)
+        cost.append(edge_cost)
+        adjacency[v].append(len(to))
+        to.append(u)
+        capacity.append(0)
+        cost.append(-edge_cost)
+
+    potential = [0] * num_nodes
+    unreachable = float("inf")
+    while True:
+        # shortest paths on reduced costs, which stay non-negative thanks to the potentials
+        dist = [unreachable] * num_nodes
+        dist[source] = 0
+        heap = [(0, source)]
+        while heap:
+            d, u = heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == sink:
+                break
+            pu = potential[u]
+            for e in adjacency[u]:
+                if capacity[e] > 0:
+                    v = to[e]
+                    nd = d + cost[e] + pu - potential[v]
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        heappush(heap, (nd, v))
+        if dist[sink] == unreachable:
+            break
+        # the search stops at the sink, so labels beyond it are capped at the sink distance (still a valid potential)
+        sink_dist = dist[sink]
+        for v in range(num_nodes):
+            potential[v] += min(dist[v], sink_dist)
+
+        # level graph over the admissible (zero reduced cost) residual edges
+        level = [-1] * num_nodes
+        level[source] = 0
+        frontier = [source]
+        while frontier:
+            next_frontier = []
+            for u in frontier:
+                for e in adjacency[u]:
+                    v = to[e]
+                    if capacity[e] > 0 and level[v] < 0 and cost[e] + potential[u] - potential[v] == 0:
+                        level[v] = level[u] + 1
+                        next_frontier.append(v)
+            frontier = next_frontier
+
+        # blocking flow with current-arc pointers, walked iteratively so long residual paths cannot blow the stack
+        pointer = [0] * num_nodes
+        while True:
+            path = []
+            u = source
+            while u != sink:
+                arcs = adjacency[u]
+                while pointer[u] < len(arcs):
+                    e = arcs[pointer[u]]
+                    v = to[e]
+                    if capacity[e] > 0 and level[v] == level[u] + 1 and cost[e] + potential[u] - potential[v] == 0:
+                        break
+                    pointer[u] += 1
+                else:
+                    if u == source:
+                        break
+                    level[u] = -1
+                    e = path.pop()
+                    u = to[e ^ 1]
+                    pointer[u] += 1
+                    continue
+                path.append(e)
+                u = v
+            if u != sink:
+                break
+            pushed = min(capacity[e] for e in path)
+            for e in path:
+                capacity[e] -= pushed
+                capacity[e ^ 1] += pushed
+
+    return [capacity[2 * i + 1] for i in range(len(edges))]
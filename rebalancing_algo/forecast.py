@@ -0,0 +1,238 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Union
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import polars as pl
+
+HOURS_PER_WEEK = 168
+
+# Citi Bike trip files and the hours riders keep are in local time
+DEFAULT_TIMEZONE = "America/New_York"
+
+FORECAST_SCHEMA = {"station_id": pl.String, "hour_of_week": pl.Int16, "net_flow": pl.Float32}
+
+Frame = Union[pl.DataFrame, pl.LazyFrame]
+
+
+def _hour_of_week(column: pl.Expr) -> pl.Expr:
+    # Monday 00:00 is hour 0; weekday is an Int8, widened before Sunday's 144 overflows it
+    return (column.dt.weekday().cast(pl.Int16) - 1) * 24 + column.dt.hour().cast(pl.Int16)
+
+
+def _as_datetime(frame: pl.LazyFrame, name: str) -> pl.Expr:
+    column = pl.col(name)
+    return column.str.to_datetime() if frame.collect_schema()[name] == pl.String else column
+
+
+def _weeks_per_hour(first: date, last: date) -> np.ndarray:
+    """
+    Number of times every hour of the week occurs in [first, last], to turn totals into per-week averages.
+    """
+    days = np.arange(np.datetime64(first), np.datetime64(last) + 1)
+    # numpy counts days from a Thursday, shift so that Monday is weekday 0
+    weekdays = (days.astype(np.int64) + 3) % 7
+    return np.maximum(np.repeat(np.bincount(weekdays, minlength=7), 24), 1)
+
+
+class DemandForecast:
+    """
+    Expected net flow of bikes (arrivals minus departures) for every station and hour of the week
+
+    The model is a lookup table learnt from history: the average net flow of each (station, hour of week) pair.
+    It is held as a dense float32 array with one row per station and a running sum over two weeks, so the flow
+    expected over any horizon is two array reads per station and targets for a whole tick are one vectorized pass.
+    """
+    def __init__(self, flows: pl.DataFrame, timezone: str = DEFAULT_TIMEZONE) -> None:
+        """
+        Args:
+            flows: pl.DataFrame with FORECAST_SCHEMA columns, e.g. from from_trips or load
+            timezone: str, timezone the hours of the week are counted in
+        """
+        flows = flows.cast(FORECAST_SCHEMA)
+        self.station_ids = flows["station_id"].unique(maintain_order=True).to_list()
+        self.index = dict(zip(self.station_ids, range(len(self.station_ids))))
+        self.timezone = ZoneInfo(timezone)
+
+        rows = flows["station_id"].replace_strict(self.station_ids, range(len(self.station_ids)), return_dtype=pl.Int64)
+        self.flow = np.zeros((len(self.station_ids), HOURS_PER_WEEK), dtype=np.float32)
+        self.flow[rows.to_numpy().astype(np.int64), flows["hour_of_week"].to_numpy().astype(np.int64)] = flows["net_flow"].to_numpy()
+        # cumulative[:, h] is the flow of the h hours starting Monday 00:00, over two weeks so horizons can wrap
+        self._cumulative = np.zeros((len(self.station_ids), 2 * HOURS_PER_WEEK + 1), dtype=np.float32)
+        np.cumsum(np.tile(self.flow, 2), axis=1, out=self._cumulative[:, 1:])
+
+    @classmethod
+    def from_trips(
+        cls,
+        trips: Frame,
+        stations: Optional[pl.DataFrame] = None,
+        timezone: str = DEFAULT_TIMEZONE,
+        start_time: str = "started_at",
+        end_time: str = "ended_at",
+        start_station: str = "start_station_id",
+        end_station: str = "end_station_id",
+    ) -> "DemandForecast":
+        """
+        Learn the net flows from trip history, e.g. DatasetLoader.stream over the monthly Citi Bike trip files.
+
+        Departures and arrivals are counted per station and hour of the week in grouped aggregations on the streaming
+        engine, so a year of trips is never held in memory.
+
+        Args:
+            trips: pl.DataFrame or pl.LazyFrame of trips, with local start and end times
+            stations: pl.DataFrame, station information (DatasetLoader.get_stations()) to key the table by GBFS
+                station_id; the trip files name stations by their short_name. Trip station ids are kept if None.
+            timezone: str, timezone the trip times are in
+            start_time, end_time, start_station, end_station: str, names of the trip columns
+
+        Returns:
+            DemandForecast: average arrivals minus departures per week, for every station and hour of the week
+        """
+        trips = trips.lazy()
+        started = _as_datetime(trips, start_time)
+        ended = _as_datetime(trips, end_time)
+        departures = trips.group_by(
+            pl.col(start_station).cast(pl.String).alias("station_id"), _hour_of_week(started).alias("hour_of_week")
+        ).agg(pl.len().alias("departures"))
+        arrivals = trips.group_by(
+            pl.col(end_station).cast(pl.String).alias("station_id"), _hour_of_week(ended).alias("hour_of_week")
+        ).agg(pl.len().alias("arrivals"))
+        span = trips.select(started.min().dt.date().alias("first"), started.max().dt.date().alias("last"))
+        departures, arrivals, span = pl.collect_all([departures, arrivals, span], engine="streaming")
+
+        counts = departures.join(arrivals, on=["station_id", "hour_of_week"], how="full", coalesce=True).filter(
+            pl.col("station_id").is_not_null()
+        )
+        if stations is not None:
+            short_names = stations.select(
+                pl.col("short_name").cast(pl.String).alias("station_id"), pl.col("station_id").cast(pl.String).alias("gbfs_id")
+            )
+            counts = counts.join(short_names, on="station_id").drop("station_id").rename({"gbfs_id": "station_id"})
+        return cls(cls._average(counts, pl.col("arrivals").fill_null(0).cast(pl.Int64) - pl.col("departures").fill_null(0).cast(pl.Int64), span), timezone)
+
+    @classmethod
+    def from_snapshots(cls, snapshots: Frame, timezone: str = DEFAULT_TIMEZONE, max_step: int = 10) -> "DemandForecast":
+        """
+        Learn the net flows from recorded station status, e.g. DatasetLoader.load_snapshots.
+
+        The flow is the change of num_bikes_available between consecutive snapshots of a station. Changes larger
+        than max_step are taken for rebalancing trucks rather than riders and ignored.
+
+        Args:
+            snapshots: pl.DataFrame or pl.LazyFrame with station_id, num_bikes_available and a UTC snapshot_time
+            timezone: str, timezone the hours of the week are counted in
+            max_step: int, largest change between two snapshots attributed to riders
+
+        Returns:
+            DemandForecast: average bikes gained per week, for every station and hour of the week
+        """
+        local = pl.col("snapshot_time").dt.replace_time_zone("UTC").dt.convert_time_zone(timezone)
+        steps = (
+            snapshots.lazy()
+            .select(pl.col("station_id").cast(pl.String), "num_bikes_available", local.alias("local_time"))
+            .sort("station_id", "local_time")
+            .with_columns(pl.col("num_bikes_available").diff().over("station_id").alias("step"))
+            .filter(pl.col("step").abs() <= max_step)
+        )
+        counts = steps.group_by("station_id", _hour_of_week(pl.col("local_time")).alias("hour_of_week")).agg(
+            pl.col("step").sum()
+        )
+        span = steps.select(pl.col("local_time").min().dt.date().alias("first"), pl.col("local_time").max().dt.date().alias("last"))
+        counts, span = pl.collect_all([counts, span], engine="streaming")
+        return cls(cls._average(counts, pl.col("step"), span), timezone)
+
+    @staticmethod
+    def _average(counts: pl.DataFrame, total: pl.Expr, span: pl.DataFrame) -> pl.DataFrame:
+        if counts.is_empty():
+            return pl.DataFrame(schema=FORECAST_SCHEMA)
+        weeks = _weeks_per_hour(span["first"][0], span["last"][0])
+        counts = counts.select("station_id", "hour_of_week", total.alias("total"))
+        net_flow = counts["total"].to_numpy() / weeks[counts["hour_of_week"].to_numpy()]
+        return counts.select("station_id", "hour_of_week", pl.Series("net_flow", net_flow))
+
+    def to_frame(self) -> pl.DataFrame:
+        """
+        The lookup table in long form, FORECAST_SCHEMA columns with the non-zero flows only.
+        """
+        rows, hours = np.nonzero(self.flow)
+        return pl.DataFrame(
+            {
+                "station_id": [self.station_ids[row] for row in rows],
+                "hour_of_week": hours,
+                "net_flow": self.flow[rows, hours],
+            },
+            schema=FORECAST_SCHEMA,
+        )
+
+    def save(self, path: str) -> None:
+        self.to_frame().write_parquet(path)
+
+    @classmethod
+    def load(cls, path: str, timezone: str = DEFAULT_TIMEZONE) -> "DemandForecast":
+        return cls(pl.read_parquet(path), timezone)
+
+    def local_hour_of_week(self, moment: datetime) -> int:
+        """
+        Hour of the week of moment in the forecast's timezone; naive datetimes are taken as UTC, like csp.now().
+        """
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        local = moment.astimezone(self.timezone)
+        return local.weekday() * 24 + local.hour
+
+    def rows(self, station_ids: list) -> np.ndarray:
+        """
+        Row of every station in the lookup table, -1 for stations the history did not cover.
+        """
+        return np.fromiter((self.index.get(station_id, -1) for station_id in station_ids), dtype=np.int64, count=len(station_ids))
+
+    def expected_flow(self, station_ids: list, moment: datetime, horizon: timedelta = timedelta(hours=3)) -> np.ndarray:
+        """
+        Args:
+            station_ids: list, stations to look up
+            moment: datetime, start of the horizon, taken as UTC when naive
+            horizon: timedelta, how far ahead to sum the flows, in whole hours and at most a week
+
+        Returns:
+            np.ndarray: bikes each station is expected to gain (negative: to lose) over the horizon, 0 when unknown
+        """
+        hours = min(max(int(horizon / timedelta(hours=1)), 0), HOURS_PER_WEEK)
+        start = self.local_hour_of_week(moment)
+        rows = self.rows(station_ids)
+        known = rows >= 0
+        flow = np.zeros(len(rows), dtype=np.float64)
+        flow[known] = self._cumulative[rows[known], start + hours] - self._cumulative[rows[known], start]
+        return flow
+
+    def targets(
+        self,
+        station_ids: list,
+        capacity,
+        moment: datetime,
+        horizon: timedelta = timedelta(hours=3),
+        low: float = 0.25,
+        high: float = 0.75,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Per-station rebalancing bounds for Graph.rebalance_incremental, in place of one min_bikes/max_bikes pair.
+
+        Each station's band is [low, high] of its capacity, shifted against the flow expected over the horizon: a
+        station about to be drained is asked to hold more bikes now, one about to fill up fewer. The bounds only
+        change on the hour, so the incremental planner keeps its standing plan within an hour.
+
+        Args:
+            station_ids: list, stations in the order of the status frame
+            capacity: array-like of int, dock count of every station
+            moment: datetime, current time, taken as UTC when naive (csp.now())
+            horizon: timedelta, time until the next rebalancing round the bounds should cover
+            low: float, fraction of capacity kept as the minimum when no flow is expected
+            high: float, fraction of capacity kept as the maximum when no flow is expected
+
+        Returns:
+            (np.ndarray, np.ndarray): min_bikes and max_bikes of every station, 0 <= min <= max <= capacity
+        """
+        capacity = np.asarray(capacity, dtype=np.int64)
+        expected = self.expected_flow(station_ids, moment, horizon)
+        min_bikes = np.clip(np.rint(capacity * low - expected), 0, capacity).astype(np.int64)
+        max_bikes = np.clip(np.rint(capacity * high - expected), min_bikes, capacity).astype(np.int64)
+        return min_bikes, max_bikes
@@ -1,21 +1,82 @@
 from collections import defaultdict
 from heapq import heappushpop, heappush
 
+import numpy as np
 import polars as pl
 
+from rebalancing_algo.delta import diff_station_status
+from rebalancing_algo.engines import GreedyEngine, RebalancingEngine, Transfer, station_bounds
+from rebalancing_algo.node_store import NodeStore, NodeView
+from rebalancing_algo.spatial import DISTANCE_FUNCTIONS, METRICS, SpatialIndex
+
 class Graph:
     """
     Graph for maintaining relationships between nodes (bike rack locations) and finding optimal transfer to new cluster
     """
-    def __init__(self, top_k: int) -> None:
+    def __init__(self, top_k: int, metric: str = "l1", use_spatial_index: bool = False) -> None:
+        """
+        Args:
+            top_k: int, number of closest neighbors kept for every station
+            metric: str, distance between stations, "l1" on lat/lon degrees or "haversine" in kilometers
+            use_spatial_index: bool, answer neighbor queries from a batched grid index instead of a per-station scan
+        """
+        if metric not in DISTANCE_FUNCTIONS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+
         self._station_name_map = defaultdict(lambda: None)
 
-        # nodes[station_id] = (num_bikes, station_lat, station_lon, name) 
-        self.nodes = defaultdict(lambda: (0, 0, 0, ""))
+        # columnar storage, nodes[station_id] = (num_bikes, station_lat, station_lon, name) is a view over it
+        self.store = NodeStore()
+        self._nodes_view = NodeView(self.store)
 
         self.k = top_k
         self.top_k_neighbors = defaultdict(list)
 
+        self.metric = metric
+        self._distance = DISTANCE_FUNCTIONS[metric]
+        self.use_spatial_index = use_spatial_index
+        # metric -> (geometry version, index), rebuilt only when stations are added, removed or moved
+        self._spatial_indexes = {}
+
+        # incremental rebalancing state: observed (pre-transfer) counts and the standing plan in both directions
+        self._observed = None
+        self._plan_bounds = None
+        self._incoming = defaultdict(dict)
+        self._outgoing = defaultdict(dict)
+        self._reverse_neighbors = None
+
+    @property
+    def nodes(self) -> NodeView:
+        """
+        Dict view of the node store, station_id -> (num_bikes, station_lat, station_lon, name)
+        """
+        return self._nodes_view
+
+    @nodes.setter
+    def nodes(self, nodes: dict) -> None:
+        ids = list(nodes)
+        rows = [nodes[node_id] for node_id in ids]
+        self.store.load(
+            ids,
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [row[2] for row in rows],
+            [row[3] for row in rows],
+        )
+
+    @staticmethod
+    def _columns(dataframe: pl.DataFrame) -> tuple:
+        """
+        Pull the node columns straight out of a polars frame, without materializing per-row dicts.
+        """
+        return (
+            dataframe['station_id'].to_list(),
+            dataframe['num_bikes_available'].to_numpy(),
+            dataframe['lat'].to_numpy(),
+            dataframe['lon'].to_numpy(),
+            dataframe['name'].to_list(),
+        )
+
     def _fill_nodes(self, dataframe: pl.DataFrame) -> None:
         """
         fills nodes (stations) with fetched information from the payload
@@ -24,25 +85,149 @@ class Graph:
             payload: dict, a json format representing the fetched data
         """
         try: 
-            for row in dataframe.to_dicts():
-                station_id = row['station_id']
-                num_bikes = row['num_bikes_available']
-                lat = row['lat']
-                lon = row['lon']
-                name = row['name']
-                self.nodes[station_id] = (num_bikes, lat, lon, name)
+            self.store.upsert(*self._columns(dataframe))
         except Exception as e:
             raise ValueError(f"Error processing dataframe: {e}") 
+        self._observed = None
         
-    def get_nodes(self) -> dict[tuple[float, float, str]]:
+    def update_nodes(self, dataframe: pl.DataFrame) -> set:
+        """
+        Refresh the graph from a new status frame while keeping the neighbor structure of a long-lived graph.
+
+        Bike counts are refreshed for every station. Neighbor lists are only dropped for stations that were added
+        or moved, and for stations whose top-k could change because a station was added, removed or moved nearby.
+
+        Args:
+            dataframe: pl.DataFrame, station status joined with station information
+
+        Returns:
+            set: station ids whose neighbor lists were invalidated
+        """
+        try:
+            ids, bikes, lat, lon, names = self._columns(dataframe)
+        except Exception as e:
+            raise ValueError(f"Error processing dataframe: {e}")
+
+        # counts are overwritten, so any standing incremental plan no longer matches the nodes
+        self._observed = None
+
+        store = self.store
+        positions = np.fromiter((store.index.get(node_id, -1) for node_id in ids), dtype=np.int64, count=len(ids))
+        known = positions >= 0
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        moved_mask = known.copy()
+        moved_mask[known] = (store.lat[positions[known]] != lat[known]) | (store.lon[positions[known]] != lon[known])
+
+        added = [ids[row] for row in np.flatnonzero(~known)]
+        moved = [ids[row] for row in np.flatnonzero(moved_mask)]
+        removed = []
+        if known.sum() != len(store) or len(ids) != len(set(ids)):
+            incoming = set(ids)
+            removed = [node_id for node_id in store.ids if node_id not in incoming]
+
+        if not (removed or added or moved) and len(ids) == len(store):
+            # the common tick: same stations in the same place, only counts changed
+            store.bikes[positions] = bikes
+            for position, name in zip(positions, names):
+                store.names[position] = name
+            return set()
+
+        store.load(ids, bikes, lat, lon, names)
+        for node_id in removed:
+            self.top_k_neighbors.pop(node_id, None)
+
+        gone = set(removed) | set(moved)
+        invalidated = set(added) | set(moved)
+        invalidated.update(
+            node_id for node_id, neighbors in self.top_k_neighbors.items()
+            if any(neighbor_id in gone for _, neighbor_id in neighbors)
+        )
+
+        # a station that appears (or lands) closer than a cached k-th neighbor pushes its way into that top-k list
+        cached = [node_id for node_id in self.top_k_neighbors if node_id not in invalidated]
+        if cached:
+            cached_positions = [store.index[node_id] for node_id in cached]
+            cached_lat = store.lat[cached_positions]
+            cached_lon = store.lon[cached_positions]
+            kth = np.array([
+                self.top_k_neighbors[node_id][-1][0] if len(self.top_k_neighbors[node_id]) >= self.k else np.inf
+                for node_id in cached
+            ])
+            entered = np.zeros(len(cached), dtype=bool)
+            for node_id in set(added) | set(moved):
+                position = store.index[node_id]
+                entered |= self._distance(cached_lat, cached_lon, store.lat[position], store.lon[position]) <= kth
+            invalidated.update(node_id for node_id, hit in zip(cached, entered) if hit)
+
+        for node_id in invalidated:
+            self.top_k_neighbors.pop(node_id, None)
+        return invalidated
+
+    def get_nodes(self) -> NodeView:
         """
         Retrieve all nodes with their details.
 
         Returns:
-            dict[tuple[float, float, str]]: A dictionary where the key is the station_id and the value is a tuple containing latitude, longitude, and name of the station.
+            NodeView: A dict view where the key is the station_id and the value is a tuple containing number of bikes, latitude, longitude, and name of the station.
         """
         return self.nodes
 
+    def write_back(self, dataframe: pl.DataFrame) -> pl.DataFrame:
+        """
+        Write the graph's (rebalanced) bike counts back into a station frame in one vectorized pass.
+
+        Counts are looked up by station_id through a single hash map, stations the graph does not know keep their
+        original num_bikes_available, and the frame keeps its row order and schema.
+
+        Args:
+            dataframe: pl.DataFrame, station frame with station_id and num_bikes_available columns
+
+        Returns:
+            pl.DataFrame: a copy of dataframe with num_bikes_available replaced by the graph's counts
+        """
+        dtype = dataframe.schema["num_bikes_available"]
+        return dataframe.with_columns(
+            pl.col("station_id").replace_strict(
+                pl.Series(self.store.ids, dtype=dataframe.schema["station_id"]),
+                pl.Series(self.store.bikes),
+                default=pl.col("num_bikes_available"),
+                return_dtype=dtype,
+            ).alias("num_bikes_available")
+        )
+
+    def get_spatial_index(self, metric: str = None) -> SpatialIndex:
+        """
+        Build (or reuse) the spatial index over the current station coordinates.
+
+        Args:
+            metric: str, distance metric of the index, the graph's metric by default
+
+        Returns:
+            SpatialIndex: grid index over every node
+        """
+        metric = metric if metric is not None else self.metric
+        version, index = self._spatial_indexes.get(metric, (-1, None))
+        if index is None or version != self.store.geometry_version:
+            index = SpatialIndex(self.store.ids, self.store.lat, self.store.lon, metric=metric)
+            self._spatial_indexes[metric] = (self.store.geometry_version, index)
+        return index
+
+    def stations_within(self, lat, lon, radius: float, metric: str = "haversine") -> list[list[tuple[float, object]]]:
+        """
+        Find the stations within radius of arbitrary points, e.g. geocoded service alerts.
+
+        Args:
+            lat: array-like of float, query latitudes
+            lon: array-like of float, query longitudes
+            radius: float, search radius in the metric's units (kilometers for haversine, degrees for l1)
+            metric: str, distance metric of the search, independent of the graph's neighbor metric
+
+        Returns:
+            list of (distance, station_id) lists aligned with the queries, sorted by distance
+        """
+        return self.get_spatial_index(metric).query_radius(lat, lon, radius)
+
     def get_top_k_neighbors(self, target_node_id: int) -> list:
         """
         Args:
@@ -59,13 +244,17 @@ class Graph:
         Args:
             target_node_id: The identifier of the target node for which to find the top k neighbors.
         """
+        if self.use_spatial_index and target_node_id in self.nodes:
+            index = self.get_spatial_index()
+            self.top_k_neighbors[target_node_id] = index.query(self.k, rows=[self.store.index[target_node_id]])[0]
+            return
+
         distances_heap = [] 
         target_lat, target_lon = map(float, self.nodes[target_node_id][1:3])
-        for node_id in self.nodes:
+        for node_id, node_lat, node_lon in zip(self.store.ids, self.store.lat.tolist(), self.store.lon.tolist()):
             if node_id == target_node_id:
                 continue
-            node_lat, node_lon = map(float, self.nodes[node_id][1:3])
-            distance = abs(target_lat - node_lat) + abs(target_lon - node_lon)
+            distance = self._distance(target_lat, target_lon, node_lat, node_lon)
             if len(distances_heap) < self.k:
                 heappush(distances_heap, (-distance, node_id))
             else:
@@ -89,55 +278,205 @@ class Graph:
     def set_top_k_distances(self) -> None:
         """
         Compute and set the top k distances for all nodes in the graph.
+
+        With the spatial index enabled every query is answered in one batched call instead of a scan per station.
         """
+        if self.use_spatial_index:
+            index = self.get_spatial_index()
+            for node_id, neighbors in zip(index.ids, index.query(self.k)):
+                self.top_k_neighbors[node_id] = neighbors
+            return
+
         for target_node_id in self.nodes:
             self.set_top_k_neighbors(target_node_id)
+
+    def refresh_top_k_distances(self) -> None:
+        """
+        Compute the top k distances only for nodes without a cached neighbor list, e.g. after update_nodes invalidated them.
+        """
+        missing = [node_id for node_id in self.nodes if node_id not in self.top_k_neighbors]
+        if not missing:
+            return
+        if self.use_spatial_index:
+            index = self.get_spatial_index()
+            rows = [self.store.index[node_id] for node_id in missing]
+            for node_id, neighbors in zip(missing, index.query(self.k, rows=rows)):
+                self.top_k_neighbors[node_id] = neighbors
+            return
+
+        for target_node_id in missing:
+            self.set_top_k_neighbors(target_node_id)
             
     def _transfer_objects(self, start_node_id: int, target_node_id: int, num_bikes: int) -> None:
         """
-        Moves a specified number of objects from the start node to the target node. This operation decreases the object count at the start node and increases it at the target node by the same amount.
+        Moves a specified number of objects from the start node to the target node. This operation decreases the object count at the start node and increases it at the target node by the same amount, in place in the node store.
 
         Args:
             start_node_id: int, the identifier of the node from which objects are moved
             target_node_id: int, the identifier of the node to which objects are moved
             num_bikes: int, number of bikes to transfer
         """
-        start_bikes, start_lat, start_lon, start_name = self.nodes[start_node_id]
-        target_bikes, target_lat, target_lon, target_name = self.nodes[target_node_id]
-        
-        updated_start_bikes = start_bikes - num_bikes
-        updated_target_bikes = target_bikes + num_bikes
+        self.store.transfer(self.store.index[start_node_id], self.store.index[target_node_id], num_bikes)
 
-        self.nodes[start_node_id] = (updated_start_bikes, start_lat, start_lon, start_name)
-        self.nodes[target_node_id] = (updated_target_bikes, target_lat, target_lon, target_name)
-
-    def rebalance_stations(self, min_bikes: int, max_bikes: int):
+    def rebalance_stations(self, min_bikes, max_bikes, engine: RebalancingEngine = None) -> list[Transfer]:
         """
         Rebalance the bike stations to ensure all stations have bikes within the specified range.
 
         This method identifies stations that are understocked (below min_bikes) and overstocked (above max_bikes).
-        It then attempts to rebalance the bikes by transferring bikes from overstocked to understocked stations,
-        prioritizing transfers from the closest overstocked neighbors.
+        It then attempts to rebalance the bikes by transferring bikes from overstocked to understocked stations.
+        The default greedy engine prioritizes transfers from the closest overstocked neighbors and reuses cached
+        neighbor lists, so only stations without one are scanned; MinCostFlowEngine solves the same bounds optimally.
+
+        Args:
+            min_bikes: int, the minimum number of bikes that each station should have, or an array with one bound
+                per station, aligned with self.store.ids (see DemandForecast.targets).
+            max_bikes: int, the maximum number of bikes that each station should have, or an array like min_bikes.
+            engine: RebalancingEngine, strategy that plans the transfers, GreedyEngine by default.
+
+        Returns:
+            list[Transfer]: the transfer plan that was applied to the nodes
+        """
+        engine = engine if engine is not None else GreedyEngine()
+        transfers = engine.plan(self, min_bikes, max_bikes)
+        for transfer in transfers:
+            self._transfer_objects(transfer.source, transfer.target, transfer.num_bikes)
+        return transfers
+
+    def _record_transfer(self, source_id, target_id, num_bikes: int) -> None:
+        self._incoming[target_id][source_id] = self._incoming[target_id].get(source_id, 0) + num_bikes
+        self._outgoing[source_id][target_id] = self._outgoing[source_id].get(target_id, 0) + num_bikes
+
+    def _undo_transfer(self, source_id, target_id) -> None:
+        num_bikes = self._incoming[target_id].pop(source_id)
+        del self._outgoing[source_id][target_id]
+        self._transfer_objects(target_id, source_id, num_bikes)
+
+    def _get_reverse_neighbors(self) -> dict:
+        """
+        Map every station to the stations that list it among their top-k neighbors.
+        """
+        if self._reverse_neighbors is None:
+            self._reverse_neighbors = defaultdict(set)
+            for node_id, neighbors in self.top_k_neighbors.items():
+                for _, neighbor_id in neighbors:
+                    self._reverse_neighbors[neighbor_id].add(node_id)
+        return self._reverse_neighbors
+
+    def _store_bounds(self, dataframe: pl.DataFrame, bound):
+        """
+        Move per-row bounds of a status frame onto the node store's positions; an int applies to every station.
+        """
+        if np.ndim(bound) == 0:
+            return bound
+        store = self.store
+        ids = dataframe["station_id"].to_list()
+        positions = np.fromiter((store.index[node_id] for node_id in ids), dtype=np.int64, count=len(ids))
+        aligned = np.zeros(len(store), dtype=np.int64)
+        aligned[positions] = bound
+        return aligned
+
+    def _rebalance_full(self, dataframe: pl.DataFrame, min_bikes, max_bikes, engine: RebalancingEngine = None) -> list[Transfer]:
+        self.update_nodes(dataframe)
+        self.refresh_top_k_distances()
+        min_bikes = self._store_bounds(dataframe, min_bikes)
+        max_bikes = self._store_bounds(dataframe, max_bikes)
+        self._observed = self.store.bikes.copy()
+        self._plan_bounds = (min_bikes, max_bikes)
+        self._incoming = defaultdict(dict)
+        self._outgoing = defaultdict(dict)
+        self._reverse_neighbors = None
+
+        transfers = self.rebalance_stations(min_bikes, max_bikes, engine)
+        for transfer in transfers:
+            self._record_transfer(transfer.source, transfer.target, transfer.num_bikes)
+        return transfers
+
+    def rebalance_incremental(
+        self, previous: pl.DataFrame, current: pl.DataFrame, min_bikes, max_bikes, engine: RebalancingEngine = None
+    ) -> list[Transfer]:
+        """
+        Incremental rebalance_stations for a long-lived graph fed consecutive get_station_status() frames.
+
+        The graph keeps the greedy plan of earlier ticks. Only the neighborhoods of stations whose counts changed are
+        replanned: their transfers are undone, and the affected understocked stations are refilled from their closest
+        overstocked neighbors, so a tick costs time in proportion to the changed stations rather than the network.
+        The first frame, changed bounds, or stations being added, removed or moved fall back to a full recompute, so
+        per-station bounds should only change now and then (DemandForecast.targets changes them once an hour).
 
         Args:
-            min_bikes: int, the minimum number of bikes that each station should have.
-            max_bikes: int, the maximum number of bikes that each station should have.
-        """
-        understocked = {id: node for id, node in self.nodes.items() if node[0] < min_bikes}
-        overstocked = {id: node for id, node in self.nodes.items() if node[0] > max_bikes}
-
-        for under_id, under_node in understocked.items():
-            self.set_top_k_neighbors(under_id)
-            neighbors = self.top_k_neighbors[under_id]
-            for _, over_id in neighbors:
-                if over_id in overstocked:
-                    needed = min_bikes - under_node[0]
-                    available = overstocked[over_id][0] - max_bikes
-                    transfer_amount = min(needed, available)
-
-                    if transfer_amount > 0:
-                        self._transfer_objects(over_id, under_id, transfer_amount)
-                        under_node = (under_node[0] + transfer_amount, under_node[1], under_node[2], under_node[3])
-                        overstocked[over_id] = (overstocked[over_id][0] - transfer_amount, overstocked[over_id][1], overstocked[over_id][2], overstocked[over_id][3])
-                    if under_node[0] >= min_bikes:
-                        break
+            previous: pl.DataFrame, the status frame of the previous tick, or None on the first tick
+            current: pl.DataFrame, the status frame of this tick
+            min_bikes: int, the minimum number of bikes that each station should have, or an array with one bound
+                per row of current.
+            max_bikes: int, the maximum number of bikes that each station should have, or an array like min_bikes.
+            engine: RebalancingEngine, strategy that plans the full recomputes, GreedyEngine by default; the ticks in
+                between always refill the replanned stations greedily from their top-k neighbors.
+
+        Returns:
+            list[Transfer]: the transfers added this tick (the whole plan after a full recompute)
+        """
+        if previous is None or self._observed is None:
+            return self._rebalance_full(current, min_bikes, max_bikes, engine)
+        delta = diff_station_status(previous, current)
+        if delta.geometry_changed:
+            return self._rebalance_full(current, min_bikes, max_bikes, engine)
+        # the stations are the ones already in the store, so per-row bounds can be aligned before updating it
+        bounds = (self._store_bounds(current, min_bikes), self._store_bounds(current, max_bikes))
+        if not all(np.array_equal(bound, planned) for bound, planned in zip(bounds, self._plan_bounds)):
+            return self._rebalance_full(current, min_bikes, max_bikes, engine)
+        if delta.changed.is_empty():
+            return []
+
+        store = self.store
+        min_bikes = station_bounds(bounds[0], len(store))
+        max_bikes = station_bounds(bounds[1], len(store))
+        changed_ids = delta.changed["station_id"].to_list()
+        counts = delta.changed["num_bikes_available"].to_numpy().astype(np.int64)
+        positions = np.fromiter((store.index[node_id] for node_id in changed_ids), dtype=np.int64, count=len(changed_ids))
+        store.bikes[positions] += counts - self._observed[positions]
+        self._observed[positions] = counts
+        reverse_neighbors = self._get_reverse_neighbors()
+
+        # understocked stations whose fill depends on a changed station are replanned from scratch
+        replan = set()
+        for node_id in changed_ids:
+            if self._incoming.get(node_id):
+                replan.add(node_id)
+            replan.update(self._outgoing.get(node_id, ()))
+        freed = set(changed_ids)
+        for node_id in changed_ids:
+            for target_id in list(self._outgoing.get(node_id, ())):
+                self._undo_transfer(node_id, target_id)
+        for target_id in replan:
+            for source_id in list(self._incoming.get(target_id, ())):
+                freed.add(source_id)
+                self._undo_transfer(source_id, target_id)
+
+        # stations with spare bikes again can top up understocked stations that list them as neighbors
+        candidates = replan | set(changed_ids)
+        for source_id in freed:
+            if store.bikes[store.index[source_id]] > max_bikes[store.index[source_id]]:
+                candidates.update(reverse_neighbors.get(source_id, ()))
+
+        transfers = []
+        for under_position in sorted(store.index[node_id] for node_id in candidates):
+            if self._observed[under_position] >= min_bikes[under_position] or store.bikes[under_position] >= min_bikes[under_position]:
+                continue
+            under_id = store.ids[under_position]
+            if under_id not in self.top_k_neighbors:
+                self.set_top_k_neighbors(under_id)
+            for distance, over_id in self.top_k_neighbors[under_id]:
+                over_position = store.index[over_id]
+                if self._observed[over_position] <= max_bikes[over_position]:
+                    continue
+                transfer_amount = min(
+                    int(min_bikes[under_position]) - int(store.bikes[under_position]),
+                    int(store.bikes[over_position]) - int(max_bikes[over_position]),
+                )
+                if transfer_amount > 0:
+                    self._transfer_objects(over_id, under_id, transfer_amount)
+                    self._record_transfer(over_id, under_id, transfer_amount)
+                    transfers.append(Transfer(over_id, under_id, transfer_amount, distance))
+                if store.bikes[under_position] >= min_bikes[under_position]:
+                    break
+        return transfers
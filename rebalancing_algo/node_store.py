@@ -0,0 +1,189 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+
+DEFAULT_NODE = (0, 0, 0, "")
+
+
+class NodeStore:
+    """
+    Columnar storage for station nodes: a station_id -> row index map plus contiguous arrays for bikes, lat and lon
+    """
+    def __init__(self) -> None:
+        self.ids = []
+        self.index = {}
+        self.names = []
+        self._bikes = np.zeros(0, dtype=np.int64)
+        self._lat = np.zeros(0, dtype=np.float64)
+        self._lon = np.zeros(0, dtype=np.float64)
+
+        # bumped whenever stations are added, removed or moved, so derived structures know when to rebuild
+        self.geometry_version = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, station_id) -> bool:
+        return station_id in self.index
+
+    @property
+    def bikes(self) -> np.ndarray:
+        return self._bikes[:len(self.ids)]
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self._lat[:len(self.ids)]
+
+    @property
+    def lon(self) -> np.ndarray:
+        return self._lon[:len(self.ids)]
+
+    def _reserve(self, size: int) -> None:
+        """
+        Grow the backing arrays (amortized doubling) so they can hold at least size rows.
+        """
+        if size <= len(self._bikes):
+            return
+        capacity = max(size, 2 * len(self._bikes), 16)
+        for name in ("_bikes", "_lat", "_lon"):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def load(self, station_ids: list, bikes, lat, lon, names: list) -> None:
+        """
+        Replace the whole store with the given columns.
+
+        Args:
+            station_ids: list, station identifiers, one per row
+            bikes: array-like of int, number of bikes available per station
+            lat: array-like of float, station latitudes
+            lon: array-like of float, station longitudes
+            names: list, station names
+        """
+        self.ids = list(station_ids)
+        self.index = dict(zip(self.ids, range(len(self.ids))))
+        if len(self.index) != len(self.ids):
+            # duplicated station ids keep their last row, like repeated dict assignment would
+            self.ids = list(self.index)
+            last = np.fromiter(self.index.values(), dtype=np.int64, count=len(self.index))
+            self.index = dict(zip(self.ids, range(len(self.ids))))
+            bikes, lat, lon = np.asarray(bikes)[last], np.asarray(lat)[last], np.asarray(lon)[last]
+            names = [names[position] for position in last]
+        self._bikes = np.array(bikes, dtype=np.int64)
+        self._lat = np.array(lat, dtype=np.float64)
+        self._lon = np.array(lon, dtype=np.float64)
+        self.names = list(names)
+        self.geometry_version += 1
+
+    def upsert(self, station_ids: list, bikes, lat, lon, names: list) -> None:
+        """
+        Insert new stations and overwrite existing ones from the given columns.
+
+        Args:
+            station_ids: list, station identifiers, one per row
+            bikes: array-like of int, number of bikes available per station
+            lat: array-like of float, station latitudes
+            lon: array-like of float, station longitudes
+            names: list, station names
+        """
+        if not self.ids:
+            self.load(station_ids, bikes, lat, lon, names)
+            return
+
+        before = len(self.ids)
+        positions = np.empty(len(station_ids), dtype=np.int64)
+        for row, station_id in enumerate(station_ids):
+            position = self.index.get(station_id)
+            if position is None:
+                position = len(self.ids)
+                self.index[station_id] = position
+                self.ids.append(station_id)
+                self.names.append("")
+            positions[row] = position
+        self._reserve(len(self.ids))
+
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        moved = np.any(self._lat[positions] != lat) or np.any(self._lon[positions] != lon)
+        self._bikes[positions] = bikes
+        self._lat[positions] = lat
+        self._lon[positions] = lon
+        for position, name in zip(positions, names):
+            self.names[position] = name
+        if moved or len(self.ids) > before:
+            self.geometry_version += 1
+
+    def set(self, station_id, num_bikes: int, lat: float, lon: float, name: str) -> None:
+        """
+        Insert or overwrite a single station.
+        """
+        self.upsert([station_id], [num_bikes], [lat], [lon], [name])
+
+    def remove(self, station_ids) -> None:
+        """
+        Remove stations and compact the arrays.
+        """
+        drop = {self.index[station_id] for station_id in station_ids if station_id in self.index}
+        if not drop:
+            return
+        keep = np.array([position for position in range(len(self.ids)) if position not in drop], dtype=np.int64)
+        self.load(
+            [self.ids[position] for position in keep],
+            self.bikes[keep],
+            self.lat[keep],
+            self.lon[keep],
+            [self.names[position] for position in keep],
+        )
+
+    def row(self, position: int) -> tuple:
+        """
+        Returns:
+            tuple: (num_bikes, lat, lon, name) for the station stored at position
+        """
+        return (int(self._bikes[position]), float(self._lat[position]), float(self._lon[position]), self.names[position])
+
+    def transfer(self, start_position: int, target_position: int, num_bikes: int) -> None:
+        """
+        Move bikes between two stored stations in place.
+        """
+        self._bikes[start_position] -= num_bikes
+        self._bikes[target_position] += num_bikes
+
+
+class NodeView(MutableMapping):
+    """
+    Dict view over a NodeStore, mapping station_id -> (num_bikes, lat, lon, name) like the original nodes defaultdict
+    """
+    def __init__(self, store: NodeStore) -> None:
+        self._store = store
+
+    def __getitem__(self, station_id) -> tuple:
+        position = self._store.index.get(station_id)
+        if position is None:
+            return DEFAULT_NODE
+        return self._store.row(position)
+
+    def __setitem__(self, station_id, node: tuple) -> None:
+        self._store.set(station_id, *node)
+
+    def __delitem__(self, station_id) -> None:
+        if station_id not in self._store:
+            raise KeyError(station_id)
+        self._store.remove([station_id])
+
+    def __contains__(self, station_id) -> bool:
+        return station_id in self._store
+
+    def __iter__(self):
+        return iter(list(self._store.ids))
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def get(self, station_id, default=None):
+        return self[station_id] if station_id in self._store else default
+
+    def __repr__(self) -> str:
+        return f"NodeView({dict(self.items())})"
@@ -0,0 +1,379 @@
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import numpy as np
+import polars as pl
+
+from rebalancing_algo.engines import GreedyEngine, RebalancingEngine, Transfer, station_bounds
+from rebalancing_algo.graph import Graph
+
+logger = logging.getLogger(__name__)
+
+# the columns a Graph reads, the only ones shipped to the worker processes
+GRAPH_COLUMNS = ["station_id", "num_bikes_available", "lat", "lon", "name"]
+
+KM_PER_DEGREE = 111.32
+
+
+def _spawn_pool(processes: int) -> ProcessPoolExecutor:
+    # spawned rather than forked: the csp engine, feed and perspective threads must not be copied
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+class _Partition:
+    """
+    Long-lived Graph of one partition and the frame of its previous tick, for Graph.rebalance_incremental
+    """
+    def __init__(self, top_k: int, metric: str, use_spatial_index: bool, engine: Optional[RebalancingEngine] = None) -> None:
+        self.graph = Graph(top_k, metric, use_spatial_index)
+        self.engine = engine
+        self.previous = None
+
+    def rebalance(self, frame: pl.DataFrame, min_bikes, max_bikes) -> tuple[np.ndarray, list[Transfer]]:
+        transfers = self.graph.rebalance_incremental(self.previous, frame, min_bikes, max_bikes, self.engine)
+        self.previous = frame
+        return self.graph.write_back(frame)["num_bikes_available"].to_numpy(), transfers
+
+
+# partitions living in this process, when it is one of a PartitionedRebalancer's workers
+_worker_partitions = {}
+
+
+def _rebalance_in_worker(key, frame: pl.DataFrame, min_bikes, max_bikes, options: tuple) -> tuple[np.ndarray, list[Transfer]]:
+    partition = _worker_partitions.get(key)
+    if partition is None:
+        partition = _worker_partitions[key] = _Partition(*options)
+    return partition.rebalance(frame, min_bikes, max_bikes)
+
+
+class PartitionedRebalancer:
+    """
+    Incremental rebalancing of a station frame split into independent partitions, e.g. one per GBFS system
+
+    Each partition has its own long-lived Graph, pinned to one worker process for its whole life so its neighbor
+    lists and standing plan stay warm between ticks. A tick ships every partition's stations to its worker at once
+    and waits for all of them, so it takes as long as the slowest partition instead of the sum of all of them.
+    Transfers never cross partitions.
+    """
+    def __init__(
+        self,
+        partition_column: str = "system_id",
+        top_k: int = 8,
+        metric: str = "l1",
+        use_spatial_index: bool = True,
+        processes: Optional[int] = None,
+        engine: Optional[RebalancingEngine] = None,
+    ) -> None:
+        """
+        Args:
+            partition_column: str, column naming the partition of every station, a frame without it is one partition
+            top_k: int, number of closest neighbors kept for every station
+            metric: str, distance between stations, see Graph
+            use_spatial_index: bool, see Graph
+            processes: int, worker processes the partitions are spread over, one per core by default; 0 rebalances
+                every partition in the calling thread
+            engine: RebalancingEngine planning the full recomputes of every partition, e.g. a PartitionedEngine
+                tiling a large system, GreedyEngine by default; worker processes get a copy each, so it should not
+                start processes of its own then
+        """
+        self.partition_column = partition_column
+        self.engine = engine
+        self.options = (top_k, metric, use_spatial_index, engine)
+        self.processes = processes if processes is not None else os.cpu_count() or 1
+        # every station of all partitions, for spatial queries such as stations_near_alerts; it is never rebalanced
+        self.graph = Graph(top_k, metric, use_spatial_index=True)
+        # transfers each partition added on the last tick
+        self.transfers = {}
+
+        self._local = {}
+        self._workers = []
+        # partition -> index of the worker holding its Graph
+        self._assigned = {}
+
+    def _worker(self, key) -> int:
+        worker = self._assigned.get(key)
+        if worker is None:
+            worker = self._assigned[key] = len(self._assigned) % self.processes
+            while len(self._workers) <= worker:
+                self._workers.append(_spawn_pool(1))
+        return worker
+
+    def _restart(self, worker: int) -> None:
+        logger.warning(f"Rebalancing worker {worker} died, its partitions are rebuilt from scratch")
+        self._workers[worker].shutdown(wait=False, cancel_futures=True)
+        self._workers[worker] = _spawn_pool(1)
+
+    def partitions(self, dataframe: pl.DataFrame) -> dict:
+        """
+        Row positions of every partition of dataframe, in order of first appearance.
+        """
+        if self.partition_column not in dataframe.columns:
+            return {None: np.arange(len(dataframe))}
+        groups = dataframe.select(
+            pl.col(self.partition_column).alias("partition"), pl.int_range(pl.len(), dtype=pl.Int64).alias("row")
+        ).group_by("partition", maintain_order=True).agg("row")
+        return {key: rows.to_numpy() for key, rows in zip(groups["partition"].to_list(), groups["row"])}
+
+    def rebalance(self, dataframe: pl.DataFrame, min_bikes, max_bikes) -> pl.DataFrame:
+        """
+        Rebalance every partition of a status frame and write the counts back, like Graph.rebalance_incremental
+        followed by Graph.write_back. Station ids must be unique across partitions, a ValueError is raised otherwise.
+
+        Args:
+            dataframe: pl.DataFrame, station status joined with station information, with the partition column
+            min_bikes: int, or an array with one bound per row of dataframe
+            max_bikes: int, or an array like min_bikes
+
+        Returns:
+            pl.DataFrame: dataframe with num_bikes_available replaced by the rebalanced counts, in the same row order
+        """
+        duplicated = dataframe.filter(pl.col("station_id").is_duplicated())["station_id"]
+        if len(duplicated):
+            raise ValueError(f"station_id must be unique across partitions, {duplicated.n_unique()} repeat, e.g. {duplicated[0]!r}")
+        self.graph.update_nodes(dataframe)
+        columns = dataframe.select(GRAPH_COLUMNS)
+        parts = {}
+        for key, rows in self.partitions(dataframe).items():
+            part_bounds = tuple(bound if np.ndim(bound) == 0 else np.asarray(bound)[rows] for bound in (min_bikes, max_bikes))
+            parts[key] = (rows, columns[rows], part_bounds)
+
+        if self.processes == 0:
+            results = {}
+            for key, (rows, frame, bounds) in parts.items():
+                partition = self._local.get(key)
+                if partition is None:
+                    partition = self._local[key] = _Partition(*self.options)
+                results[key] = partition.rebalance(frame, *bounds)
+        else:
+            futures = {
+                key: self._workers[self._worker(key)].submit(_rebalance_in_worker, key, frame, *bounds, self.options)
+                for key, (rows, frame, bounds) in parts.items()
+            }
+            results = {}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except BrokenProcessPool:
+                    worker = self._assigned[key]
+                    self._restart(worker)
+                    rows, frame, bounds = parts[key]
+                    results[key] = self._workers[worker].submit(_rebalance_in_worker, key, frame, *bounds, self.options).result()
+
+        dtype = dataframe.schema["num_bikes_available"]
+        bikes = dataframe["num_bikes_available"].to_numpy().copy()
+        for key, (counts, transfers) in results.items():
+            bikes[parts[key][0]] = counts
+            self.transfers[key] = transfers
+        return dataframe.with_columns(pl.Series("num_bikes_available", bikes, dtype=dtype))
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.shutdown(wait=True, cancel_futures=True)
+        self._workers = []
+        self._assigned = {}
+        if self.engine is not None:
+            self.engine.close()
+
+
+def tile_labels(lat: np.ndarray, lon: np.ndarray, tile_km: float) -> np.ndarray:
+    """
+    Partition label of every station when the map is cut into square tiles of tile_km, numbered from 0.
+    """
+    lat_step = tile_km / KM_PER_DEGREE
+    lon_step = lat_step / max(math.cos(math.radians(float(np.mean(lat)))), 0.1)
+    tiles = np.stack([np.floor(lat / lat_step), np.floor(lon / lon_step)], axis=1)
+    return np.unique(tiles, axis=0, return_inverse=True)[1].reshape(-1)
+
+
+def with_halos(lat: np.ndarray, lon: np.ndarray, labels: np.ndarray, halo_km: float) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Split stations into partitions, each with the halo of other partitions' stations around it.
+
+    Args:
+        lat: np.ndarray, latitude of every station
+        lon: np.ndarray, longitude of every station
+        labels: np.ndarray, partition of every station, from 0
+        halo_km: float, how far beyond its bounding box a partition sees its neighbors' stations
+
+    Returns:
+        list of (core, halo): positions of the partition's own stations and of the stations in its halo
+    """
+    if len(labels) == 0:
+        return []
+    dlat = halo_km / KM_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(float(np.mean(lat)))), 0.1)
+    by_lat = np.argsort(lat, kind="stable")
+    sorted_lat = lat[by_lat]
+    by_label = np.argsort(labels, kind="stable")
+    splits = np.flatnonzero(np.diff(labels[by_label])) + 1
+
+    partitions = []
+    for core in np.split(by_label, splits):
+        low = np.searchsorted(sorted_lat, lat[core].min() - dlat, side="left")
+        high = np.searchsorted(sorted_lat, lat[core].max() + dlat, side="right")
+        candidates = by_lat[low:high]
+        inside = (lon[candidates] >= lon[core].min() - dlon) & (lon[candidates] <= lon[core].max() + dlon)
+        halo = candidates[inside & (labels[candidates] != labels[core[0]])]
+        partitions.append((core, np.sort(halo)))
+    return partitions
+
+
+def _plan_partition(counts: np.ndarray, coords: np.ndarray, positions: np.ndarray, core_size: int, options: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Plan one partition; halo stations can give bikes but are never filled.
+
+    Args:
+        counts: np.ndarray, bikes, min_bikes and max_bikes rows of the partition's stations
+        coords: np.ndarray, lat and lon rows of the partition's stations
+        positions: np.ndarray, global position of every column, the core stations first and then the halo
+        core_size: int, number of core stations
+        options: tuple, (top_k, metric, engine)
+
+    Returns:
+        (np.ndarray, np.ndarray): (source, target, num_bikes) rows in global station positions, and their distances
+    """
+    top_k, metric, engine = options
+    min_bikes = counts[1].copy()
+    min_bikes[core_size:] = 0
+    graph = Graph(top_k, metric, use_spatial_index=True)
+    graph.store.load(positions.tolist(), counts[0], coords[0], coords[1], [""] * len(positions))
+    if isinstance(engine, GreedyEngine):
+        # only understocked core stations look for neighbors, in one batched query
+        under = np.flatnonzero(counts[0, :core_size] < min_bikes[:core_size])
+        for row, neighbors in zip(under.tolist(), graph.get_spatial_index().query(top_k, rows=under)):
+            graph.top_k_neighbors[graph.store.ids[row]] = neighbors
+
+    transfers = engine.plan(graph, min_bikes, counts[2])
+    moves = np.array([(transfer.source, transfer.target, transfer.num_bikes) for transfer in transfers], dtype=np.int64)
+    return moves.reshape(-1, 3), np.array([transfer.distance for transfer in transfers], dtype=np.float64)
+
+
+def _shared_views(buffer, size: int) -> tuple[np.ndarray, np.ndarray]:
+    # bikes, min_bikes and max_bikes as int64 rows, then lat and lon as float64 rows
+    counts = np.ndarray((3, size), dtype=np.int64, buffer=buffer)
+    coords = np.ndarray((2, size), dtype=np.float64, buffer=buffer, offset=counts.nbytes)
+    return counts, coords
+
+
+def _plan_in_worker(name: str, size: int, positions: np.ndarray, core_size: int, options: tuple) -> tuple[np.ndarray, np.ndarray]:
+    shared = SharedMemory(name=name)
+    try:
+        counts, coords = _shared_views(shared.buf, size)
+        # only the partition's columns are copied out of the shared block
+        counts, coords = counts[:, positions], coords[:, positions]
+    finally:
+        shared.close()
+    return _plan_partition(counts, coords, positions, core_size, options)
+
+
+class PartitionedEngine(RebalancingEngine):
+    """
+    Plans a Graph in parallel: stations are cut into regions or square tiles, each planned in a worker process
+
+    Every partition also sees a halo of its neighbors' stations within halo_km, which it may draw surplus bikes from,
+    so stations near a boundary are still refilled across it. The station arrays are handed to the workers in one
+    shared memory block rather than pickled per partition. The partition plans are merged closest transfer first,
+    each clipped to what its source can still give, since two partitions may have counted on the same halo station.
+    A station whose halo source was claimed by a neighbor is left short rather than replanned.
+    """
+    name = "partitioned"
+
+    def __init__(
+        self,
+        engine: RebalancingEngine = None,
+        regions: Optional[dict] = None,
+        tile_km: float = 4.0,
+        halo_km: float = 1.0,
+        processes: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            engine: RebalancingEngine planning every partition, GreedyEngine by default
+            regions: dict, station_id -> region_id (the GBFS region_id column); stations are tiled when None
+            tile_km: float, side of the square tiles, when no regions are given
+            halo_km: float, distance beyond a partition within which its neighbors' stations can give it bikes
+            processes: int, worker processes, one per core by default; 0 plans the partitions in the calling thread
+        """
+        self.engine = engine if engine is not None else GreedyEngine()
+        self.regions = regions
+        self.tile_km = tile_km
+        self.halo_km = halo_km
+        self.processes = processes if processes is not None else os.cpu_count() or 1
+        self._pool = None
+
+    def labels(self, graph) -> np.ndarray:
+        """
+        Partition of every station of graph.store.
+        """
+        store = graph.store
+        if self.regions is None:
+            return tile_labels(store.lat, store.lon, self.tile_km)
+        regions = np.array([str(self.regions.get(station_id)) for station_id in store.ids])
+        return np.unique(regions, return_inverse=True)[1].reshape(-1)
+
+    def plan(self, graph, min_bikes, max_bikes) -> list[Transfer]:
+        store = graph.store
+        size = len(store)
+        if size == 0:
+            return []
+        partitions = with_halos(store.lat, store.lon, self.labels(graph), self.halo_km)
+        options = (graph.k, graph.metric, self.engine)
+
+        if self.processes == 0:
+            counts = np.stack([store.bikes, station_bounds(min_bikes, size), station_bounds(max_bikes, size)])
+            coords = np.stack([store.lat, store.lon])
+            plans = []
+            for core, halo in partitions:
+                positions = np.concatenate([core, halo])
+                plans.append(_plan_partition(counts[:, positions], coords[:, positions], positions, len(core), options))
+        else:
+            if self._pool is None:
+                self._pool = _spawn_pool(self.processes)
+            shared = SharedMemory(create=True, size=size * 5 * 8)
+            try:
+                counts, coords = _shared_views(shared.buf, size)
+                counts[0] = store.bikes
+                counts[1] = station_bounds(min_bikes, size)
+                counts[2] = station_bounds(max_bikes, size)
+                coords[0] = store.lat
+                coords[1] = store.lon
+                del counts, coords
+                futures = [
+                    self._pool.submit(_plan_in_worker, shared.name, size, np.concatenate([core, halo]), len(core), options)
+                    for core, halo in partitions
+                ]
+                plans = [future.result() for future in futures]
+            finally:
+                shared.close()
+                shared.unlink()
+        return self._merge(store, plans, station_bounds(min_bikes, size), station_bounds(max_bikes, size))
+
+    @staticmethod
+    def _merge(store, plans: list, min_bikes: np.ndarray, max_bikes: np.ndarray) -> list[Transfer]:
+        if not plans:
+            return []
+        moves = np.concatenate([moves for moves, _ in plans])
+        distances = np.concatenate([distances for _, distances in plans])
+        surplus = np.maximum(store.bikes - max_bikes, 0)
+        deficit = np.maximum(min_bikes - store.bikes, 0)
+
+        transfers = []
+        for row in np.argsort(distances, kind="stable"):
+            source, target, num_bikes = moves[row].tolist()
+            amount = min(num_bikes, int(surplus[source]), int(deficit[target]))
+            if amount > 0:
+                surplus[source] -= amount
+                deficit[target] -= amount
+                transfers.append(Transfer(store.ids[source], store.ids[target], amount, float(distances[row])))
+        return transfers
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
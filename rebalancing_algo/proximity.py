@@ -0,0 +1,48 @@
+import polars as pl
+
+ALERT_FLAG_SCHEMA = {
+    "station_id": pl.String,
+    "alerts_nearby": pl.Int64,
+    "nearest_alert_km": pl.Float64,
+}
+
+
+def stations_near_alerts(graph, alerts: pl.DataFrame, radius_km: float = 0.5) -> pl.DataFrame:
+    """
+    Spatial join of geocoded alert locations onto the graph's stations, through the graph's haversine grid index.
+
+    Args:
+        graph: Graph, stations to flag
+        alerts: pl.DataFrame, alert locations with lat and lon columns, and optionally an alert_id column so that an
+            alert naming several nearby addresses is counted once
+        radius_km: float, stations within this distance of an alert location are affected by it
+
+    Returns:
+        pl.DataFrame: one row per affected station with station_id, the number of distinct alerts nearby and the
+        distance to the closest one in kilometers
+    """
+    if alerts.is_empty() or len(graph.store.ids) == 0:
+        return pl.DataFrame(schema=ALERT_FLAG_SCHEMA)
+
+    alert_ids = alerts["alert_id"].to_list() if "alert_id" in alerts.columns else list(range(len(alerts)))
+    matches = graph.stations_within(alerts["lat"].to_numpy(), alerts["lon"].to_numpy(), radius_km, metric="haversine")
+    pairs = pl.DataFrame(
+        [(station_id, str(alert_id), distance)
+         for alert_id, stations in zip(alert_ids, matches)
+         for distance, station_id in stations],
+        schema={"station_id": pl.String, "alert_id": pl.String, "distance": pl.Float64},
+        orient="row",
+    )
+    return pairs.group_by("station_id").agg(
+        pl.col("alert_id").n_unique().cast(pl.Int64).alias("alerts_nearby"),
+        pl.col("distance").min().alias("nearest_alert_km"),
+    ).sort("station_id")
+
+
+def with_alert_flags(dataframe: pl.DataFrame, flags: pl.DataFrame = None) -> pl.DataFrame:
+    """
+    Add the alerts_nearby and nearest_alert_km columns to a station frame, stations without alerts get 0 and null.
+    """
+    flags = flags if flags is not None else pl.DataFrame(schema=ALERT_FLAG_SCHEMA)
+    flags = flags.with_columns(pl.col("station_id").cast(dataframe.schema["station_id"]))
+    return dataframe.join(flags, on="station_id", how="left").with_columns(pl.col("alerts_nearby").fill_null(0))
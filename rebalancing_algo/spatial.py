@@ -0,0 +1,248 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+METRICS = ("l1", "haversine")
+
+
+def l1_distance(lat1, lon1, lat2, lon2):
+    """
+    Manhattan distance in degrees between two coordinates (or broadcastable arrays of coordinates).
+    """
+    return abs(lat1 - lat2) + abs(lon1 - lon2)
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in kilometers between two coordinates (or broadcastable arrays of coordinates).
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+DISTANCE_FUNCTIONS = {
+    "l1": l1_distance,
+    "haversine": haversine_distance,
+}
+
+
+class SpatialIndex:
+    """
+    Grid-bucket index over station coordinates that answers top-k nearest neighbor queries for many stations in one batched call
+    """
+    def __init__(self, ids: list, lat, lon, metric: str = "l1", bucket_size: int = 8) -> None:
+        if metric not in DISTANCE_FUNCTIONS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+
+        self.ids = list(ids)
+        self.lat = np.array(lat, dtype=np.float64)
+        self.lon = np.array(lon, dtype=np.float64)
+        self.metric = metric
+        self._distance = DISTANCE_FUNCTIONS[metric]
+
+        n = len(self.ids)
+        if n == 0:
+            self._lat_min = self._lon_min = 0.0
+            self._cell_lat = self._cell_lon = 1.0
+            self._nx = self._ny = 1
+            self._cell_of = np.zeros(0, dtype=np.int64)
+            self._order = np.zeros(0, dtype=np.int64)
+            self._cell_start = np.zeros(2, dtype=np.int64)
+            self._max_abs_lat = 0.0
+            return
+
+        self._lat_min, self._lon_min = float(self.lat.min()), float(self.lon.min())
+        lat_extent = float(self.lat.max()) - self._lat_min
+        lon_extent = float(self.lon.max()) - self._lon_min
+        self._max_abs_lat = float(np.abs(self.lat).max())
+
+        # haversine cells are made roughly square on the ground rather than in degrees
+        lon_scale = 1.0
+        if metric == "haversine":
+            lon_scale = 1.0 / max(np.cos(np.radians(min(self._max_abs_lat, 89.0))), 1e-6)
+
+        # size cells so that each one holds about bucket_size stations on average, stations on a line or all at
+        # one point get a one dimensional (or single cell) grid
+        extents = [extent for extent in (lat_extent, lon_extent / lon_scale) if extent > 0]
+        if len(extents) == 2:
+            cell = np.sqrt(extents[0] * extents[1] * bucket_size / n)
+        elif extents:
+            cell = extents[0] * bucket_size / n
+        else:
+            cell = 1.0
+        cell = max(cell, 1e-9)
+        self._cell_lat = cell
+        self._cell_lon = cell * lon_scale
+        self._nx = int(lat_extent // self._cell_lat) + 1
+        self._ny = int(lon_extent // self._cell_lon) + 1
+
+        self._cell_of = self._cells(self.lat, self.lon)
+        self._order = np.argsort(self._cell_of, kind="stable")
+        self._cell_start = np.searchsorted(self._cell_of[self._order], np.arange(self._nx * self._ny + 1))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _block(self, cx: int, cy: int, r: int) -> tuple[np.ndarray, bool]:
+        """
+        Collect the stations in the (2r + 1) x (2r + 1) block of cells centered on cell (cx, cy).
+
+        Returns:
+            the station positions in the block, and whether the block covers the whole grid
+        """
+        x0, x1 = max(cx - r, 0), min(cx + r, self._nx - 1)
+        y0, y1 = max(cy - r, 0), min(cy + r, self._ny - 1)
+        covers_grid = x0 == 0 and y0 == 0 and x1 == self._nx - 1 and y1 == self._ny - 1
+        return self._rect(x0, x1, y0, y1), covers_grid
+
+    def _rect(self, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+        """
+        Positions of the stations in the cells [x0, x1] x [y0, y1], bounds inclusive and inside the grid.
+        """
+        rows = np.arange(x0, x1 + 1) * self._ny
+        starts = self._cell_start[rows + y0]
+        ends = self._cell_start[rows + y1 + 1]
+        return np.concatenate([self._order[s:e] for s, e in zip(starts, ends)])
+
+    def _ring_lower_bound(self, r: int) -> float:
+        """
+        Lower bound on the distance from any station in the center cell to any station outside its radius-r block.
+        """
+        if self.metric == "l1":
+            return r * min(self._cell_lat, self._cell_lon)
+        lat_bound = np.radians(r * self._cell_lat)
+        lon_bound = 2 * np.sin(min(np.radians(r * self._cell_lon), np.pi) / 2) * np.cos(np.radians(self._max_abs_lat))
+        return EARTH_RADIUS_KM * min(lat_bound, lon_bound)
+
+    def _cells(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """
+        Grid cell of arbitrary coordinates, points outside the indexed area are clamped onto the border cells.
+        """
+        ix = np.clip(((lat - self._lat_min) // self._cell_lat).astype(np.int64), 0, self._nx - 1)
+        iy = np.clip(((lon - self._lon_min) // self._cell_lon).astype(np.int64), 0, self._ny - 1)
+        return ix * self._ny + iy
+
+    def _nearest(self, lat: np.ndarray, lon: np.ndarray, cells: np.ndarray, k: int, exclude=None) -> list:
+        """
+        Answer k-nearest queries cell by cell, all queries of a cell in a single distance matrix.
+
+        Args:
+            lat, lon: query coordinates
+            cells: grid cell of every query
+            k: number of neighbors, at most the number of candidate stations
+            exclude: optional station position per query that must not be returned (the query station itself)
+        """
+        results = [[] for _ in range(len(lat))]
+        by_cell = np.argsort(cells, kind="stable")
+        unique_cells, splits = np.unique(cells[by_cell], return_index=True)
+        for cell, group in zip(unique_cells, np.split(by_cell, splits[1:])):
+            cx, cy = divmod(int(cell), self._ny)
+            needed = k if exclude is None else k + 1
+            r = 1
+            while True:
+                candidates, covers_grid = self._block(cx, cy, r)
+                if len(candidates) >= needed:
+                    distances = self._distance(lat[group, None], lon[group, None], self.lat[candidates], self.lon[candidates])
+                    if exclude is not None:
+                        distances[exclude[group][:, None] == candidates[None, :]] = np.inf
+                    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                    nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+                    if covers_grid or nearest_distances.max() < self._ring_lower_bound(r):
+                        break
+                    r += 1
+                else:
+                    r *= 2
+
+            for i, position in enumerate(group):
+                results[position] = sorted(
+                    (float(dist), self.ids[candidate])
+                    for dist, candidate in zip(nearest_distances[i], candidates[nearest[i]])
+                )
+        return results
+
+    def query(self, k: int, rows=None) -> list[list[tuple[float, object]]]:
+        """
+        Find the k closest neighbors of many indexed stations at once.
+
+        Args:
+            k: int, number of neighbors to return per station
+            rows: optional iterable of station positions to query, defaults to every station in the index
+
+        Returns:
+            list of neighbor lists aligned with rows, each a list of (distance, node_id) tuples sorted by distance
+        """
+        rows = np.arange(len(self.ids)) if rows is None else np.asarray(rows, dtype=np.int64)
+        k = min(k, len(self.ids) - 1)
+        if k <= 0 or len(rows) == 0:
+            return [[] for _ in range(len(rows))]
+        return self._nearest(self.lat[rows], self.lon[rows], self._cell_of[rows], k, exclude=rows)
+
+    def query_points(self, lat, lon, k: int) -> list[list[tuple[float, object]]]:
+        """
+        Find the k closest indexed stations to arbitrary coordinates.
+
+        Args:
+            lat: array-like of float, query latitudes
+            lon: array-like of float, query longitudes
+            k: int, number of neighbors to return per query
+
+        Returns:
+            list of neighbor lists aligned with the queries, each a list of (distance, node_id) tuples sorted by distance
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        k = min(k, len(self.ids))
+        if k <= 0 or len(lat) == 0:
+            return [[] for _ in range(len(lat))]
+        return self._nearest(lat, lon, self._cells(lat, lon), k)
+
+    def query_radius(self, lat, lon, radius: float) -> list[list[tuple[float, object]]]:
+        """
+        Find every indexed station within radius of arbitrary coordinates.
+
+        Only the cells overlapping each query's bounding box are scanned.
+
+        Args:
+            lat: array-like of float, query latitudes
+            lon: array-like of float, query longitudes
+            radius: float, search radius in the index metric's units (degrees for l1, kilometers for haversine)
+
+        Returns:
+            list of neighbor lists aligned with the queries, each a list of (distance, node_id) tuples sorted by distance
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        if len(self.ids) == 0 or radius < 0:
+            return [[] for _ in range(len(lat))]
+
+        # half extents of each query's bounding box in degrees
+        if self.metric == "l1":
+            dlat = np.full(len(lat), radius)
+            dlon = dlat
+        else:
+            dlat = np.full(len(lat), np.degrees(radius / EARTH_RADIUS_KM))
+            cos_lat = np.cos(np.radians(np.minimum(np.abs(lat) + dlat, 90.0)))
+            dlon = np.where(cos_lat > 1e-9, dlat / np.maximum(cos_lat, 1e-9), 180.0)
+
+        x0 = np.floor((lat - dlat - self._lat_min) / self._cell_lat)
+        x1 = np.floor((lat + dlat - self._lat_min) / self._cell_lat)
+        y0 = np.floor((lon - dlon - self._lon_min) / self._cell_lon)
+        y1 = np.floor((lon + dlon - self._lon_min) / self._cell_lon)
+
+        results = []
+        for i in range(len(lat)):
+            # boxes entirely outside the grid hold no stations
+            if x1[i] < 0 or y1[i] < 0 or x0[i] > self._nx - 1 or y0[i] > self._ny - 1:
+                results.append([])
+                continue
+            candidates = self._rect(
+                int(max(x0[i], 0)), int(min(x1[i], self._nx - 1)),
+                int(max(y0[i], 0)), int(min(y1[i], self._ny - 1)),
+            )
+            distances = self._distance(lat[i], lon[i], self.lat[candidates], self.lon[candidates])
+            inside = distances <= radius
+            results.append(sorted(
+                (float(dist), self.ids[candidate]) for dist, candidate in zip(distances[inside], candidates[inside])
+            ))
+        return results
@@ -0,0 +1,110 @@
+import unittest
+
+from google.transit import gtfs_realtime_pb2
+
+from pipeline.alerts import AlertLocator
+from pipeline.extractors import AddressExtractor
+from pipeline.geocode import BatchGeocoder, StubGeocoder
+from tests.test_geocode import FlakyGeocoder
+
+LOCATIONS = {
+    "Lexington Ave at E 96th St": (40.7851, -73.9510),
+    "E 86th St": (40.7795, -73.9555),
+    "W 4th St": (40.7322, -74.0005),
+}
+
+
+def make_feed(alerts: dict) -> list:
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    for alert_id, text in alerts.items():
+        entity = feed.entity.add()
+        entity.id = alert_id
+        entity.alert.header_text.translation.add().text = text
+    return feed.entity
+
+
+class RecordingExtractor(AddressExtractor):
+    """
+    Extractor stub: an alert mentions every known address that appears in its text
+    """
+    def __init__(self):
+        self.texts = []
+        self.fail = False
+
+    def extract(self, text):
+        if self.fail:
+            raise ConnectionError("extractor unavailable")
+        self.texts.append(text)
+        return [address for address in LOCATIONS if address in text]
+
+
+class TestAlertLocator(unittest.TestCase):
+    def setUp(self):
+        self.extractor = RecordingExtractor()
+        self.stub = StubGeocoder(LOCATIONS)
+        self.locator = AlertLocator(BatchGeocoder(self.stub, min_interval=0.0), extractor=self.extractor)
+
+    def test_only_new_alerts_are_extracted(self):
+        first = self.locator.update(make_feed({
+            "a1": "Stops on Lexington Ave at E 96th St and E 86th St are closed",
+            "a2": "Delays near W 4th St",
+        }))
+        self.assertEqual(sorted(first.upserts["id"].to_list()), [
+            "a1|E 86th St", "a1|Lexington Ave at E 96th St", "a2|W 4th St",
+        ])
+        self.assertEqual(first.removed, [])
+        self.assertEqual(len(self.extractor.texts), 2)
+
+        unchanged = self.locator.update(make_feed({
+            "a1": "Stops on Lexington Ave at E 96th St and E 86th St are closed",
+            "a2": "Delays near W 4th St",
+        }))
+        self.assertTrue(unchanged.upserts.is_empty())
+        self.assertEqual(unchanged.removed, [])
+        self.assertEqual(len(self.extractor.texts), 2)
+
+    def test_removed_and_changed_alerts(self):
+        self.locator.update(make_feed({
+            "a1": "Stops on Lexington Ave at E 96th St and E 86th St are closed",
+            "a2": "Delays near W 4th St",
+        }))
+        delta = self.locator.update(make_feed({"a1": "Stops on Lexington Ave at E 96th St are closed"}))
+        self.assertEqual(sorted(delta.removed), ["a1|E 86th St", "a2|W 4th St"])
+        self.assertEqual(delta.upserts["id"].to_list(), ["a1|Lexington Ave at E 96th St"])
+        self.assertEqual(self.extractor.texts[-1], "Stops on Lexington Ave at E 96th St are closed")
+
+    def test_same_text_under_a_new_id_reuses_extraction(self):
+        self.locator.update(make_feed({"a1": "Delays near W 4th St"}))
+        delta = self.locator.update(make_feed({"a1": "Delays near W 4th St", "a3": "Delays near W 4th St"}))
+        self.assertEqual(delta.upserts["id"].to_list(), ["a3|W 4th St"])
+        self.assertEqual(len(self.extractor.texts), 1)
+        self.assertEqual(self.stub.calls, 1)
+
+    def test_failed_extraction_is_retried(self):
+        self.extractor.fail = True
+        delta = self.locator.update(make_feed({"a2": "Delays near W 4th St"}))
+        self.assertTrue(delta.upserts.is_empty())
+        self.assertTrue(self.locator.pending)
+
+        self.extractor.fail = False
+        delta = self.locator.update(make_feed({"a2": "Delays near W 4th St"}))
+        self.assertEqual(delta.upserts["id"].to_list(), ["a2|W 4th St"])
+        self.assertFalse(self.locator.pending)
+
+    def test_failed_geocoding_is_retried(self):
+        flaky = FlakyGeocoder(LOCATIONS)
+        locator = AlertLocator(BatchGeocoder(flaky, min_interval=0.0), extractor=self.extractor)
+        feed = {"a1": "Stops on Lexington Ave at E 96th St and E 86th St are closed"}
+        delta = locator.update(make_feed(feed))
+        self.assertTrue(delta.upserts.is_empty())
+        self.assertTrue(locator.pending)
+
+        flaky.fail = False
+        delta = locator.update(make_feed(feed))
+        self.assertEqual(sorted(delta.upserts["id"].to_list()), ["a1|E 86th St", "a1|Lexington Ave at E 96th St"])
+        self.assertFalse(locator.pending)
+        self.assertTrue(locator.update(make_feed(feed)).upserts.is_empty())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from datetime import datetime
+
+import polars as pl
+from perspective import Table as PerspectiveTable
+
+from pipeline.arrow_ipc import ArrowIPCEncoder, to_records
+
+SCHEMA = {
+    "station_id": str,
+    "capacity": int,
+    "name": str,
+    "lat": float,
+    "num_bikes_available": int,
+    "is_renting": bool,
+    "last_reported": datetime,
+}
+
+
+class TestArrowIPCEncoder(unittest.TestCase):
+    def setUp(self):
+        self.df = pl.DataFrame({
+            "station_id": ["1", "2"],
+            "capacity": [30, 40],
+            "name": ["Station1", "Station2"],
+            "lat": [40.7486, 40.7496],
+            "num_bikes_available": [15, 25],
+            "num_docks_available": [15, 15],
+            "is_renting": [1, 0],
+            "last_reported": [1709251200, 1709251260],
+        })
+        self.encoder = ArrowIPCEncoder(SCHEMA)
+
+    def test_encode_matches_records_update(self):
+        ipc_table = PerspectiveTable(SCHEMA, index="station_id")
+        ipc_table.update(self.encoder.encode(self.df))
+        records_table = PerspectiveTable(SCHEMA, index="station_id")
+        records_table.update(to_records(self.df))
+
+        self.assertEqual(ipc_table.view().to_records(), records_table.view().to_records())
+        self.assertEqual(ipc_table.view().to_records()[0]["last_reported"], datetime(2024, 3, 1))
+
+    def test_schema_is_cached(self):
+        self.encoder.encode(self.df)
+        self.encoder.encode(self.df.with_columns(pl.col("num_bikes_available") + 1))
+        self.assertEqual(len(self.encoder._schema_cache), 1)
+
+    def test_partial_columns(self):
+        table = PerspectiveTable(SCHEMA, index="station_id")
+        table.update(self.encoder.encode(self.df))
+        table.update(self.encoder.encode(pl.DataFrame({"station_id": ["2"], "num_bikes_available": [3]})))
+        rows = {row["station_id"]: row for row in table.view().to_records()}
+        self.assertEqual(rows["2"]["num_bikes_available"], 3)
+        self.assertEqual(rows["2"]["capacity"], 40)
+
+    def test_bad_cast_raises(self):
+        with self.assertRaises(Exception):
+            self.encoder.encode(self.df.with_columns(pl.lit("many").alias("capacity")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import threading
+import time
+import unittest
+from datetime import timedelta
+
+import csp
+from csp import ts
+
+from pipeline.async_fetch import FeedAdapterManager, FeedScheduler
+
+
+class TestFeedScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = FeedScheduler(max_workers=4, timeout=0.5)
+        self.results = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def collect(self, name):
+        def callback(value):
+            with self.lock:
+                self.results.append((name, value, time.monotonic()))
+        return callback
+
+    def test_slow_fetch_does_not_delay_fast_one(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(timeout=5)
+            return "slow"
+
+        self.scheduler.add("slow", slow, 10.0, self.collect("slow"))
+        self.scheduler.add("fast", lambda: "fast", 0.05, self.collect("fast"))
+        self.scheduler.start()
+        time.sleep(0.3)
+        release.set()
+
+        names = [name for name, _, _ in self.results]
+        self.assertGreaterEqual(names.count("fast"), 3)
+        self.assertNotIn("slow", names)
+
+    def test_running_fetch_is_not_started_twice(self):
+        calls = []
+
+        def fetch():
+            calls.append(time.monotonic())
+            time.sleep(0.2)
+            return len(calls)
+
+        self.scheduler.add("feed", fetch, 0.02, self.collect("feed"))
+        self.scheduler.start()
+        time.sleep(0.3)
+        self.assertLessEqual(len(calls), 2)
+
+    def test_timed_out_fetch_is_delivered_once_it_returns(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(timeout=5)
+                return "late"
+            return "on time"
+
+        self.scheduler.add("feed", fetch, 0.1, self.collect("feed"))
+        self.scheduler.start()
+        time.sleep(0.8)
+        release.set()
+        # the next poll is at most one interval away once the late call returns
+        time.sleep(0.3)
+
+        values = [value for _, value, _ in self.results]
+        self.assertEqual(values[0], "late")
+        self.assertIn("on time", values)
+
+    def test_timed_out_fetch_is_never_run_concurrently(self):
+        release = threading.Event()
+        running = []
+        overlaps = []
+
+        def fetch():
+            with self.lock:
+                running.append(1)
+                overlaps.append(len(running))
+            if len(overlaps) == 1:
+                release.wait(timeout=5)
+            with self.lock:
+                running.pop()
+            return len(overlaps)
+
+        self.scheduler.add("feed", fetch, 0.05, self.collect("feed"))
+        self.scheduler.start()
+        # ten intervals past the timeout, polls are skipped instead of stacking on the pool
+        time.sleep(1.0)
+        self.assertEqual(overlaps, [1])
+        release.set()
+        time.sleep(0.3)
+
+        self.assertEqual(max(overlaps), 1)
+        self.assertGreater(len(overlaps), 1)
+        self.assertEqual(self.results[0][1], 1)
+
+    def test_none_and_errors_do_not_deliver(self):
+        def failing():
+            raise ConnectionError("down")
+
+        self.scheduler.add("none", lambda: None, 0.05, self.collect("none"))
+        self.scheduler.add("failing", failing, 0.05, self.collect("failing"))
+        self.scheduler.start()
+        time.sleep(0.2)
+        self.assertEqual(self.results, [])
+
+
+@csp.node
+def count_ticks(fast: ts[int], slow: ts[str]) -> csp.Outputs(fast=ts[int], slow=ts[int]):
+    with csp.state():
+        s_fast = 0
+        s_slow = 0
+
+    if csp.ticked(fast):
+        s_fast += 1
+        csp.output(fast=s_fast)
+    if csp.ticked(slow):
+        s_slow += 1
+        csp.output(slow=s_slow)
+
+
+def slow_fetch():
+    time.sleep(2.0)
+    return "slow"
+
+
+@csp.graph
+def feeds_graph() -> csp.Outputs(fast=ts[int], slow=ts[int]):
+    feeds = FeedAdapterManager(max_workers=2, timeout=5.0)
+    fast = feeds.subscribe(int, "fast", lambda: 1, timedelta(milliseconds=50))
+    slow = feeds.subscribe(str, "slow", slow_fetch, timedelta(seconds=10))
+    counts = count_ticks(fast, slow)
+    return csp.output(fast=counts.fast, slow=counts.slow)
+
+
+class TestFeedAdapterManager(unittest.TestCase):
+    def test_graph_ticks_while_a_fetch_is_blocked(self):
+        results = csp.run(feeds_graph, starttime=None, endtime=timedelta(seconds=0.5), realtime=True)
+        self.assertGreaterEqual(len(results["fast"]), 5)
+        self.assertEqual(len(results["slow"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import polars as pl
+
+from rebalancing_algo.delta import diff_station_status
+
+
+class TestDiffStationStatus(unittest.TestCase):
+    def setUp(self):
+        self.previous = pl.DataFrame({
+            "station_id": ["1", "2", "3", "4"],
+            "num_bikes_available": [15, 25, 35, 45],
+            "lat": [40.7486, 40.7496, 40.7506, 40.7516],
+            "lon": [-73.9864, -73.9874, -73.9884, -73.9894],
+            "name": ["Station1", "Station2", "Station3", "Station4"],
+        })
+
+    def test_no_changes(self):
+        delta = diff_station_status(self.previous, self.previous.clone())
+        self.assertTrue(delta.changed.is_empty())
+        self.assertFalse(delta.geometry_changed)
+
+    def test_changed_counts(self):
+        current = self.previous.with_columns(
+            pl.when(pl.col("station_id") == "3").then(30).otherwise(pl.col("num_bikes_available")).alias("num_bikes_available")
+        )
+        delta = diff_station_status(self.previous, current)
+        self.assertEqual(delta.changed.rows(), [("3", 30)])
+        self.assertFalse(delta.geometry_changed)
+
+    def test_added_removed_and_moved(self):
+        current = pl.concat([
+            self.previous.filter(pl.col("station_id") != "1").with_columns(
+                pl.when(pl.col("station_id") == "2").then(40.8).otherwise(pl.col("lat")).alias("lat")
+            ),
+            pl.DataFrame({"station_id": ["5"], "num_bikes_available": [3], "lat": [40.76], "lon": [-73.99], "name": ["Station5"]}),
+        ])
+        delta = diff_station_status(self.previous, current)
+        self.assertEqual(delta.added, ["5"])
+        self.assertEqual(delta.removed, ["1"])
+        self.assertEqual(delta.moved, ["2"])
+        self.assertTrue(delta.geometry_changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+import numpy as np
+import polars as pl
+
+from rebalancing_algo.engines import GreedyEngine, MinCostFlowEngine, Transfer, min_cost_flow
+from rebalancing_algo.graph import Graph
+
+
+def unmet_deficit(graph: Graph, min_bikes: int) -> int:
+    return int(np.clip(min_bikes - graph.store.bikes, 0, None).sum())
+
+
+class TestEngines(unittest.TestCase):
+    def setUp(self):
+        # D1 and D2 both have S1 as their closest station, S2 is only a little further from D1
+        self.line = {
+            'D1': (0, 40.700, -73.99, "D1"),
+            'S1': (30, 40.710, -73.99, "S1"),
+            'D2': (0, 40.720, -73.99, "D2"),
+            'S2': (30, 40.685, -73.99, "S2"),
+        }
+
+    def test_min_cost_flow_small_network(self):
+        # source 0, sink 3, a cheap path limited to 2 units and an expensive one for the rest
+        edges = [(0, 1, 5, 0), (1, 3, 2, 1), (1, 2, 5, 1), (2, 3, 5, 5)]
+        self.assertEqual(min_cost_flow(4, edges, 0, 3), [5, 2, 3, 3])
+
+    def test_min_cost_flow_reroutes_through_residual_edges(self):
+        # the cheapest first path (0-1-2-3) has to be partially undone to reach the maximum flow of 2
+        edges = [(0, 1, 1, 0), (0, 4, 1, 0), (1, 2, 1, 1), (1, 3, 1, 10), (4, 2, 1, 1), (2, 3, 1, 1)]
+        flows = min_cost_flow(5, edges, 0, 3)
+        self.assertEqual(flows[0] + flows[1], 2)
+        self.assertEqual(flows, [1, 1, 0, 1, 1, 1])
+
+    def test_greedy_leaves_deficit_that_min_cost_flow_fills(self):
+        greedy = Graph(top_k=1)
+        greedy.nodes = self.line
+        greedy.rebalance_stations(10, 20, engine=GreedyEngine())
+        self.assertEqual(unmet_deficit(greedy, 10), 10)
+
+        optimal = Graph(top_k=1)
+        optimal.nodes = self.line
+        plan = optimal.rebalance_stations(10, 20, engine=MinCostFlowEngine())
+        self.assertEqual(unmet_deficit(optimal, 10), 0)
+        self.assertEqual(sorted((t.source, t.target, t.num_bikes) for t in plan), [('S1', 'D2', 10), ('S2', 'D1', 10)])
+        self.assertTrue(all(isinstance(t, Transfer) for t in plan))
+
+    def test_default_engine_is_greedy(self):
+        graph = Graph(top_k=1)
+        graph.nodes = self.line
+        plan = graph.rebalance_stations(10, 20)
+        self.assertEqual([(t.source, t.target, t.num_bikes) for t in plan], [('S1', 'D1', 10)])
+
+    def test_min_cost_flow_respects_bounds(self):
+        n = 400
+        rng = np.random.default_rng(11)
+        df = pl.DataFrame({
+            "station_id": [str(i) for i in range(n)],
+            "num_bikes_available": rng.integers(0, 70, n),
+            "lat": 40.6 + rng.random(n) * 0.2,
+            "lon": -74.05 + rng.random(n) * 0.15,
+            "name": [f"Station{i}" for i in range(n)],
+        })
+        before = df["num_bikes_available"].to_numpy()
+
+        greedy = Graph(top_k=8, use_spatial_index=True)
+        greedy._fill_nodes(df)
+        greedy.rebalance_stations(25, 40)
+
+        optimal = Graph(top_k=8, use_spatial_index=True)
+        optimal._fill_nodes(df)
+        optimal.rebalance_stations(25, 40, engine=MinCostFlowEngine(candidates=8))
+        after = optimal.store.bikes
+
+        self.assertEqual(after.sum(), before.sum())
+        self.assertTrue(np.all(after[before > 40] >= 40))
+        self.assertTrue(np.all(after[before < 25] <= 25))
+        self.assertTrue(np.all(after[(before >= 25) & (before <= 40)] == before[(before >= 25) & (before <= 40)]))
+        self.assertLessEqual(unmet_deficit(optimal, 25), unmet_deficit(greedy, 25))
+
+    def test_per_station_bounds(self):
+        # a constant array behaves like the scalar bounds; with per-station bounds only D2 asks for bikes, from S1
+        for engine in (GreedyEngine(), MinCostFlowEngine()):
+            scalar = Graph(top_k=2)
+            scalar.nodes = self.line
+            array = Graph(top_k=2)
+            array.nodes = self.line
+            self.assertEqual(
+                scalar.rebalance_stations(10, 20, engine=engine),
+                array.rebalance_stations(np.full(4, 10), np.full(4, 20), engine=engine),
+            )
+
+            graph = Graph(top_k=2)
+            graph.nodes = self.line
+            graph.rebalance_stations(np.array([0, 0, 10, 0]), np.array([30, 20, 30, 30]), engine=engine)
+            np.testing.assert_array_equal(graph.store.bikes, [0, 20, 10, 30])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import os
+import unittest
+
+from pipeline.extractors import EXTRACTORS, RegexAddressExtractor, address_key
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "mta_alerts.json")
+
+
+class TestRegexAddressExtractor(unittest.TestCase):
+    def setUp(self):
+        self.extractor = RegexAddressExtractor()
+
+    def test_at_with_several_cross_streets(self):
+        self.assertEqual(
+            self.extractor.extract("Southbound BxM1 stops on Lexington Ave at E 96th St and E 86th St will be closed"),
+            ["Lexington Ave & E 96th St", "Lexington Ave & E 86th St"],
+        )
+
+    def test_stop_between(self):
+        self.assertEqual(
+            self.extractor.extract("buses will bypass the Ocean Pkwy stop between Shore Rd and Avenue Z due to construction"),
+            ["Ocean Pkwy & Shore Rd", "Ocean Pkwy & Avenue Z"],
+        )
+
+    def test_between_along(self):
+        self.assertEqual(
+            self.extractor.extract("B41 buses are detoured between Flatbush Ave and Kings Hwy along Nostrand Ave."),
+            ["Nostrand Ave & Flatbush Ave", "Nostrand Ave & Kings Hwy"],
+        )
+
+    def test_standalone_streets_and_named_streets(self):
+        self.assertEqual(
+            self.extractor.extract("M60 SBS buses are detoured from Astoria Blvd to 31st St via Broadway/W 96th St."),
+            ["Astoria Blvd", "31st St", "Broadway & W 96th St"],
+        )
+
+    def test_no_addresses(self):
+        self.assertEqual(self.extractor.extract("Northbound B1 and eastbound B4 buses are running with delays."), [])
+
+    def test_address_key_ignores_intersection_order(self):
+        self.assertEqual(address_key("E 96th Street and Lexington Avenue"), address_key("Lexington Ave & E 96th St"))
+
+    def test_fixture_recall(self):
+        with open(FIXTURE) as f:
+            alerts = json.load(f)
+        expected = correct = 0
+        for alert in alerts:
+            got = {address_key(address) for address in self.extractor.extract(alert["header_text"])}
+            want = {address_key(address) for address in alert["addresses"]}
+            expected += len(want)
+            correct += len(got & want)
+        self.assertGreaterEqual(correct / expected, 0.9)
+
+    def test_registry(self):
+        self.assertIs(EXTRACTORS["regex"], RegexAddressExtractor)
+        self.assertIn("llm", EXTRACTORS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipeline.feed_client import FeedClient
+from pipeline.pipeline import DatasetLoader
+
+
+class StubGBFSServer(ThreadingHTTPServer):
+    """
+    Local GBFS endpoint: serves JSON feeds with an ETag, answers If-None-Match with 304 and records every request
+    """
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubGBFSHandler)
+        self.feeds = {}
+        self.requests = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def set_feed(self, path: str, data: dict, ttl: int = 0, last_updated: int = None) -> None:
+        body = json.dumps({"last_updated": last_updated or int(time.time()), "ttl": ttl, "data": data}).encode()
+        self.feeds[path] = (body, f'"{hash(body)}"')
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class StubGBFSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body, etag = self.server.feeds[self.path]
+        self.server.requests.append((self.path, self.headers.get("If-None-Match"), self.client_address[1]))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFeedClient(unittest.TestCase):
+    def setUp(self):
+        self.server = StubGBFSServer()
+        self.client = FeedClient(http2=False)
+        self.set_information(30)
+        self.set_status(15, last_updated=1_700_000_000)
+        self.loader = DatasetLoader(
+            client=self.client,
+            station_information_url=self.server.url("/station_information.json"),
+            station_status_url=self.server.url("/station_status.json"),
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def set_information(self, capacity: int, ttl: int = 60):
+        self.server.set_feed("/station_information.json", {"stations": [
+            {"station_id": "1", "capacity": capacity, "name": "Station1", "short_name": "S1", "region_id": "71", "lon": -73.98, "lat": 40.74},
+            {"station_id": "2", "capacity": 40, "name": "Station2", "short_name": "S2", "region_id": "71", "lon": -73.99, "lat": 40.75},
+        ]}, ttl=ttl)
+
+    def set_status(self, num_bikes: int, last_updated: int, ttl: int = 0):
+        self.server.set_feed("/station_status.json", {"stations": [
+            {"station_id": station_id, "num_bikes_available": num_bikes, "num_bikes_disabled": 0, "num_docks_available": 10,
+             "num_docks_disabled": 0, "num_ebikes_available": 0, "is_installed": 1, "is_renting": 1, "is_returning": 1,
+             "last_reported": last_updated}
+            for station_id in ("1", "2")
+        ]}, ttl=ttl, last_updated=last_updated)
+
+    def test_conditional_request_returns_not_modified(self):
+        url = self.server.url("/station_status.json")
+        payload, changed = self.client.get_json(url)
+        self.assertTrue(changed)
+        again, changed = self.client.get_json(url)
+        self.assertFalse(changed)
+        self.assertIs(again, payload)
+        self.assertIsNone(self.server.requests[0][1])
+        self.assertIsNotNone(self.server.requests[1][1])
+
+    def test_ttl_skips_request(self):
+        url = self.server.url("/station_information.json")
+        self.client.get_json(url)
+        _, changed = self.client.get_json(url)
+        self.assertFalse(changed)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_is_reused(self):
+        url = self.server.url("/station_status.json")
+        for _ in range(3):
+            self.client.get_json(url)
+        self.assertEqual(len({port for _, _, port in self.server.requests}), 1)
+
+    def test_station_status_skips_parse_when_unchanged(self):
+        first = self.loader.get_station_status()
+        self.assertEqual(first["num_bikes_available"].to_list(), [15, 15])
+        self.assertIs(self.loader.get_station_status(), first)
+        self.assertIsNone(self.loader.get_station_status(only_changed=True))
+
+        self.set_status(20, last_updated=1_700_000_060)
+        changed = self.loader.get_station_status(only_changed=True)
+        self.assertEqual(changed["num_bikes_available"].to_list(), [20, 20])
+
+    def test_station_status_rejoins_refreshed_station_information(self):
+        self.set_information(30, ttl=0)
+        first = self.loader.get_station_status(only_changed=True)
+        self.assertEqual(first["capacity"].to_list(), [30, 40])
+
+        # the status feed is unchanged, the station information refresh runs in the background
+        self.set_information(35, ttl=0)
+        frame = None
+        deadline = time.monotonic() + 5
+        while frame is None and time.monotonic() < deadline:
+            frame = self.loader.get_station_status(only_changed=True)
+            time.sleep(0.01)
+        self.assertEqual(frame["capacity"].to_list(), [35, 40])
+        self.assertEqual(frame["num_bikes_available"].to_list(), [15, 15])
+        # refreshes that bring the same station information are not joined again
+        self.assertIsNone(self.loader.get_station_status(only_changed=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from rebalancing_algo.forecast import DemandForecast
+
+
+def trip(start: str, end: str, started_at: datetime, minutes: int = 20) -> dict:
+    return {
+        "start_station_id": start,
+        "end_station_id": end,
+        "started_at": started_at,
+        "ended_at": started_at + timedelta(minutes=minutes),
+    }
+
+
+class TestDemandForecast(unittest.TestCase):
+    def setUp(self):
+        # two weeks from Monday 2024-03-04: every weekday at 8:10, A -> B, and on the first Monday one more B -> A
+        rows = [trip("A", "B", datetime(2024, 3, 4, 8, 10) + timedelta(days=day)) for day in range(14) if day % 7 < 5]
+        rows.append(trip("B", "A", datetime(2024, 3, 4, 17, 30)))
+        self.trips = pl.DataFrame(rows).with_columns(pl.col("started_at", "ended_at").dt.strftime("%Y-%m-%d %H:%M:%S"))
+        self.forecast = DemandForecast.from_trips(self.trips.lazy())
+
+    def test_net_flow_per_hour_of_week(self):
+        flow = self.forecast.flow
+        a, b = self.forecast.index["A"], self.forecast.index["B"]
+        # Monday 8h: one departure from A per week on average, Monday 17h: half an arrival
+        self.assertEqual(flow[a, 8], -1.0)
+        self.assertEqual(flow[b, 8], 1.0)
+        self.assertEqual(flow[a, 17], 0.5)
+        self.assertEqual(flow[a, 5 * 24 + 8], 0.0)
+        self.assertAlmostEqual(float(flow.sum()), 0.0)
+
+    def test_expected_flow_and_targets(self):
+        # naive moments are UTC: 12:00 UTC is 8:00 in New York (EDT from March 10)
+        moment = datetime(2024, 3, 12, 12, 0)
+        self.assertEqual(self.forecast.local_hour_of_week(moment), 24 + 8)
+        np.testing.assert_array_equal(self.forecast.expected_flow(["A", "B", "C"], moment, timedelta(hours=2)), [-1, 1, 0])
+
+        min_bikes, max_bikes = self.forecast.targets(["A", "B", "C"], [20, 20, 4], moment, horizon=timedelta(hours=2))
+        np.testing.assert_array_equal(min_bikes, [6, 4, 1])
+        np.testing.assert_array_equal(max_bikes, [16, 14, 3])
+
+    def test_horizon_wraps_around_the_week(self):
+        # Sunday 23:00 local, two hours ahead covers Monday 0:00
+        forecast = DemandForecast(pl.DataFrame({"station_id": ["A", "A"], "hour_of_week": [167, 0], "net_flow": [2.0, 3.0]}))
+        moment = datetime(2024, 3, 11, 3, 0)
+        self.assertEqual(forecast.local_hour_of_week(moment), 167)
+        np.testing.assert_array_equal(forecast.expected_flow(["A"], moment, timedelta(hours=2)), [5.0])
+
+    def test_stations_map_short_names(self):
+        stations = pl.DataFrame({"station_id": ["uuid-a", "uuid-b"], "short_name": ["A", "B"]})
+        forecast = DemandForecast.from_trips(self.trips, stations=stations)
+        self.assertEqual(sorted(forecast.station_ids), ["uuid-a", "uuid-b"])
+        self.assertEqual(forecast.flow[forecast.index["uuid-a"], 8], -1.0)
+
+    def test_from_snapshots(self):
+        # polled every 15 minutes for a week, station A loses one bike at each poll between 12:00 and 13:00 UTC
+        times = [datetime(2024, 1, 1) + timedelta(minutes=15 * i) for i in range(7 * 96)]
+        counts, bikes = [], 50
+        for moment in times:
+            if moment.hour == 12 and moment.minute > 0:
+                bikes -= 1
+            counts.append(bikes)
+        bikes_after_refill = [count if i < 96 * 3 else count + 20 for i, count in enumerate(counts)]
+        snapshots = pl.DataFrame({"station_id": "A", "num_bikes_available": bikes_after_refill, "snapshot_time": times})
+        forecast = DemandForecast.from_snapshots(snapshots)
+
+        # 12:00 UTC is 7:00 in New York, and the +20 refill is not counted as demand. The week starts on Sunday
+        # evening in New York, so Sundays are seen twice and their flow is halved
+        self.assertEqual(forecast.flow[0, 7], -3.0)
+        self.assertEqual(forecast.flow[0, 6 * 24 + 7], -1.5)
+        self.assertEqual(float(forecast.flow.sum()), -3.0 * 6 - 1.5)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "forecast.parquet")
+            self.forecast.save(path)
+            loaded = DemandForecast.load(path)
+        self.assertEqual(sorted(loaded.station_ids), sorted(self.forecast.station_ids))
+        for station_id in loaded.station_ids:
+            np.testing.assert_array_equal(loaded.flow[loaded.index[station_id]], self.forecast.flow[self.forecast.index[station_id]])
+
+
+if __name__ == "__main__":
+    unittest.main()
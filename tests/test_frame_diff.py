@@ -0,0 +1,67 @@
+import unittest
+
+import polars as pl
+
+from pipeline.frame_diff import FrameDelta, FrameDiffer, apply_delta
+
+
+class TestFrameDiffer(unittest.TestCase):
+    def setUp(self):
+        self.frame = pl.DataFrame({
+            "station_id": ["1", "2", "3"],
+            "num_bikes_available": [15, 25, 35],
+            "name": ["Station1", "Station2", None],
+        })
+        self.differ = FrameDiffer(index="station_id")
+
+    def test_first_frame_is_sent_in_full(self):
+        delta = self.differ.diff(self.frame)
+        self.assertTrue(delta.upserts.equals(self.frame))
+        self.assertEqual(delta.removed, [])
+
+    def test_unchanged_frame_is_empty(self):
+        self.differ.diff(self.frame)
+        delta = self.differ.diff(self.frame.clone())
+        self.assertTrue(delta.upserts.is_empty())
+        self.assertEqual(delta.removed, [])
+
+    def test_inserted_changed_and_removed_rows(self):
+        self.differ.diff(self.frame)
+        current = pl.DataFrame({
+            "station_id": ["1", "3", "4"],
+            "num_bikes_available": [15, 30, 5],
+            "name": ["Station1", None, "Station4"],
+        })
+        delta = self.differ.diff(current)
+        self.assertEqual(delta.upserts["station_id"].to_list(), ["3", "4"])
+        self.assertEqual(delta.removed, ["2"])
+
+    def test_apply_delta_inverts_diff(self):
+        self.differ.diff(self.frame)
+        current = pl.DataFrame({
+            "station_id": ["1", "3", "4"],
+            "num_bikes_available": [15, 30, 5],
+            "name": ["Station1", None, "Station4"],
+        })
+        rebuilt = apply_delta(self.frame, self.differ.diff(current), index="station_id")
+        self.assertTrue(rebuilt.sort("station_id").equals(current))
+        self.assertIs(apply_delta(None, FrameDelta(current, []), index="station_id"), current)
+
+    def test_schema_change_resends_everything(self):
+        self.differ.diff(self.frame)
+        delta = self.differ.diff(self.frame.with_columns(pl.lit(1).alias("capacity")))
+        self.assertEqual(len(delta.upserts), 3)
+        self.assertEqual(delta.removed, [])
+
+    def test_schema_change_still_removes_missing_rows(self):
+        frame = self.frame.with_columns(pl.lit(None).alias("region_id"))
+        self.differ.diff(frame)
+        # the null column becomes a string column and station 2 is gone in the same tick
+        current = frame.filter(pl.col("station_id") != "2").with_columns(pl.lit("71").alias("region_id"))
+        delta = self.differ.diff(current)
+        self.assertEqual(delta.upserts["station_id"].to_list(), ["1", "3"])
+        self.assertEqual(delta.removed, ["2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from pipeline.feed_client import FeedClient
+from pipeline.gbfs import MultiSystemLoader, discover_feeds, system_id_of
+from pipeline.pipeline import DatasetLoader
+from tests.test_feed_client import StubGBFSServer
+
+
+class TestGBFS(unittest.TestCase):
+    def setUp(self):
+        self.server = StubGBFSServer()
+        self.client = FeedClient(http2=False)
+        for system, station_ids in (("a", ["a1", "a2"]), ("b", ["b1"])):
+            self.set_gbfs(system)
+            self.server.set_feed(f"/{system}/system_information.json", {"system_id": f"sys_{system}", "name": system})
+            self.server.set_feed(f"/{system}/station_information.json", {"stations": [
+                {"station_id": station_id, "capacity": 30, "name": station_id, "short_name": station_id, "region_id": "1",
+                 "lon": -73.98, "lat": 40.74}
+                for station_id in station_ids
+            ]}, ttl=60)
+            self.set_status(system, station_ids, 10, last_updated=1_700_000_000)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def set_gbfs(self, system: str, version: str = "2.3"):
+        feeds = [
+            {"name": name, "url": self.server.url(f"/{system}/{name}.json")}
+            for name in ("system_information", "station_information", "station_status")
+        ]
+        self.server.set_feed(f"/{system}/gbfs.json", {"feeds": feeds} if version.startswith("3") else {"en": {"feeds": feeds}})
+
+    def set_status(self, system: str, station_ids: list, num_bikes: int, last_updated: int):
+        self.server.set_feed(f"/{system}/station_status.json", {"stations": [
+            {"station_id": station_id, "num_bikes_available": num_bikes, "num_bikes_disabled": 0, "num_docks_available": 10,
+             "num_docks_disabled": 0, "num_ebikes_available": 0, "is_installed": 1, "is_renting": 1, "is_returning": 1,
+             "last_reported": last_updated}
+            for station_id in station_ids
+        ]}, last_updated=last_updated)
+
+    def test_discover_feeds(self):
+        feeds = discover_feeds(self.client, self.server.url("/a/gbfs.json"))
+        self.assertEqual(feeds["station_status"], self.server.url("/a/station_status.json"))
+        self.assertEqual(system_id_of(self.client, feeds, self.server.url("/a/gbfs.json")), "sys_a")
+
+        self.set_gbfs("b", version="3.0")
+        feeds = discover_feeds(self.client, self.server.url("/b/gbfs.json"))
+        self.assertEqual(feeds["station_information"], self.server.url("/b/station_information.json"))
+        del feeds["system_information"]
+        self.assertEqual(system_id_of(self.client, feeds, "https://gbfs.lyft.com/gbfs/2.3/bkn/gbfs.json"), "bkn")
+
+    def test_loader_from_gbfs(self):
+        loader = DatasetLoader.from_gbfs(self.server.url("/a/gbfs.json"), client=self.client)
+        self.assertEqual(loader.system_id, "sys_a")
+        self.assertEqual(loader.get_station_status()["station_id"].to_list(), ["a1", "a2"])
+
+    def test_multi_system_status(self):
+        loader = MultiSystemLoader.from_gbfs([self.server.url("/a/gbfs.json"), self.server.url("/b/gbfs.json")], client=self.client)
+        try:
+            frame = loader.get_station_status(only_changed=True)
+            self.assertEqual(frame["station_id"].to_list(), ["sys_a:a1", "sys_a:a2", "sys_b:b1"])
+            self.assertEqual(frame["system_id"].to_list(), ["sys_a", "sys_a", "sys_b"])
+            self.assertIsNone(loader.get_station_status(only_changed=True))
+
+            # only b changed, a contributes the frame of its last poll
+            self.set_status("b", ["b1"], 3, last_updated=1_700_000_060)
+            frame = loader.get_station_status(only_changed=True)
+            self.assertEqual(frame["num_bikes_available"].to_list(), [10, 10, 3])
+
+            # a system that fails keeps its previous frame and does not hold back the others
+            del self.server.feeds["/a/station_status.json"]
+            self.client._cache.clear()
+            self.set_status("b", ["b1"], 4, last_updated=1_700_000_120)
+            frame = loader.get_station_status()
+            self.assertEqual(frame["num_bikes_available"].to_list(), [10, 10, 4])
+        finally:
+            loader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
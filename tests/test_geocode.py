@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from pipeline.geocode import BatchGeocoder, GeocodeCache, StubGeocoder, normalize_address
+
+LOCATIONS = {
+    "Lexington Ave at E 96th St": (40.7851, -73.9510),
+    "W 4th St": (40.7322, -74.0005),
+}
+
+
+class FlakyGeocoder(StubGeocoder):
+    def __init__(self, locations):
+        super().__init__(locations)
+        self.fail = True
+
+    def geocode(self, address):
+        if self.fail:
+            self.calls += 1
+            raise TimeoutError("geocoder unavailable")
+        return super().geocode(address)
+
+
+class SlowGeocoder(StubGeocoder):
+    def __init__(self, locations, delay):
+        super().__init__(locations)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def geocode(self, address):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return super().geocode(address)
+
+
+class TestNormalizeAddress(unittest.TestCase):
+    def test_equivalent_spellings_share_a_key(self):
+        self.assertEqual(normalize_address("W. 4th Street"), normalize_address("  w 4th   st "))
+        self.assertEqual(normalize_address("Lexington Avenue at East 96th St."), "lexington ave at e 96th st")
+
+
+class TestGeocodeCache(unittest.TestCase):
+    def test_negative_entries_expire_sooner(self):
+        cache = GeocodeCache(ttl=60, negative_ttl=0)
+        cache.store({"a": (1.0, 2.0), "b": None})
+        self.assertEqual(cache.lookup(["a", "b"]), {"a": (1.0, 2.0)})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = GeocodeCache(max_entries=2)
+        cache.store({"a": (1.0, 1.0)})
+        time.sleep(0.01)
+        cache.store({"b": (2.0, 2.0)})
+        time.sleep(0.01)
+        cache.lookup(["a"])
+        time.sleep(0.01)
+        cache.store({"c": (3.0, 3.0)})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(set(cache.lookup(["a", "b", "c"])), {"a", "c"})
+
+    def test_entries_persist_across_instances(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "geocode.sqlite")
+            cache = GeocodeCache(path)
+            cache.store({"w 4th st": (40.7322, -74.0005)})
+            cache.close()
+
+            reopened = GeocodeCache(path)
+            self.assertEqual(reopened.lookup(["w 4th st"]), {"w 4th st": (40.7322, -74.0005)})
+            reopened.close()
+
+
+class TestBatchGeocoder(unittest.TestCase):
+    def test_repeated_addresses_are_served_from_cache(self):
+        stub = StubGeocoder(LOCATIONS)
+        geocoder = BatchGeocoder(stub, min_interval=0.0)
+        first = geocoder.geocode_many(["Lexington Ave at E 96th St", " W 4th Street", "Nowhere Pl"])
+        self.assertEqual(first["W 4th Street"], (40.7322, -74.0005))
+        self.assertIsNone(first["Nowhere Pl"])
+        self.assertEqual(stub.calls, 3)
+
+        again = geocoder.geocode_many(["lexington avenue at e 96th st", "Nowhere Pl", "W 4th St"])
+        self.assertEqual(again["lexington avenue at e 96th st"], (40.7851, -73.9510))
+        self.assertIsNone(again["Nowhere Pl"])
+        self.assertEqual(stub.calls, 3)
+
+    def test_duplicates_are_geocoded_once(self):
+        stub = StubGeocoder(LOCATIONS)
+        result = BatchGeocoder(stub, min_interval=0.0).geocode_many(["W 4th St", "w 4th street", "", " "])
+        self.assertEqual(stub.calls, 1)
+        self.assertEqual(set(result), {"W 4th St", "w 4th street"})
+
+    def test_failures_are_not_cached(self):
+        flaky = FlakyGeocoder(LOCATIONS)
+        geocoder = BatchGeocoder(flaky, min_interval=0.0)
+        self.assertEqual(geocoder.geocode_many(["W 4th St"]), {})
+        flaky.fail = False
+        self.assertEqual(geocoder.geocode_many(["W 4th St"])["W 4th St"], (40.7322, -74.0005))
+
+    def test_misses_run_concurrently_within_rate_limit(self):
+        slow = SlowGeocoder({f"{i} Broadway": (40.0, -74.0) for i in range(4)}, delay=0.2)
+        geocoder = BatchGeocoder(slow, min_interval=0.05, max_workers=4)
+        start = time.perf_counter()
+        result = geocoder.geocode_many([f"{i} Broadway" for i in range(4)])
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(result), 4)
+        self.assertGreater(slow.max_active, 1)
+        self.assertGreaterEqual(elapsed, 0.15)
+        self.assertLess(elapsed, 0.8)
+
+
+if __name__ == "__main__":
+    unittest.main()
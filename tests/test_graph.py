@@ -1,7 +1,10 @@
 import unittest
 from unittest.mock import patch
 from rebalancing_algo.graph import Graph
+from rebalancing_algo.node_store import NodeStore, NodeView
+from rebalancing_algo.spatial import DISTANCE_FUNCTIONS
 
+import numpy as np
 import polars as pl
 
 from collections import defaultdict
@@ -37,10 +40,46 @@ class TestGraph(unittest.TestCase):
             self.graph._fill_nodes({"incorrect": "data"})
 
     def test_initialization(self):
-        self.assertIsInstance(self.graph.nodes, defaultdict)
+        self.assertIsInstance(self.graph.nodes, NodeView)
+        self.assertIsInstance(self.graph.store, NodeStore)
         self.assertIsInstance(self.graph.top_k_neighbors, defaultdict)
         self.assertEqual(self.graph.k, 3)
 
+    def test_fill_nodes_columnar(self):
+        self.assertEqual(len(self.graph.store), 4)
+        self.assertEqual(self.graph.store.bikes.tolist(), [15, 25, 35, 45])
+        self.assertEqual(self.graph.nodes['3'], (35, 40.7506, -73.9884, "Station3"))
+        self.assertEqual(self.graph.get_nodes()['missing'], (0, 0, 0, ""))
+        self.assertEqual(dict(self.graph.get_nodes())['1'][3], "Station1")
+
+    def test_transfer_objects_in_place(self):
+        bikes = self.graph.store.bikes
+        self.graph._transfer_objects('4', '1', 5)
+        self.assertIs(self.graph.store.bikes.base, bikes.base)
+        self.assertEqual(self.graph.nodes['4'][0], 40)
+        self.assertEqual(self.graph.nodes['1'][0], 20)
+
+    def test_rebalance_stations(self):
+        self.graph.set_top_k_distances()
+        self.graph.rebalance_stations(20, 40)
+        self.assertEqual(self.graph.nodes['1'][0], 20)
+        self.assertEqual(self.graph.nodes['4'][0], 40)
+        self.assertEqual(sum(node[0] for node in self.graph.nodes.values()), 120)
+
+    def test_write_back(self):
+        df = pl.DataFrame({
+            "station_id": ["4", "1", "2", "3", "5"],
+            "num_bikes_available": [45, 15, 25, 35, 7],
+            "lat": [40.7516, 40.7486, 40.7496, 40.7506, 40.7526],
+            "lon": [-73.9894, -73.9864, -73.9874, -73.9884, -73.9904],
+            "name": ["Station4", "Station1", "Station2", "Station3", "Station5"],
+        })
+        self.graph._transfer_objects('4', '1', 5)
+        result = self.graph.write_back(df.with_columns(pl.col("num_bikes_available").cast(pl.Int32)))
+        self.assertEqual(result["num_bikes_available"].to_list(), [40, 20, 25, 35, 7])
+        self.assertEqual(result["num_bikes_available"].dtype, pl.Int32)
+        self.assertEqual(result.columns, df.columns)
+
     def test_set_top_k_distances(self):
         self.graph.set_top_k_distances()
         self.assertEqual(len(self.graph.top_k_neighbors['1']), 3)
@@ -83,5 +122,219 @@ class TestGraph(unittest.TestCase):
 
         self.assertEqual(distances, expected_distances)
 
+    def _random_graph(self, metric: str, use_spatial_index: bool, n: int = 300) -> Graph:
+        rng = np.random.default_rng(7)
+        df = pl.DataFrame({
+            "station_id": [str(i) for i in range(n)],
+            "num_bikes_available": rng.integers(0, 60, n),
+            "lat": 40.6 + rng.random(n) * 0.2,
+            "lon": -74.05 + rng.random(n) * 0.15,
+            "name": [f"Station{i}" for i in range(n)],
+        })
+        graph = Graph(top_k=8, metric=metric, use_spatial_index=use_spatial_index)
+        graph._fill_nodes(df)
+        return graph
+
+    def test_spatial_index_matches_scan(self):
+        for metric in ("l1", "haversine"):
+            scan = self._random_graph(metric, use_spatial_index=False)
+            indexed = self._random_graph(metric, use_spatial_index=True)
+            scan.set_top_k_distances()
+            indexed.set_top_k_distances()
+            for node_id in scan.nodes:
+                expected = scan.top_k_neighbors[node_id]
+                actual = indexed.top_k_neighbors[node_id]
+                self.assertEqual([id for _, id in actual], [id for _, id in expected])
+                np.testing.assert_allclose([d for d, _ in actual], [d for d, _ in expected])
+
+    def test_stations_within_matches_scan(self):
+        graph = self._random_graph("l1", use_spatial_index=True)
+        rng = np.random.default_rng(3)
+        lat = 40.55 + rng.random(40) * 0.3
+        lon = -74.1 + rng.random(40) * 0.25
+        for metric, radius in (("haversine", 1.0), ("l1", 0.01)):
+            found = graph.stations_within(lat, lon, radius, metric=metric)
+            distance = DISTANCE_FUNCTIONS[metric]
+            for query, stations in enumerate(found):
+                expected = {
+                    node_id for node_id, (_, node_lat, node_lon, _) in graph.nodes.items()
+                    if distance(lat[query], lon[query], node_lat, node_lon) <= radius
+                }
+                self.assertEqual({node_id for _, node_id in stations}, expected)
+                self.assertEqual([d for d, _ in stations], sorted(d for d, _ in stations))
+        self.assertEqual(graph.stations_within([10.0], [10.0], 1.0), [[]])
+
+    def test_spatial_index_single_query(self):
+        graph = self._random_graph("l1", use_spatial_index=True, n=50)
+        graph.set_top_k_neighbors("0")
+        self.assertEqual(len(graph.top_k_neighbors["0"]), 8)
+        self.assertNotIn("0", [id for _, id in graph.top_k_neighbors["0"]])
+
+    def test_spatial_index_small_graph(self):
+        graph = Graph(top_k=3, use_spatial_index=True)
+        graph.nodes = {
+            '1': (15, 40.7486, -73.9864, "Station1"),
+            '2': (25, 40.7496, -73.9874, "Station2"),
+            '3': (35, 40.7506, -73.9884, "Station3")
+        }
+        graph.set_top_k_distances()
+        self.assertEqual([id for _, id in graph.top_k_neighbors['1']], ['2', '3'])
+
+    def test_haversine_distance(self):
+        graph = Graph(top_k=1, metric="haversine")
+        graph.nodes = {
+            '1': (0, 40.7486, -73.9864, "Station1"),
+            '2': (0, 40.7580, -73.9855, "Station2"),
+        }
+        graph.set_top_k_neighbors('1')
+        distance, node_id = graph.top_k_neighbors['1'][0]
+        self.assertEqual(node_id, '2')
+        self.assertAlmostEqual(distance, 1.048, places=2)
+
+    def _status_frame(self, n: int, seed: int = 3) -> pl.DataFrame:
+        rng = np.random.default_rng(seed)
+        return pl.DataFrame({
+            "station_id": [str(i) for i in range(n)],
+            "num_bikes_available": rng.integers(0, 60, n),
+            "lat": 40.6 + rng.random(n) * 0.2,
+            "lon": -74.05 + rng.random(n) * 0.15,
+            "name": [f"Station{i}" for i in range(n)],
+        })
+
+    def test_update_nodes_counts_only_keeps_neighbors(self):
+        df = self._status_frame(100)
+        graph = Graph(top_k=5, use_spatial_index=True)
+        graph.update_nodes(df)
+        graph.refresh_top_k_distances()
+
+        refreshed = df.with_columns(pl.col("num_bikes_available") + 1)
+        invalidated = graph.update_nodes(refreshed)
+
+        self.assertEqual(invalidated, set())
+        self.assertEqual(len(graph.top_k_neighbors), 100)
+        self.assertEqual(graph.nodes["0"][0], df["num_bikes_available"][0] + 1)
+
+    def test_update_nodes_matches_full_recompute(self):
+        df = self._status_frame(200)
+        graph = Graph(top_k=5, use_spatial_index=True)
+        graph.update_nodes(df)
+        graph.refresh_top_k_distances()
+
+        # drop a station, move another and add a new one next to an existing station
+        changed = df.filter(pl.col("station_id") != "7").with_columns(
+            pl.when(pl.col("station_id") == "3").then(pl.col("lat") + 0.05).otherwise(pl.col("lat")).alias("lat")
+        )
+        changed = pl.concat([changed, pl.DataFrame({
+            "station_id": ["new"],
+            "num_bikes_available": [10],
+            "lat": [df["lat"][11] + 1e-4],
+            "lon": [df["lon"][11]],
+            "name": ["New Station"],
+        }, schema=changed.schema)])
+        invalidated = graph.update_nodes(changed)
+        graph.refresh_top_k_distances()
+
+        self.assertIn("3", invalidated)
+        self.assertIn("new", invalidated)
+        self.assertIn("11", invalidated)
+        self.assertLess(len(invalidated), 100)
+        self.assertNotIn("7", graph.nodes)
+
+        fresh = Graph(top_k=5)
+        fresh._fill_nodes(changed)
+        fresh.set_top_k_distances()
+        for node_id in fresh.nodes:
+            self.assertEqual(
+                [id for _, id in graph.top_k_neighbors[node_id]],
+                [id for _, id in fresh.top_k_neighbors[node_id]],
+            )
+
+    def _assert_valid_plan(self, graph: Graph, observed: np.ndarray, min_bikes, max_bikes):
+        bikes = graph.store.bikes
+        min_bikes = np.broadcast_to(min_bikes, bikes.shape)
+        max_bikes = np.broadcast_to(max_bikes, bikes.shape)
+        over = observed > max_bikes
+        under = observed < min_bikes
+        self.assertEqual(bikes.sum(), observed.sum())
+        self.assertTrue(np.all(bikes[over] >= max_bikes[over]))
+        self.assertTrue(np.all(bikes[under] <= min_bikes[under]))
+        self.assertTrue(np.all(bikes[under] >= observed[under]))
+        neutral = ~over & ~under
+        self.assertTrue(np.all(bikes[neutral] == observed[neutral]))
+
+    def test_rebalance_incremental(self):
+        previous = self._status_frame(500)
+        graph = Graph(top_k=8, use_spatial_index=True)
+        full_plan = graph.rebalance_incremental(None, previous, 25, 40)
+        self.assertGreater(len(full_plan), 0)
+
+        rng = np.random.default_rng(5)
+        for _ in range(5):
+            changed = rng.choice(500, 10, replace=False)
+            counts = previous["num_bikes_available"].to_numpy().copy()
+            counts[changed] = rng.integers(0, 60, 10)
+            current = previous.with_columns(pl.Series("num_bikes_available", counts))
+
+            graph.rebalance_incremental(previous, current, 25, 40)
+            observed = counts[[graph.store.index[node_id] for node_id in graph.store.ids]]
+            self._assert_valid_plan(graph, observed, 25, 40)
+            previous = current
+
+        # an unchanged frame is a no-op
+        before = graph.store.bikes.copy()
+        self.assertEqual(graph.rebalance_incremental(previous, previous.clone(), 25, 40), [])
+        np.testing.assert_array_equal(graph.store.bikes, before)
+
+    def test_rebalance_incremental_per_station_bounds(self):
+        previous = self._status_frame(300)
+        rng = np.random.default_rng(9)
+        min_bikes = rng.integers(10, 30, 300)
+        max_bikes = min_bikes + rng.integers(0, 20, 300)
+        bounds = pl.DataFrame({"station_id": previous["station_id"], "min": min_bikes, "max": max_bikes})
+
+        graph = Graph(top_k=8, use_spatial_index=True)
+        graph.rebalance_incremental(None, previous, min_bikes, max_bikes)
+        for _ in range(3):
+            # rows arrive in another order, bounds follow the rows of the current frame
+            changed = rng.choice(300, 10, replace=False)
+            counts = previous["num_bikes_available"].to_numpy().copy()
+            counts[changed] = rng.integers(0, 60, 10)
+            current = previous.with_columns(pl.Series("num_bikes_available", counts)).sample(fraction=1.0, shuffle=True, seed=1)
+            row_bounds = current.select("station_id").join(bounds, on="station_id", maintain_order="left")
+
+            graph.rebalance_incremental(previous, current, row_bounds["min"].to_numpy(), row_bounds["max"].to_numpy())
+            by_store = pl.DataFrame({"station_id": graph.store.ids}).join(
+                current.join(bounds, on="station_id"), on="station_id", maintain_order="left"
+            )
+            self._assert_valid_plan(
+                graph, by_store["num_bikes_available"].to_numpy(), by_store["min"].to_numpy(), by_store["max"].to_numpy()
+            )
+            previous = current
+
+        # new bounds replan from scratch, like GreedyEngine over the stations in the same order
+        fresh = Graph(top_k=8, use_spatial_index=True)
+        fresh._fill_nodes(pl.DataFrame({"station_id": graph.store.ids}).join(previous, on="station_id", maintain_order="left"))
+        fresh.rebalance_stations(20, 30)
+        graph.rebalance_incremental(previous, previous.clone(), np.full(300, 20), np.full(300, 30))
+        np.testing.assert_array_equal(graph.store.bikes, fresh.store.bikes)
+
+    def test_rebalance_incremental_geometry_change_recomputes(self):
+        previous = self._status_frame(100)
+        graph = Graph(top_k=8, use_spatial_index=True)
+        graph.rebalance_incremental(None, previous, 25, 40)
+
+        current = previous.filter(pl.col("station_id") != "0")
+        graph.rebalance_incremental(previous, current, 25, 40)
+
+        fresh = Graph(top_k=8, use_spatial_index=True)
+        fresh._fill_nodes(current)
+        fresh.rebalance_stations(25, 40)
+        self.assertNotIn("0", graph.nodes)
+        np.testing.assert_array_equal(graph.store.bikes, fresh.store.bikes)
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            Graph(top_k=3, metric="euclidean")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import csp
+import polars as pl
+from csp import ts
+
+from pipeline.ingest import file_batches, is_ndjson, iter_batches
+from pipeline.pipeline import DatasetLoader
+
+
+def make_trips(n: int) -> pl.DataFrame:
+    return pl.DataFrame({
+        "ride_id": [f"r{i}" for i in range(n)],
+        "start_station_id": [f"S{i % 7}" for i in range(n)],
+        "duration": [float(i) for i in range(n)],
+        "member_casual": ["member" if i % 3 else "casual" for i in range(n)],
+    })
+
+
+@csp.node
+def collect(batch: ts[pl.DataFrame], out: list):
+    if csp.ticked(batch):
+        out.append(batch)
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trips = make_trips(1_000)
+        self.csv_path = os.path.join(self.tmpdir.name, "trips.csv")
+        self.ndjson_path = os.path.join(self.tmpdir.name, "trips.ndjson")
+        self.trips.write_csv(self.csv_path)
+        self.trips.write_ndjson(self.ndjson_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_batches_are_bounded_and_complete(self):
+        for path in (self.csv_path, self.ndjson_path):
+            # blocks far smaller than a batch, so batches are assembled from several blocks and split across them
+            batches = list(iter_batches(path, batch_size=300, block_size=4096))
+            self.assertEqual([len(batch) for batch in batches], [300, 300, 300, 100])
+            self.assertTrue(pl.concat(batches).equals(self.trips))
+
+    def test_transform(self):
+        batches = list(iter_batches(
+            self.csv_path,
+            batch_size=100,
+            block_size=4096,
+            transform=lambda batch: batch.filter(pl.col("start_station_id") == "S3").select("ride_id") if batch["duration"][0] < 500 else None,
+        ))
+        self.assertEqual(len(batches), 5)
+        self.assertEqual(pl.concat(batches)["ride_id"].to_list(), [f"r{i}" for i in range(3, 500, 7)])
+
+    def test_schema_override(self):
+        batch = next(iter_batches(self.csv_path, batch_size=10, schema={"duration": pl.String}))
+        self.assertEqual(batch.schema["duration"], pl.String)
+        self.assertEqual(batch["duration"][1], "1.0")
+
+    def test_file_batches_tick_in_order(self):
+        out = []
+
+        def graph():
+            collect(file_batches(self.ndjson_path, batch_size=400), out)
+
+        csp.run(graph, starttime=datetime(2024, 1, 1), endtime=datetime(2024, 1, 2))
+        self.assertEqual([len(batch) for batch in out], [400, 400, 200])
+        self.assertTrue(pl.concat(out).equals(self.trips))
+
+    def test_loader_streams_file(self):
+        loader = DatasetLoader(self.csv_path)
+        self.assertEqual(sum(len(batch) for batch in loader.iter_batches(batch_size=256)), 1_000)
+
+        loader = DatasetLoader(self.ndjson_path)
+        loader.load_data_json()
+        self.assertIsInstance(loader.stream, pl.LazyFrame)
+        loader.finalize_data()
+        self.assertTrue(loader.dataframe.equals(self.trips))
+
+    def test_json_array_and_json_lines_files(self):
+        array_path = os.path.join(self.tmpdir.name, "trips.json")
+        lines_path = os.path.join(self.tmpdir.name, "trips_lines.json")
+        self.trips.write_json(array_path)
+        self.trips.write_ndjson(lines_path)
+        for path, lines in ((array_path, False), (lines_path, True)):
+            loader = DatasetLoader(path)
+            batches = list(loader.iter_batches(batch_size=300))
+            self.assertEqual([len(batch) for batch in batches], [300, 300, 300, 100])
+            self.assertTrue(pl.concat(batches).equals(self.trips))
+
+            self.assertEqual(is_ndjson(path), lines)
+
+            loader.load_data_json()
+            self.assertTrue(loader.stream.collect().equals(self.trips))
+
+
+if __name__ == "__main__":
+    unittest.main()
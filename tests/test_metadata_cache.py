@@ -0,0 +1,110 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import polars as pl
+
+from pipeline.metadata_cache import MetadataCache
+
+
+class CountingLoader:
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self.calls = 0
+        self.fail = False
+        self.gate = None
+
+    def __call__(self):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("feed unavailable")
+        return pl.DataFrame({"station_id": ["1", "2"], "version": [self.calls, self.calls]}), self.ttl
+
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = MetadataCache(snapshot_dir=self.tmpdir.name, retry_after=0.0)
+
+    def tearDown(self):
+        self.cache.close(wait=True)
+        self.tmpdir.cleanup()
+
+    def test_fresh_entry_is_not_refetched(self):
+        loader = CountingLoader(ttl=60)
+        first = self.cache.get("station_information", loader)
+        self.assertIs(self.cache.get("station_information", loader), first)
+        self.assertEqual(loader.calls, 1)
+
+    def test_expired_entry_is_served_while_refreshing(self):
+        loader = CountingLoader(ttl=0)
+        first = self.cache.get("station_information", loader)
+        loader.gate = threading.Event()
+
+        start = time.perf_counter()
+        stale = self.cache.get("station_information", loader)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertIs(stale, first)
+
+        loader.gate.set()
+        self.assertTrue(wait_for(lambda: self.cache.get("station_information", loader)["version"][0] >= 2))
+
+    def test_unchanged_refresh_keeps_cached_frame(self):
+        calls = []
+
+        def loader():
+            calls.append(time.monotonic())
+            return pl.DataFrame({"station_id": ["1", "2"], "version": [1, 1]}), 0
+
+        first = self.cache.get("station_information", loader)
+        # a third fetch starts only once the second one has been stored
+        self.assertTrue(wait_for(lambda: self.cache.get("station_information", loader) is first and len(calls) >= 3))
+        self.assertIs(self.cache.get("station_information", loader), first)
+
+    def test_failed_refresh_keeps_stale_frame(self):
+        loader = CountingLoader(ttl=0)
+        first = self.cache.get("station_information", loader)
+        loader.fail = True
+        self.cache.get("station_information", loader)
+        self.assertTrue(wait_for(lambda: loader.calls >= 2))
+        self.assertIs(self.cache.get("station_information", loader), first)
+
+    def test_cold_start_serves_snapshot(self):
+        self.cache.get("station_information", CountingLoader(ttl=60))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "station_information.parquet")))
+
+        restarted = MetadataCache(snapshot_dir=self.tmpdir.name)
+        loader = CountingLoader(ttl=60)
+        loader.gate = threading.Event()
+        try:
+            snapshot = restarted.get("station_information", loader)
+            self.assertEqual(snapshot["station_id"].to_list(), ["1", "2"])
+            self.assertEqual(loader.calls, 0)
+        finally:
+            loader.gate.set()
+            restarted.close(wait=True)
+
+    def test_invalidate_forces_reload(self):
+        cache = MetadataCache()
+        loader = CountingLoader(ttl=60)
+        cache.get("vehicle_types", loader)
+        cache.invalidate("vehicle_types")
+        self.assertEqual(cache.get("vehicle_types", loader)["version"][0], 2)
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import csp
+import polars as pl
+from fastapi.testclient import TestClient
+from perspective import PerspectiveManager
+from perspective import Table as PerspectiveTable
+
+from pipeline.feed_client import feed_name
+from main import diff_frames, make_perspective_app, push_data_to_perspective_table
+from pipeline.metrics import Histogram, MetricsRegistry, QueueLag
+from pipeline.table_writer import TableWriter
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets(self):
+        histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0), labelnames=("node",))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "a")
+        histogram.observe(0.2, "b")
+        self.assertEqual(histogram.count("a"), 4)
+        self.assertEqual(histogram.count("c"), 0)
+
+        lines = histogram.render()
+        self.assertEqual(lines[:2], ["# HELP latency_seconds Latency.", "# TYPE latency_seconds histogram"])
+        self.assertIn('latency_seconds_bucket{node="a",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{node="a",le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{node="a",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{node="a"} 3.65', lines)
+        self.assertIn('latency_seconds_count{node="b"} 1', lines)
+
+    def test_timer_and_registry(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("node_seconds", "Node time.", labelnames=("node",))
+        self.assertIs(registry.histogram("node_seconds", "Node time."), histogram)
+        with histogram.time("process_data"):
+            time.sleep(0.01)
+        text = registry.render()
+        self.assertTrue(text.endswith("\n"))
+        self.assertIn('node_seconds_bucket{node="process_data",le="0.005"} 0', text)
+        self.assertIn('node_seconds_count{node="process_data"} 1', text)
+
+    def test_queue_lag_matches_pushes_in_order(self):
+        histogram = Histogram("lag_seconds", "Lag.", buckets=(0.01, 1.0), labelnames=("feed",))
+        lag = QueueLag(histogram, maxlen=2)
+        lag.handled("station_status")
+        self.assertEqual(histogram.count("station_status"), 0)
+
+        for _ in range(3):
+            lag.pushed("station_status")
+        time.sleep(0.02)
+        for _ in range(3):
+            lag.handled("station_status")
+        # the oldest mark was dropped at maxlen
+        self.assertIn('lag_seconds_bucket{feed="station_status",le="0.01"} 0', histogram.render())
+        self.assertEqual(histogram.count("station_status"), 2)
+
+    def test_feed_name(self):
+        self.assertEqual(feed_name("https://gbfs.lyft.com/gbfs/2.3/bkn/en/station_status.json"), "station_status")
+        self.assertEqual(feed_name("https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fall-alerts"), "all-alerts")
+
+    def test_push_and_diff_nodes_are_labelled_by_table(self):
+        frame = pl.DataFrame({"station_id": ["1", "2"], "num_bikes_available": [3, 4]})
+        writers = [
+            TableWriter(PerspectiveTable({"station_id": str, "num_bikes_available": int}, index="station_id"), name)
+            for name in ("metrics_a", "metrics_b")
+        ]
+
+        def graph():
+            # frames are unhashable, the curve adapters cannot be memoized
+            with csp.memoize(False):
+                frames = csp.curve(pl.DataFrame, [(timedelta(0), frame)])
+                first = csp.curve(pl.DataFrame, [(timedelta(0), frame.head(1))])
+            push_data_to_perspective_table(diff_frames(frames, "metrics_a").upserts, writers[0])
+            push_data_to_perspective_table(first, writers[1])
+
+        csp.run(graph, starttime=datetime(2024, 1, 1), endtime=datetime(2024, 1, 2))
+        text = TestClient(make_perspective_app(PerspectiveManager())).get("/metrics").text
+        self.assertIn('csp_node_rows_sum{node="push_data_to_perspective_table:metrics_a"} 2.0', text)
+        self.assertIn('csp_node_rows_sum{node="push_data_to_perspective_table:metrics_b"} 1.0', text)
+        self.assertIn('csp_node_seconds_count{node="diff_frames:metrics_a"} 1', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+
+import numpy as np
+import polars as pl
+
+from rebalancing_algo.engines import GreedyEngine
+from rebalancing_algo.graph import Graph
+from rebalancing_algo.parallel import PartitionedEngine, PartitionedRebalancer, tile_labels, with_halos
+
+
+def make_system(system_id: str, num_stations: int, seed: int) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pl.DataFrame({
+        "station_id": [f"{system_id}-{i}" for i in range(num_stations)],
+        "num_bikes_available": rng.integers(0, 60, num_stations),
+        "lat": 40.7 + rng.random(num_stations) * 0.1,
+        "lon": -74.0 + rng.random(num_stations) * 0.1,
+        "name": [f"Station {i}" for i in range(num_stations)],
+        "system_id": [system_id] * num_stations,
+    })
+
+
+class TestPartitionedRebalancer(unittest.TestCase):
+    def setUp(self):
+        # interleaved rows, the output must keep them in place
+        self.frame = pl.concat([make_system("a", 60, 0), make_system("b", 40, 1)]).sample(fraction=1.0, shuffle=True, seed=2)
+        self.next_frame = self.frame.with_columns(
+            pl.when(pl.int_range(pl.len()) % 5 == 0).then(pl.col("num_bikes_available") + 7).otherwise(pl.col("num_bikes_available"))
+        )
+
+    def expected(self, min_bikes, max_bikes) -> pl.DataFrame:
+        counts = []
+        for system_id in ("a", "b"):
+            previous = self.frame.filter(pl.col("system_id") == system_id)
+            current = self.next_frame.filter(pl.col("system_id") == system_id)
+            graph = Graph(top_k=8, use_spatial_index=True)
+            graph.rebalance_incremental(None, previous, min_bikes, max_bikes)
+            graph.rebalance_incremental(previous, current, min_bikes, max_bikes)
+            counts.append(graph.write_back(current))
+        return self.next_frame.select("station_id").join(pl.concat(counts), on="station_id", maintain_order="left")
+
+    def check(self, processes: int):
+        rebalancer = PartitionedRebalancer(processes=processes)
+        try:
+            rebalancer.rebalance(self.frame, 25, 40)
+            result = rebalancer.rebalance(self.next_frame, 25, 40)
+        finally:
+            rebalancer.close()
+        self.assertEqual(result["station_id"].to_list(), self.next_frame["station_id"].to_list())
+        self.assertEqual(result["num_bikes_available"].to_list(), self.expected(25, 40)["num_bikes_available"].to_list())
+        self.assertEqual(set(rebalancer.transfers), {"a", "b"})
+        self.assertEqual(len(rebalancer.graph.store), 100)
+
+    def test_partitions_match_separate_graphs(self):
+        self.check(processes=0)
+
+    def test_worker_processes(self):
+        self.check(processes=2)
+
+    def test_duplicate_station_ids_are_rejected(self):
+        rebalancer = PartitionedRebalancer(processes=0)
+        frame = pl.concat([make_system("a", 5, 0), make_system("a", 5, 1).with_columns(pl.lit("b").alias("system_id"))])
+        with self.assertRaisesRegex(ValueError, "5 repeat"):
+            rebalancer.rebalance(frame, 25, 40)
+
+    def test_per_station_bounds_and_single_partition(self):
+        rebalancer = PartitionedRebalancer(processes=0)
+        frame = self.frame.drop("system_id")
+        bounds = np.where(frame["station_id"].str.starts_with("a").to_numpy(), 10, 30)
+        result = rebalancer.rebalance(frame, bounds, bounds + 10)
+
+        graph = Graph(top_k=8, use_spatial_index=True)
+        graph.rebalance_incremental(None, frame, bounds, bounds + 10)
+        self.assertEqual(list(rebalancer.transfers), [None])
+        self.assertTrue(result.equals(graph.write_back(frame)))
+
+    def test_engine_plans_full_recomputes(self):
+        system = self.frame.filter(pl.col("system_id") == "a")
+        graph = Graph(top_k=8, use_spatial_index=True)
+        graph.update_nodes(system)
+        graph.refresh_top_k_distances()
+        engine = PartitionedEngine(tile_km=2.0, halo_km=1.0, processes=0)
+        planned = engine.plan(graph, 25, 40)
+        self.assertNotEqual(planned, GreedyEngine().plan(graph, 25, 40))
+
+        for processes in (0, 2):
+            with self.subTest(processes=processes):
+                rebalancer = PartitionedRebalancer(processes=processes, engine=PartitionedEngine(tile_km=2.0, halo_km=1.0, processes=0))
+                try:
+                    rebalancer.rebalance(self.frame, 25, 40)
+                    self.assertEqual(rebalancer.transfers["a"], planned)
+                    # the ticks after the full recompute are still replanned incrementally
+                    result = rebalancer.rebalance(self.next_frame, 25, 40)
+                finally:
+                    rebalancer.close()
+                previous = system
+                current = self.next_frame.filter(pl.col("system_id") == "a")
+                expected = Graph(top_k=8, use_spatial_index=True)
+                expected.rebalance_incremental(None, previous, 25, 40, engine)
+                expected.rebalance_incremental(previous, current, 25, 40, engine)
+                counts = expected.write_back(current)
+                self.assertEqual(
+                    result.filter(pl.col("system_id") == "a")["num_bikes_available"].to_list(),
+                    current.select("station_id").join(counts, on="station_id", maintain_order="left")["num_bikes_available"].to_list(),
+                )
+
+
+class TestPartitionedEngine(unittest.TestCase):
+    def setUp(self):
+        self.graph = Graph(top_k=8, metric="haversine", use_spatial_index=True)
+        self.graph._fill_nodes(make_system("a", 400, 3))
+
+    def plan(self, engine, min_bikes=25, max_bikes=40) -> set:
+        try:
+            return {(t.source, t.target, t.num_bikes) for t in engine.plan(self.graph, min_bikes, max_bikes)}
+        finally:
+            engine.close()
+
+    def test_tiles_and_halos(self):
+        store = self.graph.store
+        labels = tile_labels(store.lat, store.lon, tile_km=2.0)
+        partitions = with_halos(store.lat, store.lon, labels, halo_km=0.5)
+        self.assertGreater(len(partitions), 4)
+        cores = np.concatenate([core for core, _ in partitions])
+        self.assertEqual(sorted(cores.tolist()), list(range(len(store))))
+        for core, halo in partitions:
+            self.assertEqual(len(set(labels[core])), 1)
+            self.assertFalse(set(core.tolist()) & set(halo.tolist()))
+            self.assertTrue(np.all(store.lat[halo] <= store.lat[core].max() + 0.5 / 111.32))
+
+    def test_single_partition_is_the_greedy_plan(self):
+        greedy = {(t.source, t.target, t.num_bikes) for t in GreedyEngine().plan(self.graph, 25, 40)}
+        self.assertEqual(self.plan(PartitionedEngine(tile_km=100.0, processes=0)), greedy)
+
+    def test_merged_plan_is_feasible(self):
+        bounds = np.where(np.arange(len(self.graph.store)) % 2 == 0, 20, 30)
+        plan = self.plan(PartitionedEngine(tile_km=2.0, halo_km=1.0, processes=0), bounds, bounds + 10)
+        self.assertTrue(plan)
+        store = self.graph.store
+        given, received = {}, {}
+        for source, target, num_bikes in plan:
+            given[source] = given.get(source, 0) + num_bikes
+            received[target] = received.get(target, 0) + num_bikes
+        for source, num_bikes in given.items():
+            position = store.index[source]
+            self.assertLessEqual(num_bikes, store.bikes[position] - bounds[position] - 10)
+        for target, num_bikes in received.items():
+            position = store.index[target]
+            self.assertLessEqual(num_bikes, bounds[position] - store.bikes[position])
+
+    def test_worker_processes_match_in_thread_plan(self):
+        regions = {station_id: str(i % 4) for i, station_id in enumerate(self.graph.store.ids)}
+        expected = self.plan(PartitionedEngine(regions=regions, processes=0))
+        self.assertEqual(self.plan(PartitionedEngine(regions=regions, processes=2)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
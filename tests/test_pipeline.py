@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import polars as pl
 from unittest.mock import patch, MagicMock
@@ -12,18 +14,24 @@ class TestDatasetLoader(unittest.TestCase):
     def test_load_data_csv_success(self, mock_scan_csv):
         mock_stream = MagicMock()
         mock_scan_csv.return_value = mock_stream
-        self.loader.load_data_csv(batch_size=500)
+        self.loader.load_data_csv(n_rows=500)
         mock_scan_csv.assert_called_with("test_data/Iris.csv", n_rows=500)
         self.assertIsNotNone(self.loader.stream)
         self.assertIs(self.loader.stream, mock_stream)
 
+    @patch("polars.scan_csv")
+    def test_load_data_csv_batch_size_is_deprecated(self, mock_scan_csv):
+        with self.assertWarns(DeprecationWarning):
+            self.loader.load_data_csv(batch_size=500)
+        mock_scan_csv.assert_called_with("test_data/Iris.csv", n_rows=500)
+
     @patch("polars.scan_csv")
     def test_finalize_data_success(self, mock_scan_csv):
         mock_stream = MagicMock()
         mock_stream.collect.return_value = pl.DataFrame({"column1": [1, 2], "column2": [3, 4]})
         mock_scan_csv.return_value = mock_stream
 
-        self.loader.load_data_csv(batch_size=500)
+        self.loader.load_data_csv(n_rows=500)
         self.loader.finalize_data()
         self.assertIsNotNone(self.loader.dataframe)
         self.assertIsInstance(self.loader.dataframe, pl.DataFrame)
@@ -47,5 +55,43 @@ class TestDatasetLoader(unittest.TestCase):
         self.assertTrue("column1" in summary.columns)
         self.assertTrue("column2" in summary.columns)
 
+    def test_lazy_check_fields_and_summary(self):
+        df = pl.DataFrame({"column1": [1, 2, 3, None], "column2": [4.0, 5.0, 6.0, 8.0], "name": ["b", "a", None, "c"]})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.csv")
+            df.write_csv(path)
+            self.loader.stream = pl.scan_csv(path)
+
+            self.assertTrue(self.loader.check_fields(["column1", "name"]))
+            self.assertFalse(self.loader.check_fields(["column3"]))
+
+            summary = self.loader.get_summary()
+        expected = df.describe().filter(pl.col("statistic").is_in(summary["statistic"].to_list()))
+        self.assertEqual(summary.columns, expected.columns)
+        self.assertEqual(summary["statistic"].to_list(), expected["statistic"].to_list())
+        for column in ("column1", "column2"):
+            self.assertEqual(summary[column].round(6).to_list(), expected[column].round(6).to_list())
+        self.assertEqual(summary["name"].to_list(), ["3", "1", None, None, "a", "c"])
+
+    @patch("pipeline.pipeline.NominatimGeocoder")
+    @patch("pipeline.pipeline.MetadataCache")
+    @patch("pipeline.pipeline.FeedClient")
+    def test_network_pieces_are_created_on_first_use(self, feed_client, metadata_cache, geocoder):
+        df = pl.DataFrame({"column1": [1, 2, 3]})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.csv")
+            df.write_csv(path)
+            loader = DatasetLoader(path)
+            loader.load_data_csv()
+            loader.finalize_data()
+            self.assertEqual(sum(len(batch) for batch in loader.iter_batches()), 3)
+        for network in (feed_client, metadata_cache, geocoder):
+            network.assert_not_called()
+
+        self.assertIs(loader.client, loader.client)
+        self.assertIs(loader.alerts.geocoder, loader.geocoder)
+        feed_client.assert_called_once()
+        geocoder.assert_called_once()
+
 if __name__ == "__main__":
     unittest.main()
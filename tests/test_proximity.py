@@ -0,0 +1,49 @@
+import unittest
+
+import polars as pl
+
+from rebalancing_algo.graph import Graph
+from rebalancing_algo.proximity import stations_near_alerts, with_alert_flags
+
+
+class TestStationsNearAlerts(unittest.TestCase):
+    def setUp(self):
+        self.graph = Graph(top_k=2, use_spatial_index=True)
+        self.graph.nodes = {
+            "1": (10, 40.7486, -73.9864, "Station1"),
+            "2": (20, 40.7496, -73.9874, "Station2"),
+            "3": (30, 40.7800, -73.9500, "Station3"),
+        }
+        self.frame = pl.DataFrame({
+            "station_id": ["1", "2", "3"],
+            "num_bikes_available": [10, 20, 30],
+        })
+
+    def test_alerts_flag_stations_within_radius(self):
+        alerts = pl.DataFrame({
+            "id": ["a1|x", "a1|y", "a2|z"],
+            "alert_id": ["a1", "a1", "a2"],
+            "lat": [40.7490, 40.7492, 40.7491],
+            "lon": [-73.9868, -73.9870, -73.9869],
+        })
+        flags = stations_near_alerts(self.graph, alerts, radius_km=0.5)
+        self.assertEqual(flags["station_id"].to_list(), ["1", "2"])
+        # a1 names two nearby addresses but counts once
+        self.assertEqual(flags["alerts_nearby"].to_list(), [2, 2])
+        self.assertTrue((flags["nearest_alert_km"] < 0.1).all())
+
+    def test_no_alerts(self):
+        empty = pl.DataFrame(schema={"alert_id": pl.String, "lat": pl.Float64, "lon": pl.Float64})
+        self.assertTrue(stations_near_alerts(self.graph, empty).is_empty())
+
+    def test_with_alert_flags_keeps_every_station(self):
+        flags = pl.DataFrame({"station_id": ["3"], "alerts_nearby": [1], "nearest_alert_km": [0.2]})
+        flagged = with_alert_flags(self.frame, flags)
+        self.assertEqual(flagged["station_id"].to_list(), ["1", "2", "3"])
+        self.assertEqual(flagged["alerts_nearby"].to_list(), [0, 0, 1])
+        self.assertEqual(flagged["nearest_alert_km"].to_list(), [None, None, 0.2])
+        self.assertEqual(with_alert_flags(self.frame)["alerts_nearby"].to_list(), [0, 0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
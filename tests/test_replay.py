@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import csp
+import polars as pl
+from csp import ts
+from csp.profiler import Profiler
+
+from pipeline.replay import iter_recorded_status, iter_status_json, replay_report, replay_status
+from pipeline.snapshot_store import SnapshotStore, iter_snapshots
+
+
+def make_snapshot(num_bikes: list[int]) -> pl.DataFrame:
+    return pl.DataFrame({
+        "station_id": [str(i) for i in range(len(num_bikes))],
+        "num_bikes_available": num_bikes,
+    })
+
+
+def status_payload(last_updated: int, num_bikes: list[int]) -> dict:
+    return {
+        "last_updated": last_updated,
+        "data": {"stations": [
+            {
+                "station_id": str(i), "num_bikes_available": bikes, "num_bikes_disabled": 0, "num_docks_available": 10,
+                "num_docks_disabled": 0, "num_ebikes_available": 0, "is_installed": True, "is_renting": True,
+                "is_returning": True, "last_reported": last_updated,
+            }
+            for i, bikes in enumerate(num_bikes)
+        ]},
+    }
+
+
+@csp.node
+def collect(data: ts[pl.DataFrame], out: list):
+    if csp.ticked(data):
+        out.append((csp.now(), data["num_bikes_available"].to_list()))
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.start = datetime(2024, 3, 1, 23, 30)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def record(self, num_snapshots: int) -> None:
+        # small flushes and a day boundary, so the replay crosses files and partitions
+        store = SnapshotStore(self.root, flush_every=3)
+        for i in range(num_snapshots):
+            store.append(make_snapshot([i, 10 - i]), self.start + timedelta(minutes=10 * i))
+        store.close()
+
+    def test_iter_snapshots_in_polling_order(self):
+        self.record(8)
+        snapshots = list(iter_snapshots(self.root))
+
+        self.assertEqual([moment for moment, _ in snapshots], [self.start + timedelta(minutes=10 * i) for i in range(8)])
+        for i, (_, frame) in enumerate(snapshots):
+            self.assertEqual(frame.columns, ["station_id", "num_bikes_available"])
+            self.assertEqual(frame["num_bikes_available"].to_list(), [i, 10 - i])
+
+    def test_iter_snapshots_range(self):
+        self.record(8)
+        moments = [moment for moment, _ in iter_snapshots(self.root, self.start + timedelta(minutes=25), self.start + timedelta(minutes=60))]
+        self.assertEqual(moments, [self.start + timedelta(minutes=m) for m in (30, 40, 50)])
+
+    def test_iter_status_json(self):
+        information = {"data": {"stations": [
+            {"station_id": "0", "capacity": 20, "name": "A", "short_name": "a", "region_id": "71", "lon": -74.0, "lat": 40.7},
+        ]}}
+        payloads = {"station_information.json": information}
+        for i, last_updated in enumerate([1_709_251_200, 1_709_251_260, 1_709_251_260, 1_709_251_320]):
+            payloads[f"status-{i}.json"] = status_payload(last_updated, [i, i + 1])
+        for name, payload in payloads.items():
+            with open(os.path.join(self.root, name), "w") as f:
+                json.dump(payload, f)
+
+        snapshots = list(iter_recorded_status(self.root))
+        # the duplicate last_updated is skipped, statuses are joined with the station information
+        self.assertEqual([moment for moment, _ in snapshots], [datetime(2024, 3, 1, 0, m) for m in (0, 1, 2)])
+        self.assertEqual([frame["num_bikes_available"].to_list() for _, frame in snapshots], [[0], [1], [3]])
+        self.assertEqual(snapshots[0][1]["name"].to_list(), ["A"])
+
+        self.assertEqual(len(list(iter_status_json(self.root, start=datetime(2024, 3, 1, 0, 1)))), 2)
+
+    def test_replay_graph(self):
+        self.record(5)
+        out = []
+
+        def graph():
+            collect(replay_status(self.root), out)
+
+        with Profiler() as profiler:
+            csp.run(graph, starttime=datetime(2024, 1, 1), endtime=datetime(2025, 1, 1))
+        self.assertEqual(out, [(self.start + timedelta(minutes=10 * i), [i, 10 - i]) for i in range(5)])
+
+        report = replay_report(profiler.results(), wall_seconds=1.0, nodes=["collect", "missing"])
+        self.assertEqual(report["node"].to_list(), ["collect"])
+        self.assertEqual(report["executions"].to_list(), [5])
+        self.assertEqual(report["per_s"].to_list(), [5.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from pipeline.pipeline import DatasetLoader
+from pipeline.snapshot_store import SnapshotStore, scan_snapshots
+
+
+def make_snapshot(num_bikes: list[int]) -> pl.DataFrame:
+    return pl.DataFrame({
+        "station_id": [str(i) for i in range(len(num_bikes))],
+        "name": [f"Station{i}" for i in range(len(num_bikes))],
+        "lat": [40.7 + i * 0.001 for i in range(len(num_bikes))],
+        "num_bikes_available": num_bikes,
+    })
+
+
+class TestSnapshotStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.start = datetime(2024, 3, 1, 23, 0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, num_snapshots: int, flush_every: int = 10) -> SnapshotStore:
+        store = SnapshotStore(self.root, flush_every=flush_every)
+        for i in range(num_snapshots):
+            store.append(make_snapshot([i, 2 * i, 5]), self.start + timedelta(minutes=15 * i))
+        store.close()
+        return store
+
+    def test_round_trip(self):
+        self.write(4)
+        history = scan_snapshots(self.root).collect().sort("snapshot_time", "station_id")
+        self.assertEqual(len(history), 12)
+        self.assertEqual(history.filter(pl.col("station_id") == "1")["num_bikes_available"].to_list(), [0, 2, 4, 6])
+        self.assertEqual(history.columns, ["station_id", "name", "lat", "num_bikes_available", "snapshot_time"])
+
+    def test_partitioned_by_day_and_flushed_in_batches(self):
+        self.write(8, flush_every=3)
+        days = sorted(os.listdir(self.root))
+        self.assertEqual(days, ["date=2024-03-01", "date=2024-03-02"])
+        # 23:00 - 23:45 is split 3 + 1 by flush_every, 00:00 - 00:45 as well
+        self.assertEqual(sum(len(os.listdir(os.path.join(self.root, day))) for day in days), 4)
+
+    def test_old_days_are_pruned(self):
+        store = SnapshotStore(self.root, flush_every=1, max_days=2)
+        for day in range(4):
+            store.append(make_snapshot([day]), self.start + timedelta(days=day))
+        store.close()
+        self.assertEqual(sorted(os.listdir(self.root)), ["date=2024-03-03", "date=2024-03-04"])
+
+    def test_columns_are_encoded(self):
+        self.write(4)
+        path = next(
+            os.path.join(directory, name) for directory, _, names in os.walk(self.root) for name in names
+        )
+        metadata = pq.ParquetFile(path).metadata.row_group(0)
+        encodings = {metadata.column(i).path_in_schema: metadata.column(i).encodings for i in range(metadata.num_columns)}
+        self.assertIn("RLE_DICTIONARY", encodings["station_id"])
+        self.assertIn("RLE_DICTIONARY", encodings["num_bikes_available"])
+        self.assertIn("DELTA_BINARY_PACKED", encodings["snapshot_time"])
+
+    def test_time_range_scan(self):
+        self.write(8)
+        start = self.start + timedelta(minutes=30)
+        end = datetime(2024, 3, 2, 0, 30, tzinfo=timezone.utc)
+        history = scan_snapshots(self.root, start, end).collect()
+        self.assertEqual(sorted(set(history["snapshot_time"].to_list())), [
+            self.start + timedelta(minutes=30), self.start + timedelta(minutes=45),
+            datetime(2024, 3, 2, 0, 0), datetime(2024, 3, 2, 0, 15),
+        ])
+
+    def test_dataset_loader_reads_snapshots(self):
+        self.write(8)
+        loader = DatasetLoader(self.root)
+        loader.load_snapshots(start=datetime(2024, 3, 2))
+        self.assertIsInstance(loader.stream, pl.LazyFrame)
+        loader.finalize_data()
+        self.assertEqual(len(loader.dataframe), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import unittest
+
+import polars as pl
+from perspective import Table as PerspectiveTable
+
+from pipeline.metrics import WRITER_COALESCED_ROWS
+from pipeline.table_writer import TableWriter
+
+
+def frame(ids: list, bikes: list) -> pl.DataFrame:
+    return pl.DataFrame({"station_id": ids, "num_bikes_available": bikes})
+
+
+def rows(table: PerspectiveTable) -> dict:
+    columns = table.view().to_columns()
+    return dict(zip(columns["station_id"], columns["num_bikes_available"]))
+
+
+class TestTableWriter(unittest.TestCase):
+    def setUp(self):
+        self.table = PerspectiveTable({"station_id": str, "num_bikes_available": int}, index="station_id")
+        self.callbacks = []
+
+    def writer(self, **kwargs) -> TableWriter:
+        return TableWriter(self.table, "stations", self.callbacks.append, **kwargs)
+
+    def test_without_schedule_applies_at_once(self):
+        writer = TableWriter(self.table, "stations")
+        writer.upsert(frame(["a", "b"], [1, 2]))
+        self.assertEqual(rows(self.table), {"a": 1, "b": 2})
+        writer.remove(["a"])
+        self.assertEqual(rows(self.table), {"b": 2})
+        self.assertEqual(writer.pending_rows, 0)
+
+    def test_changes_coalesce_into_one_flush(self):
+        writer = self.writer()
+        writer.upsert(frame(["a", "b"], [1, 2]))
+        writer.upsert(frame(["b", "c"], [5, 6]))
+        writer.upsert(pl.DataFrame(schema={"station_id": pl.String, "num_bikes_available": pl.Int64}))
+        self.assertEqual(len(self.callbacks), 1)
+        self.assertEqual(rows(self.table), {})
+
+        self.callbacks.pop()()
+        self.assertEqual(rows(self.table), {"a": 1, "b": 5, "c": 6})
+        self.assertEqual(writer.pending_rows, 0)
+
+        # a later change schedules the next flush
+        writer.upsert(frame(["a"], [9]))
+        self.assertEqual(len(self.callbacks), 1)
+        self.callbacks.pop()()
+        self.assertEqual(rows(self.table)["a"], 9)
+
+    def test_remove_and_upsert_cancel_each_other(self):
+        writer = self.writer()
+        writer.upsert(frame(["a", "b"], [1, 2]))
+        self.callbacks.pop()()
+
+        writer.upsert(frame(["c"], [3]))
+        writer.remove(["a", "c"])
+        writer.upsert(frame(["a"], [7]))
+        self.assertEqual(writer.pending_rows, 2)
+        self.callbacks.pop()()
+        self.assertEqual(rows(self.table), {"a": 7, "b": 2})
+
+    def test_queue_is_compacted_above_max_pending_rows(self):
+        writer = self.writer(max_pending_rows=4)
+        before = WRITER_COALESCED_ROWS.count("stations")
+        for bikes in range(5):
+            writer.upsert(frame(["a", "b"], [bikes, bikes + 1]))
+        self.assertLessEqual(writer.pending_rows, 4)
+        self.assertGreater(WRITER_COALESCED_ROWS.count("stations"), before)
+        self.callbacks.pop()()
+        self.assertEqual(rows(self.table), {"a": 4, "b": 5})
+
+    def test_flushes_on_event_loop(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            writer = TableWriter(self.table, "stations", loop.call_soon_threadsafe)
+            for bikes in range(20):
+                writer.upsert(frame(["a", "b"], [bikes, -bikes]))
+            done = threading.Event()
+            loop.call_soon_threadsafe(done.set)
+            self.assertTrue(done.wait(5))
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(5)
+            loop.close()
+        self.assertEqual(rows(self.table), {"a": 19, "b": -19})
+
+
+if __name__ == "__main__":
+    unittest.main()